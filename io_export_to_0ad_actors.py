@@ -62,8 +62,37 @@ bl_info = {
 import bpy
 import re
 import os
-
-from bpy.props import IntProperty, StringProperty, BoolProperty, EnumProperty
+import sys
+import time
+import math
+import functools
+import hashlib
+import json
+import struct
+import tracemalloc
+import pickle
+import shutil
+import mmap
+import zlib
+import zipfile
+import io
+import concurrent.futures
+import traceback
+from array import array
+from mathutils import kdtree, Matrix
+import xml.etree.ElementTree as ElementTree
+#optional: bundled with blender since 2.70, required for the mesh optimization
+try:
+    import numpy
+except ImportError:
+    numpy = None
+#optional: not every Python build has it, the existing files are then probed one by one instead
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from bpy.props import IntProperty, FloatProperty, StringProperty, BoolProperty, EnumProperty
 
 
 
@@ -83,6 +112,110 @@ skip_non_mechanical_objects = True
 #set in context view 3d panel
 after_how_many_create_actor_recursions_to_abort = 100#kind a century :)
 
+#modal export: how long to work per timer event before giving control back to the GUI
+time_slice_in_seconds = 0.1
+timer_interval_in_seconds = 0.01
+
+#append-only record of the produced files, resides in the target mod folder
+journal_filename = '.export_to_0ad_journal'
+
+#all temporary objects of an export are created in this scene, which is removed afterwards
+scratch_scene_name = 'export_to_0ad_scratch'
+
+#the exported .dae files are post-processed (e.g. prop points added) within this namespace
+collada_namespace = 'http://www.collada.org/2005/11/COLLADASchema'
+ElementTree.register_namespace('', collada_namespace)
+
+#skip-if-identical writes: new files are staged as <name>.staging.<ending> next to their target,
+#files from this size on are compared memory-mapped chunk by chunk
+staging_file_tag = '.staging'
+mmap_comparison_min_size = 1 << 20
+mmap_comparison_chunk_size = 1 << 20
+
+#texture atlas: gap in pixels between the packed images (against bleeding when mipmapping)
+texture_atlas_padding = 4
+
+#name grammar: <subfolder>##..##<prefix>__<rest> material:<material>.<numeric suffix>
+name_subfolder_separator = '##'
+name_prefix_separator = '__'
+name_material_tag_pattern = re.compile('(?:material|Material|mat|Mat|M|m):')
+name_numeric_suffix_pattern = re.compile('^(.*)[.]([0-9]{3})$')
+parsed_name_cache_size = 4096
+
+#binary model format of the engine's mesh cache (see ModelDef.cpp): magic, version and
+#the file ending appended to the .dae for the cached file next to it (the archive cache path)
+pmd_magic = b'PSMD'
+pmd_version = 4
+pmd_cached_file_ending = '.cached.pmd'
+pmd_no_bone = 0xFF
+
+#mesh optimization: size of the simulated post-transform vertex cache (FIFO) the triangles are ordered for
+vertex_cache_size = 16
+
+#converted curve meshes are cached on disk in this folder of the target mod folder (if activated)
+cache_folder = '.export_to_0ad_cache'
+
+#bill of materials: densities in kg/m^3 by material (the parsed 'material:' tag or the blender material name, lower case)
+material_densities = {
+    'aluminium': 2700.0,
+    'aluminum': 2700.0,
+    'brass': 8500.0,
+    'bronze': 8800.0,
+    'copper': 8960.0,
+    'glass': 2500.0,
+    'gold': 19300.0,
+    'granite': 2700.0,
+    'iron': 7870.0,
+    'lead': 11340.0,
+    'leather': 860.0,
+    'marble': 2700.0,
+    'oak': 750.0,
+    'pine': 500.0,
+    'silver': 10490.0,
+    'stainless steel': 8000.0,
+    'steel': 7850.0,
+    'stone': 2600.0,
+    'wood': 700.0
+}
+
+#bill of materials: written per scene as text into the target mod folder
+bill_of_materials_filename_prefix = 'export_to_0ad_bill_of_materials_'
+
+#budget report: the costs of the actors in game are written as JSON into the target mod folder,
+#the budget violations of the run are reported by the operator (up to the given count)
+budget_report_filename = 'export_to_0ad_budget_report.json'
+budget_violations_shown_count = 10
+cost_measures = ('triangles', 'vertices', 'texture_memory')
+
+#texture normalization: resampling filter (Lanczos lobes), worker threads (numpy releases the GIL while resampling),
+#the normalized textures are cached in the cache folder by a hash of the source image and the settings
+lanczos_lobes = 3
+texture_worker_count = os.cpu_count() or 1
+texture_normalization_version = 1
+
+#decimated quality tiers: <mesh>_lod<percent>.dae next to the mesh, generated in worker threads and cached in the cache folder,
+#the grid resolutions of the vertex clustering are searched up to the given maximum (cells along the longest axis)
+quality_tier_file_tag = '_lod'
+quality_tier_worker_count = os.cpu_count() or 1
+quality_tier_max_resolution = 4096
+quality_tier_version = 1
+
+#ambient occlusion maps are baked into <object name>_ao.png, the samples of blender's raytraced ambient occlusion
+ambient_occlusion_file_tag = '_ao'
+ambient_occlusion_bake_margin = 4
+
+#archive output: the mod's art is written into <mod folder>/<mod name>.zip, compressed files are stored as they are
+archive_file_ending = '.zip'
+archive_stored_file_endings = ('.png', '.jpg', '.jpeg')
+archive_compression_level = 6
+
+#index of the files already in the target mod, resides in the cache folder
+mod_tree_index_filename = 'mod_tree_index.sqlite'
+
+#memory profiling mode: how many allocating sites to report per snapshot and how deep to trace
+memory_profile_top_count = 15
+memory_profile_traceback_depth = 4
+
 
 
 header = '<?xml version="1.0" encoding="utf-8"?>'
@@ -107,11 +240,81 @@ def main(context):
 #ACT
 #@param string:unix_pattern is optional
 #@return always returns True or False#selection_result
-object_reference_count = {}
-def act(context):
+def act(context, export_context = None):
+    return run_to_completion(act_stepwise(context, export_context))
+
+
+
+#
+# Advances the given export steps (generator) until they are exhausted.
+# @return the return value of the generator.
+#
+def run_to_completion(steps):
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+
+#
+# The export as a generator that yields after each bounded unit of work
+# (a selection pass, a variant, an actor), such that a modal operator can
+# advance it in time slices. All state of the run is kept in the export context.
+# Optionally all (included) scenes are exported in one run, each according to its
+# own settings, sharing the caches, thus assets shared by scenes are processed once.
+#
+def act_stepwise(context, export_context = None):
+    if (export_context is None):
+        export_context = ExportContext()
 
     if debug:
         print('engine started ... (acting according to setting)')
+    scenes = [context.scene]
+    if (context.scene.export_to_0ad_in_all_scenes):
+        scenes = get_scenes_to_export()
+    exported_scenes_count = 0
+    try:
+        for scene in scenes:
+            scene_context = context
+            if (scene != context.scene):
+                scene_context = SceneContext(context, scene)
+            if (len(scenes) > 1):
+                export_context.progress.scene_name = scene.name
+                print('Exporting scene: ' + scene.name)
+            is_exported = yield from export_scene_stepwise(scene_context, export_context)
+            if (is_exported):
+                exported_scenes_count += 1
+        write_budget_reports(export_context)
+        for mod_tree_index in export_context.mod_tree_indices.values():
+            for orphan_filelink in mod_tree_index.find_orphans():
+                print('Orphan (referenced by no actor in the mod): ' + orphan_filelink)
+    except GeneratorExit:
+        # Cancelled (e.g. Esc in the modal operator). The run stays incomplete in the journal, thus it can be resumed:
+        for journal in export_context.journals.values():
+            journal.append({'event': 'run_cancelled'})
+        raise
+    finally:
+        # No matter how the export ends, leave no temporary objects or datablocks behind:
+        export_context.finish()
+    
+    if (exported_scenes_count == 0):
+        return {'CANCELLED'}
+    for journal in export_context.journals.values():
+        journal.finish()
+    return True
+
+
+
+#
+# Exports the selected (or automatically selected) objects of the context's scene.
+# @return True if there was something to export, else False.
+#
+def export_scene_stepwise(context, export_context):
+    export_context.enter_scene(context)
+    export_context.progress.enter_phase('selecting')
+    yield
     ############
     #preparation - selection
     ############
@@ -124,28 +327,29 @@ def act(context):
     if (context.selected_objects is None or len(context.selected_objects) == 0):
         #if debug:
         print('No selection! Automatically guessing what to select. (hidden objects are not selected)')
-        #ensure nothing is selected
-        bpy.ops.object.select_all(action="DESELECT")
+        #ensure nothing is selected (of the exported scene, which need not be the active one)
+        for o in context.scene.objects:
+            o.select = False
         if debug:
             print('deselecting all.')
         #select depending on if it is a mechanical object (TODO)
         for o in context.scene.objects:
             if debug: 
                 print('Scene object: ', o)
-            if (o.hide):#here we skip hidden objects no matter settings as this way
+            if (export_context.scene_snapshot.is_hidden(o)):#here we skip hidden objects no matter settings as this way
                 # one has the choice to either include object via selecting or
                 # or exlude objects by hiding those.
                 if debug:
                     print('Auto-selection: Hidden scene object ', o, '.')
                 continue
-            if (o.type != None):
+            if (export_context.scene_snapshot.type_of(o) != None):
                 if debug:
-                    print('Type of scene object: ', o, ' = ', o.type)
+                    print('Type of scene object: ', o, ' = ', export_context.scene_snapshot.type_of(o))
                 #dupligroup/groupinstance can theoretically be attached to any object, but we only consider those:
-                if (not is_object_type_considered(o.type)):
+                if (not export_context.scene_snapshot.is_considered(o)):
                     continue
-                is_longest_object_label_then_store_len(o)  #keep track of longest label length
-                is_longest_material_then_store_len(material=o.active_material)
+                is_longest_object_label_then_store_len(export_context, o)  #keep track of longest label length
+                is_longest_material_then_store_len(export_context, material=o.active_material)
                 o.select = True #select object
                 context.scene.objects.active = o    #make active
                 if debug:
@@ -156,24 +360,24 @@ def act(context):
             if debug: 
                 print('Scene object base: ', ob)
             o = ob.object
-            if (o.hide):#here we skip hidden objects no matter settings as this way
+            if (export_context.scene_snapshot.is_hidden(o)):#here we skip hidden objects no matter settings as this way
                 # one has the choice to either include object via selecting or
                 # or exlude objects by hiding those.
                 if debug:
                     print('Auto-selection: Hidden underlaying object ', o, ' of object base ', ob, '.')
                 continue
-            if (o.type != None):
+            if (export_context.scene_snapshot.type_of(o) != None):
                 if debug:
-                    print('Type of scene object: ', o, ' = ', o.type)
-                if (not is_object_type_considered(o.type)):
+                    print('Type of scene object: ', o, ' = ', export_context.scene_snapshot.type_of(o))
+                if (not export_context.scene_snapshot.is_considered(o)):
                     continue
                 #increase the counter for this object as another reference was found?
-                if (not (o in object_reference_count)):# || object_reference_count[o] is None):
-                    object_reference_count[o] = 0
-                object_reference_count[o] = object_reference_count[o] + 1
+                if (not (o in export_context.object_reference_count)):# || export_context.object_reference_count[o] is None):
+                    export_context.object_reference_count[o] = 0
+                export_context.object_reference_count[o] = export_context.object_reference_count[o] + 1
                 #keep track of the longest label's length
-                is_longest_object_label_then_store_len(o)
-                is_longest_material_then_store_len(material=o.active_material)
+                is_longest_object_label_then_store_len(export_context, o)
+                is_longest_material_then_store_len(export_context, material=o.active_material)
                 #select the object reference TODO object or the reference which one to select?
                 ob.select = True  #select object
                 context.scene.objects.active = o    #make active
@@ -186,10 +390,17 @@ def act(context):
     # Now there must be a selection or we abort the mission.
     ############
     #Now at last we have a selection? Either set up manually or selected automatically.
+    export_context.scene_snapshot.update_selection(context.selected_objects)
     if (len(context.selected_objects) == 0):
         if debug:
             print('Selection is still empty! Mission aborted.')
-        return {'CANCELLED'}
+        return False
+    
+    # Optionally attach the props placed next to their actor (instead of parented) to the nearest prop point:
+    if (context.scene.export_to_0ad_in_attach_unparented_props):
+        export_context.prop_attachments = plan_unparented_prop_attachments(
+                export_context.scene_snapshot, context.scene.export_to_0ad_in_attach_tolerance)
+    attached_prop_names = set([name for names in export_context.prop_attachments.values() for name in names])
         
 
     
@@ -210,114 +421,59 @@ def act(context):
             if (not childOrHighest in distinct_parents_of_selected_objects):
                 #childOrHighest_index = distinct_parents_of_selected_objects.index(childOrHighest)
                 distinct_parents_of_selected_objects.append(childOrHighest)
+    # Attached props are exported as props of their actor only:
+    distinct_parents_of_selected_objects = [obj for obj in distinct_parents_of_selected_objects if not obj.name in attached_prop_names]
     
+    export_context.progress.actors_total += len(distinct_parents_of_selected_objects)
+    export_context.profile_memory('selected')
+    export_context.prepare_sandbox(context)
     # If only one main actor is exported at once, then there will only be one distinct parent:
     for distinct_parent in distinct_parents_of_selected_objects:
         # Start with the determined highest level parent: 
-        last_created_actor = export_actor_related_files_recursively(context, obj)
+        last_created_actor = yield from export_actor_related_files_stepwise(context, export_context, distinct_parent)
         #if (file_exists(last_created_actor.filelink)):
-        print('Created actor: ' + last_created_actor)
-        
+        print('Created actor: ' + str(last_created_actor))
+        export_context.progress.actors_done += 1
+        yield
+    # The bill of materials of the selected objects (dimensions, volume, area, mass):
+    if (context.scene.export_to_0ad_in_write_bom):
+        export_context.progress.enter_phase('bill of materials')
+        write_bill_of_materials(context, export_context, context.selected_objects)
+        yield
     return True
-        
-
-    ##########
-    # GROUPS (not group instances, those are attached to objects and therefore already handled above when iterating the scene objects!)
-    ##########
-    #Groups are not represented by any data in a scene. As such it's no problem if the objects in a scene are wildly grouped.
-    #Those groups will have no influence on the generated Bill of Materials (BoM). Only instances have an effect.
-    #The effect of group instances is twofold:
-    #1) Instances are high level parts, containing objects, i.e. other parts.
-    #2) Instances are self-contained standalone parts.
-    
-    #(And should not be resolved. => Here the material has to be specified explicitely or will be stated as mixed.)
-    
-    #global bom_entry_count_map
-    #bom_entry_count_map = {}    #clear the map/dictionary --> now appending to the already created BoM for objects/group instances.
-    append_to_file(context, "\r\n\n\nGROUPS OF SCENE\r\n")
-    #TODO Create separate bom_entry_count_map for groups, because until now here several lines are added redundantly!
-    
-    
-    for g in bpy.data.groups:#bpy.types.BlendData.groups:
 
-        #examine if all objects are in the current context scene
-        are_all_objects_in_context_scene = True
-        for o in g.objects:
-            if not o.is_visible(context.scene):
-                are_all_objects_in_context_scene = False
-                break#cancel further examination
-        
-        #Is this group not completely in the current/context scene?
-        if (not are_all_objects_in_context_scene):
-            if debug:
-                print('Not all objects of this group ', g, ' are (visible) in this scene: ', context.scene)
-            continue#next Group within the blend file
-            
-        #Add this group to the bill of materials as standalone complete part on its own (not resolving to objects)?
-        if (not context.scene.export_to_0ad_in_mode == '0'):#not resolve_groups):
-            #group has a partname identifier and this hopefully contains a material:<material>,
-            # => try to compile a bom entry out of this, if not possible then lookup the material from the objects,
-            # => i.e. either compose a list of materials being used in the group (Aluminium, Stainless Steel, Diamond)
-            #         or give a label like 'mixed'.
-            # If no material can be resolved then use 'undefined' or rather '-'.
-            bom_entry = build_and_store_bom_entry_out_of_group(context, g)
-            append_to_file(context, bom_entry)
-            #resolve all group instances created out of this group:
-            for o_g in g.users_dupli_group:
-                #examine group instance
-                if o_g.dupli_group is None or len(o_g.dupli_group.objects) == 0:
-                    if debug:
-                        print('dupli group/group instance was None/null or no objects'
-                                'were contained. Object count: ', len(o_g.dupli_group.objects))
-                    continue
-                
-                bom_entry = build_and_store_bom_entry(context, o_g)
-                #build_bom_entry() is not enough as we have to keep track of the occurence counts => and store
-                append_bom_entry_to_file(context, bom_entry)
-        
-            
-            continue#no further examination of the group's objects
-        
-        #######
-        # RESOLVE GROUP TO OBJECTS
-        #######
-        #Then in this mode all the objects that make up the group are put into the bill of materials separately.
-        for o in g.objects:
-            bom_entry = build_and_store_bom_entry(context, o)
-            #build_bom_entry() is not enough as we have to keep track of the occurence counts => and store
-            append_bom_entry_to_file(context, bom_entry)
-            
 
-        
 
-        
-    #Everything was fine then!
-    return True#selection_result
-    
-    ############
-    #act-furthermore
-    ############
-    #nothing so far ..
-    #but a smiley :) highly underestimated
+#
+#
+#
+def export_actor_related_files_recursively(context, export_context, o):
+    return run_to_completion(export_actor_related_files_stepwise(context, export_context, o))
 
 
 
 #
+# Generator variant of the above, yields after each exported variant.
 #
-#
-all_exported_actors = []
-create_actor_recursion_depth = 0
-def export_actor_related_files_recursively(context, o):
-    global all_exported_actors  # To allow writing access to the global variable.
-    global create_actor_recursion_depth
-    create_actor_recursion_depth = create_actor_recursion_depth + 1
-    
-    if (create_actor_recursion_depth > after_how_many_create_actor_recursions_to_abort):
-        if debug:
-            print('Failed creating all actors and their related files in time. Recursion limit exceeded: '
-                    , create_actor_recursion_depth)
-        return {'CANCELLED'}
+def export_actor_related_files_stepwise(context, export_context, o):
+    # The depth of the props' recursion, not the count of actors visited:
+    export_context.create_actor_recursion_depth = export_context.create_actor_recursion_depth + 1
+    try:
+        if (export_context.create_actor_recursion_depth > after_how_many_create_actor_recursions_to_abort):
+            print('Failed creating the actor of ', o.name, '. Recursion limit exceeded: '
+                    , export_context.create_actor_recursion_depth)
+            return {'CANCELLED'}
+        return (yield from export_actor_stepwise(context, export_context, o))
+    finally:
+        export_context.create_actor_recursion_depth = export_context.create_actor_recursion_depth - 1
+
+
 
+#
+# Exports the actor of the object with its variants, props, meshes, textures and animations.
+# @return the Actor
+#
+def export_actor_stepwise(context, export_context, o):
     if debug:
         print('Encountered: ', o, ' type: ', type(o))
    
@@ -329,7 +485,7 @@ def export_actor_related_files_recursively(context, o):
     if (o is list or type(o) is list):
         last_created_actor = None
         for o1 in o:
-            last_created_actor = create_bom_entry_recursively(context, o1)
+            last_created_actor = yield from export_actor_stepwise(context, export_context, o1)
         return last_created_actor
 
 
@@ -338,7 +494,7 @@ def export_actor_related_files_recursively(context, o):
     #-------
     elif ( (o is object) or (type(o) is object) or (type(o) is bpy.types.Object) ):
         
-        print('Encountered an object: ', o, ' blender-Type: ', o.type)
+        print('Encountered an object: ', o, ' blender-Type: ', export_context.scene_snapshot.type_of(o))
         
     else:
         if debug:
@@ -351,20 +507,33 @@ def export_actor_related_files_recursively(context, o):
     # should have a consistent subfolder structure as both are content paths.
     ############
     mesh_filelink_base = os.path.join(
-            context.scene.export_to_0ad_in_target_path_base,
-            context.scene.export_to_0ad_in_target_path_mod,
+            get_target_mod_path(context),
             context.scene.export_to_0ad_in_target_mesh_folder,
             "" # <-- add the correct slash at the end.
     )
     texture_filelink_base = os.path.join( # + o.data.uv_textures.active.name #+ ".png
-            context.scene.export_to_0ad_in_target_path_base,
-            context.scene.export_to_0ad_in_target_path_mod,
+            get_target_mod_path(context),
             context.scene.export_to_0ad_in_target_texture_folder,
             "" # <-- add the correct slash at the end.
     )
+    actor_filelink_base = os.path.join(
+            get_target_mod_path(context),
+            context.scene.export_to_0ad_in_target_actor_folder,
+            "" # <-- add the correct slash at the end.
+    )
+    ensure_filelink_not_exists = not context.scene.export_to_0ad_in_overwrite_existing
+    actor_filelink = build_filelink(context, o.name, ".xml", ensure_filelink_not_exists, actor_filelink_base, export_context)
     
+    # Completed in an interrupted previous run? Then all its props are completed too (as those are created first):
+    if (export_context.journal.is_completed('actor', actor_filelink)):
+        print('Resuming: Skipping actor completed in the interrupted run: ' + actor_filelink)
+        return Actor(actor_filelink, o)
     
-    actor = Actor()  # implicitely calling the Actor class' __init__ method. (the constructor)
+    
+    actor = Actor(actor_filelink, o)  # implicitely calling the Actor class' __init__ method. (the constructor)
+    actor_cost = ActorCost(actor_filelink)
+    is_budget_reported = context.scene.export_to_0ad_in_report_budgets
+    export_context.profile_memory('actor begin', o.name)
     
     ##########
     # OBJECTS (including group instances as those are attached to objects, see dupligroup 
@@ -374,179 +543,180 @@ def export_actor_related_files_recursively(context, o):
     #TIDY UP ACTOR VARIANTS XML (Summarize)
     # Figure variants, highly redundant, i.e. each mesh has a variant for each of its UV assigned textures:
     variants = []
-    object_prefix = o.name.split("__")[0] #getBaseName() #separated_by_double_underscore to allow for single underscores.
-    # If highest automatic highest level parent resolving is deactivated, then this may well be a custom selection we shall operate on:
-    if (context.scene.export_to_0ad_in_mode != '0'):#not context.scene.export_to_0ad__auto_resolve_parent):
-        object_references = context.selected_objects.copy()
-    # Else we search all equal-prefixed object from within the full set of this scene's objects. (TODO From visible layers only.)
-    else:
-        object_references = context.scene.objects
-    
-    # all other variant properties depend on the mesh variants, i.e. variant objects and their textures and props:
-    all_objects_with_this_prefix = filterObjectsByRegex(object_references,
-            '^' + object_prefix)
-    # <-- the mesh variants,i.e. collada filelinks can be derived from the objects directly without export as all existing files will be overridden using the objectname, never changing it!
-                                                     # no deepcopy as the objects in the dictionary
-                                                     # shall keep their live character, i.e. stay a reference!
-                                                     # This was required because we have to create new
-                                                     # temporary selections later on while diving
-                                                     # deep in the create_bom_entry_recursion adventure!
-    all_objects_with_this_prefix_index = -1
-    # form it into variants : #TODO Properly group it in the toXml() method.
-    
-    while ++all_objects_with_this_prefix_index < len(all_objects_with_this_prefix):
-        object_with_this_prefix = all_objects_with_this_prefix[all_objects_with_this_prefix_index]
+    # The mesh variants: the visible meshes sharing the prefix, either of the selection (custom selection)
+    # or of all of this scene's objects (automatic highest level parent resolving).
+    variant_objects = [bpy.data.objects[name] for name in plan_variant_object_names(
+            export_context.scene_snapshot, o.name, context.scene.export_to_0ad_in_mode != '0')]
+    
+    # Optionally pack the distinct skins of all variants of this actor into one atlas:
+    texture_atlas = None
+    if (context.scene.export_to_0ad_in_texture_atlas):
+        texture_atlas = build_texture_atlas(
+                collect_diffuse_images(variant_objects),
+                build_filelink(context, o.name + '_atlas', '.png', False, texture_filelink_base, export_context),
+                context.scene.export_to_0ad_in_texture_atlas_max_size,
+                export_context
+        )
+        if (not texture_atlas is None):
+            export_context.record_written_file('texture', texture_atlas.filelink)
+            export_context.texture_memory[texture_atlas.filelink] = estimate_texture_memory(texture_atlas.width, texture_atlas.height, True)
+    
+    for object_with_this_prefix in variant_objects:
         object_with_this_prefix_duplicate = None
         
-        #Is object type considered? (not considered are e.g. armatures.)
-        #dupligroup/groupinstance can theoretically be attached to any object, but we only consider those:
-        #if (not is_object_type_considered(o.type)):#(o_bjects has to be an object for type to exist)
-        if (object_with_this_prefix.type != 'MESH'):
-            continue
-        
-        if (not object_with_this_prefix.is_visible(context.scene)):
-            if debug:
-                print('Object ', object_with_this_prefix,' is not visible in the current scene: ', context.scene)
-            continue
+        export_context.progress.enter_phase('exporting ' + object_with_this_prefix.name)
         
         # create the variant for this mesh: (each variant will get the uv_map's name to allow for picking the correct variant according to unit state)
         variant = Variant()
         # build output filename:
-        ensure_filelink_not_exists = context.scene.export_to_0ad_in_overwrite_existing
-        variant.mesh = Mesh(build_filelink(context, object_with_this_prefix.name, ".dae", ensure_filelink_not_exists, mesh_filelink_base))
+        variant.mesh = Mesh(build_filelink(context, object_with_this_prefix.name, ".dae", ensure_filelink_not_exists, mesh_filelink_base, export_context))
+        variant_cost = VariantCost(object_with_this_prefix.name)
+        actor_cost.variants.append(variant_cost)
         
-        texture_variants = {}
+        texture_variants = []
         # one (the 2nd!) UV map for ao and one for diffuse (the 1st): all others are seen as variants but are omitted currently. TODO how to distinguish texture types and variants. TODO Use _norm and _ao to figure it out? !! NO! => Those are generated, thus this indeed are variants and not textures.
         # => Texture variants are assigned to the same UV map.
-        uv_textures = []
-        uv_textures = object_with_this_prefix.data.uv_textures
+        uv_maps = plan_texture_images(export_context.scene_snapshot, object_with_this_prefix.name)
+        if (not texture_atlas is None):
+            # The atlas replaces the separate skins:
+            variant.textures.append(Texture(os.path.relpath(texture_atlas.filelink, texture_filelink_base), "baseTex"))
+            variant_cost.textures.add(texture_atlas.filelink)
+            uv_maps = []
         is_at_least_one_uv_map_with_one_texture_found = False
-        for mesh_texture_polylayer in uv_textures:#.items: 
-            uv_map_name = mesh_texture_polylayer.name
+        for uv_map_name, image_records in uv_maps:
             print('uv_map_name: ' + uv_map_name)
-            # iterate each quad or poly (since BMesh is supported by blender, i.e. since 2.61+)
             texture_variants_count = 0
             is_at_least_one_texture_found = False
-            for mesh_texture_poly in mesh_texture_polylayer.data: # type of mesh_texture_poly.image is Image
+            for image_record in image_records:
                 texture_variant = Variant()
                 texture_variants_count += 1
                 texture_variant.name = uv_map_name + '' + str(texture_variants_count) #+ random.randint()
-                if (mesh_texture_poly.image == None or mesh_texture_poly.image.filepath == ""):
-                    print(str(mesh_texture_poly) + ' has no image assigned ('+ str(mesh_texture_poly.image) +') or the image filepath is empty.')
-                    continue
                 is_at_least_one_texture_found = True
                 is_at_least_one_uv_map_with_one_texture_found = True
-                print('Found image: filepath: ' + mesh_texture_poly.image.filepath + '   raw: ' + mesh_texture_poly.image.filepath_raw)
-                texture_variant.textures.append(Texture(mesh_texture_poly.image.filepath, "baseTex"))
-                # file_format UPPERCASE
-                # if image not exists in textures/skins/... output directory, then create it:
-                parts = mesh_texture_poly.image.filepath.split("\/");
-                #output_filelink = build_filelink(context, parts[len(parts) - 1], "", ensure_filelink_not_exists, texture_filelink_base)
-                texture_output_filelink = bpy.path.abspath(os.path.join(texture_filelink_base, parts[len(parts) - 1]))
+                print('Found image: filepath: ' + image_record.filepath)
+                # Saved or found already for another scene of the run?
+                texture_key = (image_record.name, texture_filelink_base,
+                        None if export_context.texture_normalizer is None else export_context.texture_normalizer.settings)
+                texture_output_filelink = export_context.texture_filelinks.get(texture_key)
+                if (not texture_output_filelink is None):
+                    export_context.progress.textures_shared_count += 1
+                elif (not export_context.texture_normalizer is None):
+                    # Resized to a power of two (and the mipmaps generated) in the worker pool:
+                    texture_output_filelink = export_context.texture_normalizer.normalize(
+                            bpy.data.images[image_record.name], os.path.join(texture_filelink_base, image_record.file_name))
+                    export_context.texture_filelinks[texture_key] = texture_output_filelink
+                else:
+                    # if image not exists in textures/skins/... output directory, then create it:
+                    texture_output_filelink = os.path.join(texture_filelink_base, image_record.file_name)
+                    # The same image may already be in the mod under another name:
+                    existing_texture_filelink = export_context.find_existing_copy('texture', image_record.absolute_filepath)
+                    if (not existing_texture_filelink is None):
+                        print('Reusing the identical texture already in the mod: ' + existing_texture_filelink)
+                        texture_output_filelink = existing_texture_filelink
+                    if not export_context.is_existing_file(texture_output_filelink):
+                        # Staged, as it may go into the archive:
+                        staging_filelink = get_staging_filelink(texture_output_filelink, export_context)
+                        bpy.data.images[image_record.name].save_render(staging_filelink) # save() doesn't take a filepath argument but saves to the source filepath (original texture filepath). The difference is subtle but significant here as we it's not certain that the texture already exists in the correct place, i.e. the texture destination directory specified in the blender GUI. 
+                        replace_if_changed(staging_filelink, texture_output_filelink, export_context)
+                        export_context.record_written_file('texture', texture_output_filelink)
+                    export_context.texture_filelinks[texture_key] = texture_output_filelink
                 print('texture output_filelink: ' + texture_output_filelink)
-                if not os.path.isfile(texture_output_filelink):
-                    mesh_texture_poly.image.save_render(texture_output_filelink) # save() doesn't take a filepath argument but saves to the source filepath (original texture filepath). The difference is subtle but significant here as we it's not certain that the texture already exists in the correct place, i.e. the texture destination directory specified in the blender GUI. 
+                if (not texture_output_filelink in export_context.texture_memory):
+                    image = bpy.data.images[image_record.name]
+                    width, height = image.size
+                    if (not export_context.texture_normalizer is None):
+                        width, height = export_context.texture_normalizer.get_size(width, height)
+                    export_context.texture_memory[texture_output_filelink] = estimate_texture_memory(
+                            width, height, image.use_alpha and image.depth in (32, 64, 128))
+                variant_cost.textures.add(texture_output_filelink)
+                texture_variant.textures.append(Texture(os.path.relpath(texture_output_filelink, texture_filelink_base), "baseTex"))
+                texture_variants.append(texture_variant)
             if (not is_at_least_one_texture_found):
                 print('UV map: ' + uv_map_name + ' has no texture assigned.')
         # append each variant + its mesh as those are tightly connected, i.e. depending on the mesh's UV map, a texture fits or does not:
-        if (not is_at_least_one_uv_map_with_one_texture_found):
+        if (not is_at_least_one_uv_map_with_one_texture_found and texture_atlas is None):
             print('Object: ' + object_with_this_prefix.name + ' has no UV map with a texture assigned.')
             
-        for texture_variant in texture_variants:
-            texture_variant.mesh = variant.mesh
-            variants.append(texture_variant) 
-            
         #################
         # For each mesh variant (object with same prefix) also try to build props:
         #props_actors = [] #"<props>"
-        children_index = -1 
-        while children_index < len(object_with_this_prefix.children) - 1:
-            children_index += 1
-            child_object = object_with_this_prefix.children[children_index]
-            # it's a mesh child: (add a prop point empty)
+        for prop_object_name, attachpoint_object_name in plan_props(export_context.scene_snapshot, object_with_this_prefix.name, export_context.prop_attachments):
             prop = Prop()
-            # Note: Curves are converted to mesh.
-            if (not is_object_type_considered(child_object.type)):
-                print('object type: ' + child_object.type + ' is marked as not to be considered.')
+            prop.prop_object = bpy.data.objects[prop_object_name] # because we need its reference to acces the object's name to properly name the prop-point.
+            prop.object_to_derive_attachpoint_name_from = bpy.data.objects[attachpoint_object_name]
+            prop.actor = yield from export_actor_related_files_stepwise(context, export_context, prop.prop_object) # <-- after this call, all child actor variants + mesh have been exported and are available in the filesystem.
+            if (not isinstance(prop.actor, Actor)):
+                # E.g. the recursion limit was exceeded:
+                print('Skipping the prop ', prop_object_name, ' as its actor could not be created: ', prop.actor)
                 continue
-            if (child_object.type == "EMPTY"):
-                # It will be selected in the next while loop, but it may be possible that empties have children, but still empties somehow had to be skipped and their children exported instead and all those child actor filepaths then need to be returned instead of the single empty-filepath (which doesn't exist as empties are prop points and don't exist in their standalone .dae file but only in their parent object's .dae file.).
-                # attach several meshes/actors to the same prop point:
-                for child_child in child_object.children:
-                    print("Exporting children of an EMPTY child object not yet guarantueed to generate valid output.")
-                    child_child_prop = Prop()
-                    child_child_prop.prop_object = child_child
-                    child_child_prop.object_to_derive_attachpoint_name_from = child_object
-                    child_child_prop.actor = export_actor_related_files_recursively(context, child_child)
-                    child_child_prop.attachpoint = None# <-- placeholder because "prop-" + child_child.name can't be guarantueed to be the correct attachpoint name as we recurse further and change the selection or add objects potentially renaming this object!
-                    variant.props.append(child_child_prop)
-                continue
-            # It's a mesh or curve:
-            prop.prop_object = child_object  # because we need its reference to acces the object's name to properly name the prop-point.
-            prop.object_to_derive_attachpoint_name_from = child_object
-            prop.actor = export_actor_related_files_recursively(context, child_object) # <-- after this call, all child actor variants + mesh have been exported and are available in the filesystem.
-            prop.attachpoint = None # <-- placeholder. Will be set in a later loop.
+            # The actor is referenced relative to the actor folder:
+            prop.actor_filelink_relative = intern_path(os.path.relpath(prop.actor.filelink, actor_filelink_base))
+            prop.attachpoint = None # <-- placeholder. Will be set in compute_prop_points().
             variant.props.append(prop)
+            prop_cost = export_context.actor_costs.get(prop.actor.filelink)
+            if (not prop_cost is None):
+                variant_cost.props.append(prop_cost)
             
+        # The prop points of all props of this variant in one pass (no empties are created for those):
+        prop_points = compute_prop_points(object_with_this_prefix, variant.props)
+        
+        # The actions of the armature deforming this mesh:
+        if (context.scene.export_to_0ad_in_export_animations):
+            variant.animations = export_animations(context, export_context, object_with_this_prefix)
+        
+        # The ambient occlusion map baked for the 2nd UV map (if the mesh has one):
+        ambient_occlusion_filelink = None
+        if (context.scene.export_to_0ad_in_bake_ao and has_ambient_occlusion_uv_map(export_context.scene_snapshot, object_with_this_prefix.name)):
+            ambient_occlusion_filelink = build_filelink(context, object_with_this_prefix.name + ambient_occlusion_file_tag, '.png', False, texture_filelink_base, export_context)
+        
+        # Mesh completed in an interrupted previous run?
+        mesh_output_filelink = variant.mesh.filelink
+        if (context.scene.export_to_0ad_in_mesh_format == 'PMD'):
+            mesh_output_filelink = variant.mesh.filelink + pmd_cached_file_ending
+        variant_cost.mesh_filelink = mesh_output_filelink
+        if (export_context.journal.is_completed('mesh', mesh_output_filelink)):
+            print('Resuming: Skipping mesh completed in the interrupted run: ' + mesh_output_filelink)
+            # Its quality tiers are written with the actor, thus may be missing (decimated again or taken from the cache):
+            if (not export_context.quality_tier_generator is None):
+                mesh_data = read_written_file(variant.mesh.filelink, export_context)
+                if (not mesh_data is None):
+                    export_context.quality_tier_generator.generate_from_data(mesh_data, variant.mesh.filelink)
+            if (not ambient_occlusion_filelink is None and export_context.is_existing_file(ambient_occlusion_filelink)):
+                add_ambient_occlusion_texture(export_context, variant, variant_cost, ambient_occlusion_filelink, texture_filelink_base,
+                        context.scene.export_to_0ad_in_ao_size)
+            variants.extend(combine_texture_variants(variant, texture_variants))
+            yield
+            continue
+        # Exported already for another scene of the run (e.g. a linked object) with the same props and settings?
+        mesh_export_key = (object_with_this_prefix.name, repr(prop_points),
+                None if texture_atlas is None else texture_atlas.filelink,
+                context.scene.export_to_0ad_in_mesh_format, context.scene.export_to_0ad_in_optimize_meshes, len(variant.animations) > 0)
+        if (export_context.exported_meshes.get(mesh_output_filelink) == mesh_export_key):
+            print('Skipping mesh exported already for another scene: ' + mesh_output_filelink)
+            export_context.progress.meshes_shared_count += 1
+            if (not ambient_occlusion_filelink is None and export_context.is_existing_file(ambient_occlusion_filelink)):
+                add_ambient_occlusion_texture(export_context, variant, variant_cost, ambient_occlusion_filelink, texture_filelink_base,
+                        context.scene.export_to_0ad_in_ao_size)
+            variants.extend(combine_texture_variants(variant, texture_variants))
+            yield
+            continue
             
-        # If we were to duplicate all at once then we'd need to have a valid selection containing of the mesh + its already attached prop points (empties, the non-generated ones only!). --> see commits prior to 9
-        #bpy.ops.duplicate()
+        # All temporary objects are created in the scratch scene of the sandbox, never in the user's scene.
         # We have to duplicate each separately to keep track of which object was which:
         
-        duplicates_main_object_and_child_empties_only = []
-        
-        bpy.ops.object.select_all(action="DESELECT")
-        object_with_this_prefix.select = True
-        bpy.ops.object.duplicate()
-        print('active object:' + str(context.scene.objects.active) + ' after duplication of the object with this prefix')
-        object_with_this_prefix_duplicate = context.scene.objects.active
-        duplicates_main_object_and_child_empties_only.append(object_with_this_prefix_duplicate)
-        for child_object in object_with_this_prefix.children:
-            bpy.ops.object.select_all(action="DESELECT")
-            child_object.select = True
-            bpy.ops.object.duplicate()
-            # resolve its corresponding prop using the non duplicated object:
-            wasPropOrMainMeshFound = False
-            for p in variant.props:
-                if (p.object_to_derive_attachpoint_name_from == child_object):
-                    # => found the correct prop.
-                    p.prop_object_duplicate = context.scene.objects.active
-                    print('prop: ' + p + ' prop_object: ' + p.prop_object + ' prop_object_duplicate: ' + p.prop_object_duplicate)
-                    wasPropOrMainMeshFound = True
-                    break
-            if (not wasPropOrMainMeshFound):
-                print('Object '+ child_of_duplicate +' was not found.')
-            else:    
-                duplicates_main_object_and_child_empties_only.append(context.scene.objects.active)
-                    
-                
-        # For each child we've added a prop.
-        # Now add empties at the child position and select them:
-        for p in variant.props:
-            #prop_point_name = add_prop_point_at_child_object_origin(child_object)
-            bpy.ops.object.select_all(action="DESELECT")
-            # select exactly 1 object:
-            prop_point_object = p.prop_object_duplicate
-            if (p.prop_object_duplicate.type != 'EMPTY'):
-                # add emtpy, select, deselect the real (non-empty) empty.
-                p.prop_object_duplicate.select = True
-                bpy.ops.view3d.cursor_to_selected()
-                bpy.ops.object.add('EMPTY')    # <-- TODO: Does this keep up the selection? - Probably yes, but is it certain? 
-                prop_point_object = context.scene.objects.active
-            # parent to the current mesh variant object:
-            prop_point_object.parent = object_with_this_prefix_duplicate#p.prop_object_duplicate
-            duplicates_main_object_and_child_empties_only.append(prop_point_object)
-            # properly name the prop point empties
-            prop_point_object.name = "prop-" + p.object_to_derive_attachpoint_name_from.name
-            p.attachpoint = p.object_to_derive_attachpoint_name_from.name
-            # in blender it is ensured that this name assignment is successful, while other equal named empties might get renamed.
-            # Note: It is important that this does not happen in the upper while loop where we recurse on each child as each recursion layer may change the selection or the name as other objects are added with maybe identical names! Otherwise this might be a hard to find bug!
-            print(prop_point_object.name + ' ' + p.attachpoint)
-        
-
-
-        duplicate_objects_to_treat = []
-        group_objects_duplicates = []
+        duplicates_to_export = []
+        
+        # The duplicate gets the evaluated mesh, i.e. all modifiers applied. If animated, then it is
+        # skinned (in rest pose, deformed by a copy of the armature) such that the animations drive it:
+        armature = None
+        if (len(variant.animations) > 0):
+            armature = find_armature(object_with_this_prefix)
+        object_with_this_prefix_duplicate = export_context.sandbox.make_mesh_object(object_with_this_prefix, armature)
+        print('Duplicate ' + object_with_this_prefix_duplicate.name + ' of the object with this prefix created in the sandbox.')
+        duplicates_to_export.append(object_with_this_prefix_duplicate)
+        if (not texture_atlas is None):
+            remap_uvs_to_texture_atlas(object_with_this_prefix_duplicate.data, texture_atlas)
+        
         
         #Is a group instance?
         if (object_with_this_prefix.dupli_group):
@@ -558,115 +728,117 @@ def export_actor_related_files_recursively(context, o):
                 # If no objects are linked in the group instance then the creation of a BoM entry is pointless:
                 if debug:
                     print('It may be a group instance ', object_with_this_prefix.dupli_group, ' but has no objects: ', object_with_this_prefix.dupli_group.objects)
+                export_context.sandbox.clear()
                 continue
             
             # handle group instance here:
             # Resolving groups is not desired?
             if (True):#TODO context.scene.export_to_0ad_in_resolve_group_instances):
                 if debug:
-                    print('Group shall not be resolved. Is considered a standalone complete part/object on its own. All group objects will be duplicated and joined into a single object.')
-                #This object is functioning as a group instance container and resembles a standalone mechanical part! => join all gorup objects
+                    print('Group shall not be resolved. Is considered a standalone complete part/object on its own. All group objects will be converted to meshes and joined into a single object.')
+                #This object is functioning as a group instance container and resembles a standalone mechanical part! => join all group objects
+                group_objects_to_join = []
                 for group_object in object_with_this_prefix.dupli_group.objects:
-                    bpy.ops.object.select_all(action="DESELECT")
-                    # select exactly 1 object:
-                    group_object.select = True
-                    bpy.ops.duplicate()
-                    group_objects_duplicates.append(context.scene.objects.active)
+                    group_object_type = export_context.scene_snapshot.type_of(group_object)
+                    # Curves are converted to meshes, everything else can't be joined:
+                    if (group_object_type != 'MESH' and group_object_type != 'CURVE'):
+                        continue
+                    group_objects_to_join.append(group_object)
                     
-                for group_object_duplicate in group_objects_duplicates:   
-                    duplicate_objects_to_treat.append(context.scene.objects.active)
+                if (len(group_objects_to_join) > 0):
+                    # join all meshes into the first one (once per run, other instances of the group get a copy):
+                    group_objects_joined = export_context.sandbox.make_joined_mesh_object(group_objects_to_join)
+                    group_objects_joined.parent = object_with_this_prefix_duplicate
+                    duplicates_to_export.append(group_objects_joined)
                     
             else:
                 # TODO Each group object is an individual mesh. This is hard to do as we had to create a mesh + actor for each of the referenced group objects.
+                export_context.sandbox.clear()
                 continue 
-                
-                
-        else:
-            duplicate_objects_to_treat.append(object_with_this_prefix_duplicate)
-        
-        for o in duplicate_objects_to_treat:
-            # treat
-            bpy.ops.object.select_all(action="DESELECT")
-            # select exactly 1 object:
-            o.select = True
-            while (bpy.ops.object.modifier_apply()):
-                pass
-            bpy.ops.duplicates_make_real()
-        
-        if (len(group_objects_duplicates) > 0):
-            # convert if possible: TODO Move into previous loop?
-            for g_o_d in group_objects_duplicates:
-                if (g_o_d.type == 'CURVE'):
-                    bpy.ops.object.select_all(action="DESELECT")
-                    g_o_d.select = True
-                    bpy.ops.object.convert(target='MESH')  
-            # select all those:
-            bpy.ops.object.select_all(action="DESELECT")
-            for g_o_d in group_objects_duplicates:
-                if (g_o_d.type != 'MESH'):
-                    continue
-                g_o_d.select = True
-            
-            # join all meshes into the active object:
-            print('Joining into active object: ' + str(context.scene.objects.active))
-            bpy.ops.object.join()
-        else:
-            bpy.ops.object.select_all(action="DESELECT")
-            object_with_this_prefix_duplicate.select = True
-            
-        # At this point we have one resulting object which is selected. (non-mesh objects aren't selected)
             
         # Place the main mesh object duplicate at the scene's center to result in a proper origin prior to export: (otherwise the props appear everywhere with an offset, but not where they should appear.)
         object_with_this_prefix_duplicate.location = (0.0, 0.0, 0.0) # <-- child objects inherit this location. TODO check in the 0AD Atlas if the children's location has to be applied. 
-        #bpy.ops.view3d.cursor_to_center()
-        #bpy.ops.view3d.selection_to_cursor()    # TODO Despite child objects being moved with the parent object, do we need to apply each child's location?
-
+        # The armature keeps its placement relative to the skinned mesh:
+        for armature_object in export_context.sandbox.armature_objects:
+            armature_object.matrix_world = Matrix.Translation(-object_with_this_prefix.matrix_world.translation) * armature_object.matrix_world
 
-        # Before export:
-        # Select all that is required to be exported as COLLADA .dae: 
-        # That are the main object/mesh + its child empties, post processed (modifiers applied et alia).
-        # If the main object/mesh is a group instance (if a dupligroup is attached), then we resolve it, duplicate all recursively with its children, apply all modifiers and join them into one single mesh.
-        for duplicate in duplicates_main_object_and_child_empties_only:
-            duplicate.select = True
-
-        # Now the duplicates are selected.
-        
-        ## make active object:
-        #bpy.ops.object.select(object_with_this_prefix_duplicate)
 
         #################
         # EXPORT using the duplicates
         #################
-        selectedOnly = True
-        context.scene.collada_export(variant.mesh.filelink, apply_modifiers=True, selected=selectedOnly, include_children=True)#child_object_duplicate is the active object, thus selected and will be exported)
+        # That is the main object/mesh, post processed (modifiers applied et alia).
+        # If the main object/mesh is a group instance (if a dupligroup is attached), then the group objects have been joined into one single mesh.
+        # Staged next to the target, which is only replaced if the content changed (keeping the game's caches valid):
+        staging_filelink = get_staging_filelink(variant.mesh.filelink, export_context)
+        if (is_budget_reported):
+            mesh_cost = [count_mesh_cost(duplicate.data) for duplicate in duplicates_to_export]
+            export_context.mesh_costs[mesh_output_filelink] = (sum([c[0] for c in mesh_cost]), sum([c[1] for c in mesh_cost]))
+        export_context.sandbox.collada_export(staging_filelink, duplicates_to_export)
+        # The prop points are emitted straight into the exported mesh as nodes:
+        add_prop_points_to_collada(staging_filelink, object_with_this_prefix_duplicate.name, prop_points)
+        if (context.scene.export_to_0ad_in_optimize_meshes):
+            optimize_collada_meshes(staging_filelink)
+        # The engine's cached binary model, such that the game skips the conversion:
+        pmd_filelink = None
+        if (context.scene.export_to_0ad_in_mesh_format != 'COLLADA'):
+            pmd_filelink = convert_collada_to_pmd(staging_filelink, variant.mesh.filelink + pmd_cached_file_ending, export_context)
+            if (not pmd_filelink is None and pmd_filelink != mesh_output_filelink):
+                export_context.record_written_file('mesh', pmd_filelink)
+        # The decimated quality tiers next to the mesh (in the worker pool, written with the actor):
+        if (not export_context.quality_tier_generator is None):
+            export_context.quality_tier_generator.generate(staging_filelink, variant.mesh.filelink)
+        # The actor still references the .dae, the engine then loads the cached model instead:
+        if (not pmd_filelink is None and context.scene.export_to_0ad_in_mesh_format == 'PMD'):
+            os.remove(staging_filelink)
+            if (not get_archive(export_context, variant.mesh.filelink) is None):
+                export_context.archive.remove(variant.mesh.filelink)
+            elif (os.path.isfile(variant.mesh.filelink)):
+                os.remove(variant.mesh.filelink)
+                if (not export_context.mod_tree_index is None):
+                    export_context.mod_tree_index.forget_file(variant.mesh.filelink)
+        else:
+            replace_collada_if_changed(staging_filelink, variant.mesh.filelink, export_context)
+        export_context.record_written_file('mesh', mesh_output_filelink)
+        # Baked after the export, as the props are placed into the sandbox as occluders:
+        if (not ambient_occlusion_filelink is None):
+            baked_objects = [duplicate for duplicate in duplicates_to_export if len(duplicate.data.uv_textures) > 1]
+            if (len(baked_objects) > 0):
+                # Placed relative to the duplicate (which has been moved to the center) as in the scene:
+                relative_matrix = object_with_this_prefix_duplicate.matrix_world * object_with_this_prefix.matrix_world.inverted()
+                occluders = []
+                for prop in variant.props:
+                    if (export_context.scene_snapshot.type_of(prop.prop_object) in ('MESH', 'CURVE')):
+                        occluder = export_context.sandbox.make_mesh_object(prop.prop_object)
+                        occluder.matrix_world = relative_matrix * prop.prop_object.matrix_world
+                        occluders.append(occluder)
+                export_context.ambient_occlusion_cache.bake(export_context.sandbox, baked_objects, occluders,
+                        context.scene.export_to_0ad_in_ao_size, context.scene.export_to_0ad_in_ao_samples,
+                        context.scene.export_to_0ad_in_ao_distance, ambient_occlusion_filelink, export_context)
+                export_context.record_written_file('texture', ambient_occlusion_filelink)
+                add_ambient_occlusion_texture(export_context, variant, variant_cost, ambient_occlusion_filelink, texture_filelink_base,
+                        context.scene.export_to_0ad_in_ao_size)
+        export_context.exported_meshes[mesh_output_filelink] = mesh_export_key
+        # The duplicates are no longer required:
+        export_context.sandbox.clear()
             
-        variants.append(variant)
+        variants.extend(combine_texture_variants(variant, texture_variants))
+        yield
 
 
     # At this point all variants have been created. Now optionally, those could be merged.
+    export_context.profile_memory('variants exported', o.name)
 
 
-    # determine commons of all variants: (If we wanted to simplify, then we could pack it all into one group containing redundant variants. That'd be the easy way. We take the difficult, but less redundant branch. Note: Within one variant, attaching to the same attachpoint adds yet another prop to this point, while the first attachment to a prop-point in a variant will overwrite the other props that may have been attached by other selected variants of other (previous) groups.)
-    variant_containing_all_that_is_common = Variant()
-    #TODO determine commons: meshes, animations, textures, props (static garrisoning, i.e. non-simulation interactive), ...
-    # (remove found commons from their original variant in the process).
-    moveVariantCommonsToANewVariant(variants, variant_containing_all_that_is_common) # <-- that's an additional variant!
-    # Note: ^ modifies both variants and the new common variant as they are given by reference!
-
-    base_group = Group()
-    base_group.variants.append(variant_containing_all_that_is_common)
-    
-    # usually two:
-    # 1x the base group (containing exactly 1 variant that contains all that is common to all variants),
-    # 1x the group containing all other variants. (TODO Maybe even logically sub-distinguish this group further by creating more groups?)
-    variants_distinct_group = Group()
-    variants_distinct_group.variants = variants
+    # All variants go into one group containing redundant variants, the engine picks one of them.
+    #TODO determine commons of all variants (meshes, animations, textures, props) and move those into a base group
+    # coming first. Note: Within one variant, attaching to the same attachpoint adds yet another prop to this point, while the first attachment to a prop-point in a variant will overwrite the other props that may have been attached by other selected variants of other (previous) groups.
+    variants_group = Group()
+    variants_group.variants = variants
     #TODO distinct_variant_groups_settled_upon = furtherSubdivideTheVariantGroup(variant_group)
     
 
     actor.groups = []
-    actor.groups.append(base_group)
-    actor.groups.append(variants_distinct_group)
+    actor.groups.append(variants_group)
     ## TODO add all logical groups, i.e. the variants logically grouped (e.g. by textures, meshes, animation, props, ... e.g. all textures as a variant but Attention: That only works if EACH mesh is compatible with EACH texture. And so on.)
     #for g in distinct_variant_groups_settled_upon:
     #    actor.groups.append(g)
@@ -675,14 +847,23 @@ def export_actor_related_files_recursively(context, o):
 
     
     
-    actor_filelink = target_mod_path + "art/actors/" + target_subfolder + "/" + tidyUpName(o.name) + ".xml" #build_filelink(context)
-    if (write2file(actor.toXml(), actor_filelink)):
-        print('=> Created actor file: ' + actor + ' with content: ' + actor.toXml()) 
-        all_exported_actors.append(actor)
-        
-    for duplicate in duplicates:
-        bpy.ops.delete(duplicate)
+    # The textures of this actor are to be completed before the actor:
+    if (not export_context.texture_normalizer is None):
+        export_context.texture_normalizer.complete(export_context)
+    if (not export_context.quality_tier_generator is None):
+        export_context.quality_tier_generator.complete(export_context)
+    if (write_text_to_file(actor_filelink, actor.toXml(), export_context)):
+        print('=> Created actor file: ' + actor_filelink + ' with content: ' + actor.toXml()) 
+        export_context.record_written_file('actor', actor_filelink)
+        export_context.all_exported_actors.append(actor)
+        export_context.progress.actors_exported += 1
         
+    if (is_budget_reported):
+        actor_cost.complete(export_context.mesh_costs, export_context.texture_memory, get_budgets(context))
+        export_context.actor_costs[actor_filelink] = actor_cost
+        for violation in actor_cost.violations:
+            print('Budget exceeded by actor ' + actor_filelink + ': ' + violation)
+    export_context.profile_memory('actor end', o.name)
     return actor
 
 
@@ -692,16 +873,14 @@ def export_actor_related_files_recursively(context, o):
 #
 #
 #
-object_longest_label_len = 0
-def is_longest_object_label_then_store_len(o):
-    global object_longest_label_len
+def is_longest_object_label_then_store_len(export_context, o):
     #keep track of the longest object name to fill up with zeros not to break the bill of materials structure:
     o_label = getBaseName(o.name)
     letter_count = len(o_label)
-    if (letter_count > object_longest_label_len):
-        object_longest_label_len = letter_count
+    if (letter_count > export_context.object_longest_label_len):
+        export_context.object_longest_label_len = letter_count
     if debug:
-        print("Keeping track of longest object label's length. Longest length: ", object_longest_label_len)
+        print("Keeping track of longest object label's length. Longest length: ", export_context.object_longest_label_len)
 
 
 
@@ -711,10 +890,8 @@ def is_longest_object_label_then_store_len(o):
 #
 #
 #
-material_longest_label_len = 0
 #def is_longest_material_then_store_len(material):
-def is_longest_material_then_store_len(material_label='', material=None):
-    global material_longest_label_len
+def is_longest_material_then_store_len(export_context, material_label='', material=None):
     if (material is None and material_label == ''):
         return False
     #keep track of the longest material name to fill up with zeros not to break the bill of materials structure:
@@ -725,10 +902,10 @@ def is_longest_material_then_store_len(material_label='', material=None):
         m_label = getBaseName(material.name)
         
     letter_count = len(m_label)
-    if (letter_count > material_longest_label_len):
-        material_longest_label_len = letter_count
+    if (letter_count > export_context.material_longest_label_len):
+        export_context.material_longest_label_len = letter_count
     if debug:
-        print('Keeping track of longest material label\'s length. Longest length: ', material_longest_label_len)
+        print('Keeping track of longest material label\'s length. Longest length: ', export_context.material_longest_label_len)
 
 
 
@@ -752,6 +929,357 @@ def is_object_type_considered(object_type):
 
 
 
+#
+# Plain-data (picklable) snapshot of the scene state the planning depends on: the object
+# hierarchy, names, types, visibility, materials, dupli groups, UV maps and image references.
+# Each of those is read across the Python/RNA boundary once per export, thus the planning
+# (see the plan_* functions) runs on plain Python records, also without Blender.
+# Objects are referred to by name. Objects created after the snapshot was taken
+# (e.g. duplicates) are added on first lookup.
+#
+class SceneSnapshot():
+
+    __slots__ = ('scene_name', 'object_names', 'selected_names', 'objects', 'meshes', 'images', 'groups')
+
+    def __init__(self, scene = None):
+        self.scene_name = None
+        self.object_names = [] # <-- of the scene, in the scene's order
+        self.selected_names = []
+        self.objects = {}
+        self.meshes = {}
+        self.images = {}
+        self.groups = {}
+        if (scene is None):
+            return
+        self.scene_name = scene.name
+        self.object_names = [o.name for o in scene.objects]
+        # Group objects need not be linked to this scene, thus take all objects of the .blend:
+        for o in bpy.data.objects:
+            self.add(o, scene)
+
+    def add(self, o, scene = None):
+        if (scene is None):
+            scene = bpy.data.scenes[self.scene_name]
+        record = ObjectRecord(o.name, o.type)
+        record.parent = o.parent.name if (not o.parent is None) else None
+        record.children = [child.name for child in o.children]
+        record.is_visible = o.is_visible(scene)
+        record.is_hidden = o.hide
+        record.is_considered = is_object_type_considered(record.type)
+        layers = 0
+        layer_index = 0
+        for is_on_layer in o.layers:
+            if (is_on_layer):
+                layers |= 1 << layer_index
+            layer_index += 1
+        record.layers = layers
+        record.dimensions = tuple(o.dimensions)
+        record.location = tuple(o.matrix_world.translation)
+        if (not o.active_material is None):
+            record.active_material = o.active_material.name
+        if (not o.dupli_group is None):
+            record.dupli_group = self.add_group(o.dupli_group)
+        if (record.type == 'MESH'):
+            record.mesh = self.add_mesh(o.data)
+        self.objects[record.name] = record
+        return record
+
+    def add_group(self, group):
+        if (not group.name in self.groups):
+            self.groups[group.name] = GroupRecord(group.name, [o.name for o in group.objects])
+        return group.name
+
+    def add_mesh(self, mesh):
+        # Meshes may be shared by several objects:
+        if (not mesh.name in self.meshes):
+            uv_maps = []
+            for mesh_texture_polylayer in mesh.uv_textures:
+                # the distinct images in order of appearance:
+                image_names = []
+                for mesh_texture_poly in mesh_texture_polylayer.data:
+                    image = mesh_texture_poly.image
+                    if (image is None or image.filepath == ""):
+                        continue
+                    if (not image.name in self.images):
+                        self.images[image.name] = ImageRecord(image.name, image.filepath, bpy.path.abspath(image.filepath))
+                    if (not image.name in image_names):
+                        image_names.append(image.name)
+                uv_maps.append((mesh_texture_polylayer.name, image_names))
+            self.meshes[mesh.name] = MeshRecord(mesh.name, uv_maps)
+        return mesh.name
+
+    def update_selection(self, selected_objects):
+        self.selected_names = [o.name for o in selected_objects]
+
+    # Drops the record of the object, e.g. after it has been converted. It is recorded anew on the next lookup.
+    def forget(self, o):
+        self.objects.pop(o.name, None)
+
+    def record_of(self, o):
+        record = self.objects.get(o.name)
+        if (record is None):
+            record = self.add(o)
+        return record
+
+    def is_visible(self, o):
+        return self.record_of(o).is_visible
+
+    def is_hidden(self, o):
+        return self.record_of(o).is_hidden
+
+    def type_of(self, o):
+        return self.record_of(o).type
+
+    def is_mesh(self, o):
+        return self.record_of(o).type == 'MESH'
+
+    def is_considered(self, o):
+        return self.record_of(o).is_considered
+
+    def is_on_any_of_layers(self, o, layers):
+        return (self.record_of(o).layers & layers) != 0
+
+
+
+#
+# The plain-data records of the scene snapshot.
+#
+class ObjectRecord():
+
+    __slots__ = ('name', 'type', 'parent', 'children', 'is_visible', 'is_hidden', 'is_considered',
+            'layers', 'dimensions', 'location', 'active_material', 'dupli_group', 'mesh')
+
+    def __init__(self, name, object_type):
+        self.name = name
+        self.type = object_type
+        self.parent = None
+        self.children = []
+        self.is_visible = False
+        self.is_hidden = False
+        self.is_considered = is_object_type_considered(object_type)
+        self.layers = 0 # <-- bit mask, bit i is set if the object is on layer i.
+        self.dimensions = (0.0, 0.0, 0.0)
+        self.location = (0.0, 0.0, 0.0) # <-- of the origin, in world space.
+        self.active_material = None
+        self.dupli_group = None
+        self.mesh = None
+
+
+
+class MeshRecord():
+
+    __slots__ = ('name', 'uv_maps')
+
+    def __init__(self, name, uv_maps):
+        self.name = name
+        self.uv_maps = uv_maps # <-- (UV map name, distinct image names)
+
+
+
+class ImageRecord():
+
+    __slots__ = ('name', 'filepath', 'absolute_filepath', 'file_name')
+
+    def __init__(self, name, filepath, absolute_filepath):
+        self.name = name
+        self.filepath = filepath
+        self.absolute_filepath = absolute_filepath
+        self.file_name = re.split('[\\\\/]', filepath)[-1]
+
+
+
+class GroupRecord():
+
+    __slots__ = ('name', 'objects')
+
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = objects
+
+
+
+#
+# Plans the mesh variants of the actor of the given root object: the visible meshes sharing
+# its prefix, either of the selection or of all of the scene's objects.
+# @return the object names.
+#
+def plan_variant_object_names(snapshot, root_name, of_selection_only = False):
+    candidate_names = snapshot.object_names
+    if (of_selection_only):
+        candidate_names = snapshot.selected_names
+    object_prefix = parse_name(root_name).prefix #separated_by_double_underscore to allow for single underscores.
+    variant_object_names = []
+    for name in candidate_names:
+        if (not re.match('^' + object_prefix, name)):
+            continue
+        record = snapshot.objects[name]
+        #Is object type considered? (not considered are e.g. armatures.)
+        if (record.type != 'MESH'):
+            continue
+        if (not record.is_visible):
+            if debug:
+                print('Object ', name, ' is not visible in the scene: ', snapshot.scene_name)
+            continue
+        variant_object_names.append(name)
+    return variant_object_names
+
+
+
+#
+# Plans the props of a mesh variant: each considered child object is a prop attached to itself (as prop point),
+# the children of an EMPTY child object are all attached to the EMPTY (several props at the same prop point).
+# @param attachments the unparented props attached to the EMPTY objects, see plan_unparented_prop_attachments().
+# @return list of (prop object name, name of the object to derive the attachpoint name from)
+#
+def plan_props(snapshot, object_name, attachments = {}):
+    props = []
+    for child_name in snapshot.objects[object_name].children:
+        child = snapshot.objects[child_name]
+        # Note: Curves are converted to mesh.
+        if (not child.is_considered):
+            print('object type: ' + child.type + ' is marked as not to be considered.')
+            continue
+        if (child.type == 'EMPTY'):
+            # Empties are prop points and don't exist in their standalone .dae file but only in their parent object's .dae file.
+            for child_child_name in child.children:
+                print("Exporting children of an EMPTY child object not yet guarantueed to generate valid output.")
+                props.append((child_child_name, child_name))
+            for prop_name in attachments.get(child_name, []):
+                props.append((prop_name, child_name))
+            continue
+        # It's a mesh or curve:
+        props.append((child_name, child_name))
+    return props
+
+
+
+#
+# Plans the attachment of the props that are placed at, but not parented to, a prop point
+# (an EMPTY child object): Each visible unparented object is attached to the nearest prop point
+# within the tolerance (world distance of the origins), looked up in a KD-tree of all prop points.
+# Prop points of the object itself (or of the props attached to it) are skipped, avoiding cycles.
+# @return dict: EMPTY object name -> prop object names
+#
+def plan_unparented_prop_attachments(snapshot, tolerance):
+    prop_point_names = []
+    for name in snapshot.object_names:
+        record = snapshot.objects[name]
+        if (record.type == 'EMPTY' and not record.parent is None):
+            prop_point_names.append(name)
+    attachments = {}
+    if (len(prop_point_names) == 0):
+        return attachments
+    tree = kdtree.KDTree(len(prop_point_names))
+    for index, name in enumerate(prop_point_names):
+        tree.insert(snapshot.objects[name].location, index)
+    tree.balance()
+    
+    # The root object of each prop point, and for attached props the root object they got attached to:
+    roots = {}
+    for name in prop_point_names:
+        root_name = name
+        while (not snapshot.objects[root_name].parent is None):
+            root_name = snapshot.objects[root_name].parent
+        roots[name] = root_name
+    attached_to = {}
+    for name in snapshot.object_names:
+        record = snapshot.objects[name]
+        if (not record.parent is None or record.type == 'EMPTY' or not record.is_considered or not record.is_visible):
+            continue
+        for co, index, distance in sorted(tree.find_range(record.location, tolerance), key=lambda found: found[2]):
+            root_name = roots[prop_point_names[index]]
+            while (root_name in attached_to and root_name != name):
+                root_name = attached_to[root_name]
+            if (root_name == name):
+                continue
+            attachments.setdefault(prop_point_names[index], []).append(name)
+            attached_to[name] = roots[prop_point_names[index]]
+            if debug:
+                print('Attaching unparented prop ', name, ' to the nearest prop point ', prop_point_names[index], ' (distance: ', distance, ')')
+            break
+    print('Attached ', len(attached_to), ' unparented props to ', len(attachments), ' prop points.')
+    return attachments
+
+
+
+#
+# Whether the object's mesh has the 2nd UV map (the one for ambient occlusion).
+#
+def has_ambient_occlusion_uv_map(snapshot, object_name):
+    record = snapshot.objects[object_name]
+    return (not record.mesh is None) and len(snapshot.meshes[record.mesh].uv_maps) > 1
+
+
+
+#
+# Adds the baked ambient occlusion map to the variant's textures.
+#
+def add_ambient_occlusion_texture(export_context, variant, variant_cost, filelink, texture_filelink_base, size):
+    variant.textures.append(Texture(os.path.relpath(filelink, texture_filelink_base), "aoTex"))
+    variant_cost.textures.add(filelink)
+    if (not filelink in export_context.texture_memory):
+        export_context.texture_memory[filelink] = estimate_texture_memory(size, size, False)
+
+
+
+#
+# The variants of a mesh: one per skin (texture variant), each with the mesh variant's mesh, props, animations
+# and further textures (e.g. the ambient occlusion map). Without skins it's the mesh variant itself.
+#
+def combine_texture_variants(variant, texture_variants):
+    if (len(texture_variants) == 0):
+        return [variant]
+    for texture_variant in texture_variants:
+        texture_variant.mesh = variant.mesh
+        texture_variant.props = list(variant.props)
+        texture_variant.animations = list(variant.animations)
+        texture_variant.textures = texture_variant.textures + variant.textures
+    return texture_variants
+
+
+
+#
+# Plans the skins of a mesh variant: one (the 2nd!) UV map for ao and one for diffuse (the 1st), all others are seen as variants.
+# @return list of (UV map name, image records)
+#
+def plan_texture_images(snapshot, object_name):
+    record = snapshot.objects[object_name]
+    if (record.mesh is None):
+        return []
+    uv_maps = []
+    for uv_map_name, image_names in snapshot.meshes[record.mesh].uv_maps:
+        uv_maps.append((uv_map_name, [snapshot.images[name] for name in image_names]))
+    return uv_maps
+
+
+
+#
+# Plans the entry and material of the BOM entry of an object: The material is the
+# explicitely given one (see the name grammar), else the active material, else for
+# group instances the first active material of the group objects.
+# @return (entry, material)
+#
+def plan_bom_material(snapshot, object_name):
+    record = snapshot.objects[object_name]
+    entry = getBaseName(object_name)
+    material = '-'
+    if (not record.active_material is None):
+        material = getBaseName(record.active_material)
+    elif (not record.dupli_group is None):
+        print('It\'s a dupli group attached to this object. => This is a group instance. => Resolving material from its objects.')
+        for group_object_name in snapshot.groups[record.dupli_group].objects:
+            group_object = snapshot.objects.get(group_object_name)
+            if (not group_object is None and not group_object.active_material is None):
+                material = getBaseName(group_object.active_material)
+                break#leave the loop as we have achieved our goal
+    parsed_name = parse_name(object_name)
+    if (not parsed_name.material is None):
+        material = parsed_name.material     #material given explicitely, e.g. Aluminium (Isotope XY)
+        entry = parsed_name.entry
+    return entry, material
+
+
+
 
 #
 # Builds a BOM ENTRY from an object.
@@ -772,118 +1300,59 @@ def is_object_type_considered(object_type):
   
   
   
-bom_entry_count_map = {}
+#
+# Writes the bill of materials of the objects into the target mod folder: One line per
+# distinct BoM entry, preceded by the count of the objects resulting in this entry.
+# @return the filelink of the bill of materials.
+#
+def write_bill_of_materials(context, export_context, objects):
+    objects = [o for o in objects if export_context.scene_snapshot.is_considered(o)]
+    # The columns are aligned to the longest labels:
+    for o in objects:
+        is_longest_object_label_then_store_len(export_context, o)
+        is_longest_material_then_store_len(export_context, material=o.active_material)
+    bom_entries = []
+    for o in objects:
+        bom_entry = build_and_store_bom_entry(context, export_context, o)
+        if (not bom_entry in bom_entries):
+            bom_entries.append(bom_entry)
+    text = 'BILL OF MATERIALS OF SCENE ' + context.scene.name + '\r\n'
+    for bom_entry in bom_entries:
+        text = text + '\r\n' + str(export_context.bom_entry_count_map[bom_entry]) + 'x ' + bom_entry
+    filelink = os.path.join(get_target_mod_path(context), bill_of_materials_filename_prefix + bpy.path.clean_name(context.scene.name) + '.txt')
+    write_text_to_file(filelink, text, export_context)
+    print('Bill of materials written: ', filelink, ' (', len(bom_entries), ' entries)')
+    return filelink
+
+
+
 #def init_bom_entry_count_map():
 #   pass
-def build_and_store_bom_entry(context, o):#http://docs.python.org/2/tutorial/datastructures.html#dictionaries =>iteritems()
-    bom_entry = build_bom_entry(context, o)#http://docs.python.org/3/tutorial/datastructures.html#dictionaries => items() 
+def build_and_store_bom_entry(context, export_context, o):#http://docs.python.org/2/tutorial/datastructures.html#dictionaries =>iteritems()
+    bom_entry = build_bom_entry(context, export_context, o)#http://docs.python.org/3/tutorial/datastructures.html#dictionaries => items() 
     if debug:
         print('Generated BoM entry: ', bom_entry)
     
     #keep track of how many BoM entries of same type have been found
-    if (not (bom_entry in bom_entry_count_map)):
+    if (not (bom_entry in export_context.bom_entry_count_map)):
         if debug:
             print('From now on keeping track of bom_entry count of ', bom_entry)
-        bom_entry_count_map[bom_entry] = 0
+        export_context.bom_entry_count_map[bom_entry] = 0
     
-    bom_entry_count_map[bom_entry] = bom_entry_count_map[bom_entry] + 1
+    export_context.bom_entry_count_map[bom_entry] = export_context.bom_entry_count_map[bom_entry] + 1
     if debug:
-        print('-> new part count: ', bom_entry_count_map[bom_entry], 'x ', bom_entry)
+        print('-> new part count: ', export_context.bom_entry_count_map[bom_entry], 'x ', bom_entry)
     return bom_entry
     
     
     
- 
-#    
-#g: bpy.types.Group not a group instance, i.e. no object with dupli group bpy.types.Group attached
-def build_and_store_bom_entry_out_of_group(context, g):
-    #return build_and_store_bom_entry_out_of_group(context, g)
-    return '\r\nBuilding bom entry out of group not supported yet. Possibly solve it analoguously to group instance dimension resolving.'
-
-    
 
-def build_bom_entry(context, o):    
+def build_bom_entry(context, export_context, o):
     #build BoM entry: using http://www.blender.org/documentation/blender_python_api_2_69_release/bpy.types.Object.html
-    entry = getBaseName(o.name)
-    
-    index = -1
-    material = '-'
-    if (o.active_material is None):
-        if debug:
-            print('Object ', o, ' has no active material.')
-        if (not (o.dupli_group is None)):
-            print('It\'s a dupli group attached to this object. => This is a group instance. => Resolving material from its objects.')
-            found_material_within_group_objects = False
-            for group_object in o.dupli_group.objects:
-                if (not (group_object.active_material is None)):
-                    found_material_within_group_objects = True
-                    material = getBaseName(group_object.active_material.name)
-                    break#leave the loop as we have achieved our goal
-            if (debug and not found_material_within_group_objects):
-                print('Found no next best material within the attached group object members: ', o.dupli_group.objects)
-    else:
-        material = getBaseName(o.active_material.name)    #default value
-        
-    #look for a material explicitely specified:
-    index = o.name.find('material:')
-    if (index != -1):
-        parts = o.name.split('material:')
-        if (len(parts) > 1):
-            material = parts[1]     #material given explicitely, e.g. Aluminium (Isotope XY)
-        entry = parts[0]            
-    else:
-        index = o.name.find('Material:')
-        if (index != -1):
-            parts = o.name.split('Material:')
-            if (len(parts) > 1):
-                material = parts[1]
-            entry = parts[0]
-        else:
-            index = o.name.find('mat:')
-            if (index != -1):
-                parts = o.name.split('mat:')
-                if (len(parts) > 1):
-                    material = parts[1]
-                entry = parts[0]
-            else:
-                index = o.name.find('Mat:')
-                if (index != -1):
-                    parts = o.name.split('Mat:')
-                    if (len(parts) > 1):
-                        material = parts[1]
-                    entry = parts[0]
-                else:
-                    index = o.name.find('M:')
-                    if (o.name.find('M:') != -1):
-                        parts = o.name.split('M:')
-                        if (len(parts) > 1):
-                            material = parts[1]
-                        entry = parts[0]
-                    else:
-                        index = o.name.find('m:')
-                        if (index != -1):
-                            parts = o.name.split('m:')
-                            if (len(parts) > 1):
-                                material = parts[1]
-                            entry = parts[0]
+    entry, material = plan_bom_material(export_context.scene_snapshot, export_context.scene_snapshot.record_of(o).name)
                 
     #keep track of the longest material label
-    is_longest_material_then_store_len(material_label=material)
-    
-    #dimensions
-    context.scene.objects.active = o
-    result = {'CANCELLED'}
-    operations_to_undo_count = 0
-    #if (not (context.scene.objects.active is None)):
-    #    #because multi-user mesh does not allow applying modifiers
-    #    if (bpy.ops.object.make_single_user(object=True, obdata=True)):#, material=True, texture=True, animation=True)):
-    #        operations_to_undo_count = operations_to_undo_count + 1
-    #        for m in o.modifiers:
-    #            result = bpy.ops.object.modifier_apply(modifier=m.name)
-    #            #bpy.ops.object.modifier_apply()#'DATA', '')#applies on the active object
-    #            if (result):
-    #                operations_to_undo_count = operations_to_undo_count + 1
-    
+    is_longest_material_then_store_len(export_context, material_label=material)
     
     #######
     # DIMENSIONS
@@ -891,89 +1360,24 @@ def build_bom_entry(context, o):
     #TODO don't take the absolute bounding_box dimensions -instead calculate form object.bounding_box (list of 24 space coordinates)
     #A group instance? (dupli group empties/objects where a dupli group is attached may have no dimensions or zero).
     #undo_count = 0 #now working with a copy of the initially selected_objects (no longer a live copy/reference)
-    x = o.dimensions[0]
-    y = o.dimensions[1]
-    z = o.dimensions[2]
+    x, y, z = export_context.scene_snapshot.record_of(o).dimensions
     if (not (o.dupli_group is None)):
-        if debug:
-            print('Creating temporary selection.')#To be undone or unexpected results will
-            # occur as the loop uses a live copy of selection. <-- No longer valid!
-            # Now using a copy of the dict for the recursion create_bom_entry_recursively.
-        
-        #ensure nothing is selected
-        if (not bpy.ops.object.select_all(action="DESELECT")):
-            print('There seems to be already no selection - that may be interesting, but as we work with a copy it should not matter. Of importance is that now nothing is selected anymore.')
-        #undo_count = undo_count + 1
-        o.select = True
-        #undo_count = undo_count + 1
-        
-        #BELOW THIS LINE NOTHING HAS TO BE UNDONE! AS THIS DUPLICATED OBJECT
-        #(GROUP INSTANCE) WILL SIMPLY BE DELETED AFTERWARDS.
-        if (not bpy.ops.object.duplicate()):#non-linked duplication of selected objects
-            print('duplicate failed')
-            
-        if (len(context.selected_objects) > 1):
-           print('Only one object (the group instance) should have been selected.\r\nSelection: ', context.selected_objects, '. Thus dimension will only reflect those of the dupli group objects of the first selected group instance object.')
-        context.scene.objects.active = context.selected_objects[0]
-        if debug:
-            print('active object after duplication of group instance: ', context.active_object, ' or :', context.scene.objects.active)
-     
-        # That this condition is true is very UNLIKELY!  
-        if (context.scene.objects.active.dupli_group is None):
-            print('The active object is no group instance after the duplication for determining dimension!? Looking for a group instance in selection now ...')
-            is_group_instance_found = False
-            #This loop is a not very likely as we have or rather should only one object in the selection!
-            for selected_o in context.selected_objects:
-                if (not(selected_o.dupli_group is None)):
-                   context.scene.objects.active = selected_o
-                   is_group_instance_found = True
-                   print('found ', selected_o)
-                   break
-                else:
-                   selected_o.select = False#TODO is that a good idea or even required?
-            if (not is_group_instance_found):
-                print('No group instance found in temporarey selection. Aborting ...')
-
-        
-        #the active object (group instance) should be the only selected one:
-        bpy.ops.object.duplicates_make_real(use_base_parent=True)#false because we don't set up
-                #the empty group instance as parent of the now copied and no longer referenced group objects!
-                #The dupli group attached to this object
-                #is copied here as real value object copies (not references).
-        
-        #new group instance hopefully is the active object now:
-        group_objects_count = 0
-        for group_object in context.scene.objects.active.children:#dupli_group.objects:
-            if (group_object.type == 'EMPTY' or group_object.type == 'Armature'):
-                #and is_object_type_considered(group_object_type)):
-                print ('Warning: Group object\'s type is EMPTY or ARMATURE. Skipping it as these have no dimensions anyway.')
+        # The group objects are converted to meshes and joined within the sandbox, never in the user's scene:
+        group_objects_duplicates = []
+        for group_object in o.dupli_group.objects:
+            group_object_type = export_context.scene_snapshot.type_of(group_object)
+            if (group_object_type != 'MESH' and group_object_type != 'CURVE'):
+                print ('Warning: Group object\'s type is ', group_object_type, '. Skipping it as these have no dimensions anyway.')
                 continue
-            if (not group_object.type == 'MESH'):
-                group_object.select = False #required because of joining only allows mesh or curve only - no mix!
-            group_object.select = True
-            ++group_objects_count
-        #Note:
-        # The real objects that now reside where the group instance was before
-        # should already be selected after duplicates_make_real.
-        
-        
-        context.scene.objects.active = context.selected_objects[group_objects_count - 1]
-        if debug:
-            print(context.selected_objects, '\r\nactive_object: ', context.scene.objects.active)
-        #Attention: Poll fails because a context of joining into an empty (as this is the active object) is not valid!
-        if (not bpy.ops.object.join()):
-            print('Joining the temporary selection (dupli group made real) failed.')
-            #break
-            
+            group_objects_duplicates.append(export_context.sandbox.make_mesh_object(group_object))
         
-        x = context.scene.objects.active.dimensions[0]
-        y = context.scene.objects.active.dimensions[1]
-        z = context.scene.objects.active.dimensions[2]
+        if (len(group_objects_duplicates) > 0):
+            group_objects_joined = export_context.sandbox.join(group_objects_duplicates)
+            x = group_objects_joined.dimensions[0]
+            y = group_objects_joined.dimensions[1]
+            z = group_objects_joined.dimensions[2]
         
-        #now no longer required (copy instead of selected_object reference for recursion used now)
-        #while --undo_count > 0:
-        #    bpy.ops.ed.undo()
-        bpy.ops.object.delete(use_global=False)#The duplicate should reside in this context's scene only!
+        export_context.sandbox.clear()
         
 
     #measure
@@ -991,21 +1395,27 @@ def build_bom_entry(context, o):
     
     
     
-    #undo - restore the modifiers #if no active object then no modifiers have been applied hence nothing to be undone.
-    #if ( not (context.scene.objects.active is None) and not (result == {'CANCELLED'}) ):
-    #    operations_undone_count = 0
-    #    while (operations_undone_count < operations_to_undo_count): 
-    #        result = bpy.ops.ed.undo()#undo_history()
-    #        if (result):
-    #            operations_undone_count = operations_undone_count + 1
-    #    if debug:
-    #        print('operations_undone count: ', operations_undone_count)
-    
-    whitespace_count = object_longest_label_len - len(entry)
-    material_whitespace_count = material_longest_label_len - len(material)
+    whitespace_count = export_context.object_longest_label_len - len(entry)
+    material_whitespace_count = export_context.material_longest_label_len - len(material)
     if debug:
         print('object whitespace count: ', whitespace_count, '\t material whitespace count: ', material_whitespace_count)
     bom_entry = '\t \t' + entry + getWhiteSpace(whitespace_count) + '\t \tMaterial: ' + material + getWhiteSpace(material_whitespace_count) + '\t \t[x:' + dimensions[0] + ',y:' + dimensions[1] + ',z:' + dimensions[2] + ']'
+    
+    #######
+    # VOLUME, SURFACE AREA, MASS (of the evaluated meshes, i.e. modifiers applied)
+    #######
+    measures = measure_object(context, export_context, o)
+    if (not measures is None):
+        volume, area = measures
+        scale_length = context.scene.unit_settings.scale_length
+        digit_count = context.scene.export_to_0ad_in_digit_count
+        volume = volume * scale_length ** 3
+        area = area * scale_length ** 2
+        mass = '-'
+        density = material_densities.get(material.strip().lower())
+        if (not density is None):
+            mass = str(round(volume * density, digit_count)) + 'kg'
+        bom_entry = bom_entry + '\t \t[volume:' + str(round(volume, digit_count)) + unit + '^3,area:' + str(round(area, digit_count)) + unit + '^2,mass:' + mass + ']'
             #TODO take modifiers array, skin
             # and solidify into account (by e.g. applying all modifiers, examining and storing the dimensions and going
             #back in history to pre applying the modifiers!
@@ -1022,42 +1432,206 @@ def build_bom_entry(context, o):
  
 
 #
-# White space for filling up to a certain length.
+# The volume and surface area of the object's evaluated mesh (or of the meshes of its
+# dupli group) in world space (blender units).
+# @return (volume, area) or None if numpy is not available or the object has no mesh.
 #
-def getWhiteSpace(count):
-    whitespace = ''
-    for i in range(0, count - 1):
-        whitespace = whitespace + ' '
-    return whitespace
+def measure_object(context, export_context, o):
+    if (numpy is None):
+        return None
+    if (not o.dupli_group is None):
+        # The group objects are placed relative to the group's offset at the instance:
+        instance_matrix = numpy.array(o.matrix_world).dot(translation_matrix(-numpy.array(o.dupli_group.dupli_offset)))
+        measured_objects = [(go, instance_matrix.dot(numpy.array(go.matrix_world))) for go in o.dupli_group.objects]
+    else:
+        measured_objects = [(o, numpy.array(o.matrix_world))]
+    volume = 0.0
+    area = 0.0
+    is_measured = False
+    for measured_object, matrix in measured_objects:
+        if (measured_object.type != 'MESH' and measured_object.type != 'CURVE'):
+            continue
+        local_volume, cross_products = export_context.mesh_measures_cache.get_measures(measured_object, context.scene)
+        linear = matrix[:3, :3]
+        # The volume scales with the determinant, the triangles' normals (cross products) with the cofactor matrix:
+        determinant = numpy.linalg.det(linear)
+        volume += determinant * local_volume
+        if (determinant != 0):
+            cofactors = determinant * numpy.linalg.inv(linear).T
+            area += 0.5 * numpy.sqrt((cross_products.dot(cofactors.T) ** 2).sum(axis=1)).sum()
+        is_measured = True
+    if (not is_measured):
+        return None
+    return (abs(volume), area)
+
 
 
+#
+# @return the 4x4 matrix translating by the given offset.
+#
+def translation_matrix(offset):
+    matrix = numpy.identity(4)
+    matrix[:3, 3] = offset
+    return matrix
 
 
 
 #
-# All found bom entries are written to a file.
+# The vertex coordinates and the triangles (polygons fan triangulated) of the mesh, read in bulk.
+# @return (coordinates (V, 3), vertex indices of the triangles (T, 3)).
 #
-def write2file(filelink, object_actor_map):#<-- argument is a dictionary (key value pairs)!
-    if debug:
-        print('Writing 0AD actor file ...')
-        
-    if (filelink is None):
-        filelink = build_filelink()
-    if debug:
-        print('Target filelink: ', filelink)
-        
-    #write to file
-    result = False
-    with open(filelink, 'w') as f:#for closing filestream automatically
-        #f.read()
-        #f.readhline()
-        text = ''
-        objects_treated = []
-        for o, actor in object_actor_map.items():
-            if not objects_treated.find(o):
-                text = text + '\r\n' + o.name + ' ' + entry
-            #text = text '\r\n'
-            objects_treated.append(o)
+def read_mesh_triangles(mesh):
+    coordinates = array('f', [0.0]) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get('co', coordinates)
+    vertex_indices = array('i', [0]) * len(mesh.loops)
+    mesh.loops.foreach_get('vertex_index', vertex_indices)
+    polygons = mesh.polygons
+    loop_starts = array('i', [0]) * len(polygons)
+    loop_totals = array('i', [0]) * len(polygons)
+    polygons.foreach_get('loop_start', loop_starts)
+    polygons.foreach_get('loop_total', loop_totals)
+    loop_starts = numpy.array(loop_starts, dtype=numpy.int64)
+    loop_totals = numpy.array(loop_totals, dtype=numpy.int64)
+    # The loops of each polygon as consecutive corners (whatever the order of the loops):
+    corner_starts = numpy.cumsum(loop_totals) - loop_totals
+    corner_loops = numpy.repeat(loop_starts - corner_starts, loop_totals) + numpy.arange(loop_totals.sum())
+    corners = numpy.array(vertex_indices, dtype=numpy.int64)[corner_loops]
+    triangles = corners[fan_triangulate(loop_totals)] if (len(corners) > 0) else numpy.zeros((0, 3), dtype=numpy.int64)
+    return (numpy.array(coordinates, dtype=numpy.float64).reshape(-1, 3), triangles)
+
+
+
+#
+# The signed volume (sum of the tetrahedra spanned by the origin and each triangle, exact for
+# closed meshes) and the cross products of the triangles' edges (their length is twice the area).
+# @return (volume, cross products (T, 3)).
+#
+def measure_triangles(coordinates, triangles):
+    a = coordinates[triangles[:, 0]]
+    b = coordinates[triangles[:, 1]]
+    c = coordinates[triangles[:, 2]]
+    volume = numpy.einsum('ij,ij->i', a, numpy.cross(b, c)).sum() / 6.0
+    return (volume, numpy.cross(b - a, c - a))
+
+
+
+#
+# The triangle and (GPU) vertex count of the mesh, counted in bulk: Like in the engine,
+# vertices are split where the corners differ in the first UV map.
+# @return (triangles, vertices)
+#
+def count_mesh_cost(mesh):
+    polygons = mesh.polygons
+    loop_totals = array('i', [0]) * len(polygons)
+    polygons.foreach_get('loop_total', loop_totals)
+    if (numpy is None):
+        return (sum([max(loop_total - 2, 0) for loop_total in loop_totals]), len(mesh.vertices))
+    triangles = int(numpy.maximum(numpy.array(loop_totals, dtype=numpy.int64) - 2, 0).sum())
+    vertex_indices = array('i', [0]) * len(mesh.loops)
+    mesh.loops.foreach_get('vertex_index', vertex_indices)
+    corners = numpy.array(vertex_indices, dtype=numpy.int32).reshape(-1, 1)
+    if (len(mesh.uv_layers) > 0):
+        uvs = array('f', [0.0]) * (len(mesh.loops) * 2)
+        mesh.uv_layers[0].data.foreach_get('uv', uvs)
+        # Compared bitwise:
+        corners = numpy.column_stack((corners, numpy.array(uvs, dtype=numpy.float32).view(numpy.int32).reshape(-1, 2)))
+    vertices, remap = weld_rows(corners)
+    return (triangles, len(vertices))
+
+
+
+#
+# The estimated GPU memory of a texture as the engine compresses it (DXT1 without alpha,
+# DXT5 with alpha: 8 or 16 bytes per 4x4 block), by default including the mipmaps.
+#
+def estimate_texture_memory(width, height, has_alpha, with_mipmaps = True):
+    block_size = 16 if has_alpha else 8
+    memory = 0
+    while True:
+        memory += ((width + 3) // 4) * ((height + 3) // 4) * block_size
+        if (not with_mipmaps or (width <= 1 and height <= 1)):
+            return memory
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+
+
+
+#
+# The budgets per actor (including its props) according to the settings (0 = no budget).
+#
+def get_budgets(context):
+    return {
+        'triangles': context.scene.export_to_0ad_in_budget_triangles,
+        'vertices': context.scene.export_to_0ad_in_budget_vertices,
+        'texture_memory': context.scene.export_to_0ad_in_budget_texture_memory * 1024
+    }
+
+
+
+#
+# Writes the costs of the actors of the run into a report in each target mod folder.
+# @return the budget violations (also kept for the panel).
+#
+def write_budget_reports(export_context):
+    violations = []
+    for mod_path in sorted(export_context.journals):
+        actor_costs = [actor_cost for filelink, actor_cost in sorted(export_context.actor_costs.items())
+                if filelink.startswith(os.path.join(mod_path, ''))]
+        if (len(actor_costs) == 0):
+            continue
+        report = {
+            'addon_version': list(bl_info['version']),
+            'blend': bpy.data.filepath,
+            'actors': [actor_cost.toDict() for actor_cost in actor_costs]
+        }
+        filelink = os.path.join(mod_path, budget_report_filename)
+        write_text_to_file(filelink, json.dumps(report, indent=1, sort_keys=True), export_context)
+        print('Budget report written to: ', filelink)
+        for actor_cost in actor_costs:
+            for violation in actor_cost.violations:
+                violations.append(os.path.relpath(actor_cost.filelink, mod_path) + ': ' + violation)
+    export_context.budget_violations = violations
+    return violations
+
+
+
+#
+# White space for filling up to a certain length.
+#
+def getWhiteSpace(count):
+    whitespace = ''
+    for i in range(0, count - 1):
+        whitespace = whitespace + ' '
+    return whitespace
+
+
+
+
+
+#
+# All found bom entries are written to a file.
+#
+def write2file(filelink, object_actor_map):#<-- argument is a dictionary (key value pairs)!
+    if debug:
+        print('Writing 0AD actor file ...')
+        
+    if (filelink is None):
+        filelink = build_filelink()
+    if debug:
+        print('Target filelink: ', filelink)
+        
+    #write to file
+    result = False
+    with open(filelink, 'w') as f:#for closing filestream automatically
+        #f.read()
+        #f.readhline()
+        text = ''
+        objects_treated = []
+        for o, actor in object_actor_map.items():
+            if not objects_treated.find(o):
+                text = text + '\r\n' + o.name + ' ' + entry
+            #text = text '\r\n'
+            objects_treated.append(o)
             
         result = f.write(text)
         if (result):
@@ -1068,97 +1642,1502 @@ def write2file(filelink, object_actor_map):#<-- argument is a dictionary (key va
         
     
 
-# This bom entry is appended to a file.
-def append_bom_entry_to_file(context, bom_entry):
-  return append_to_file(context, '\r\n' + str(bom_entry_count_map[bom_entry]) + 'x ' + bom_entry)
-  
-  
-def append_to_file(context, content):
+#
+# Writes (overwrites) the text to the file, creating missing directories.
+#
+def write_text_to_file(filelink, text, export_context = None):
+    write_bytes_if_changed(filelink, text.encode('utf-8'), export_context)
+    return True
+
+
+
+#
+# Skip-if-identical writes: The engine invalidates its caches by file timestamp, thus
+# files with unchanged content are left untouched (mtime preserved).
+# @return True if written, False if the file already had this content.
+#
+def write_bytes_if_changed(filelink, data, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (not archive is None):
+        return archive.write(filelink, data, export_context)
+    if (os.path.isfile(filelink) and is_file_content_equal(filelink, data)):
+        count_write(export_context, False)
+        return False
+    directory = os.path.dirname(filelink)
+    if (directory != '' and not os.path.isdir(directory)):
+        os.makedirs(directory)
+    with open(filelink, 'wb') as f:
+        f.write(data)
+    count_write(export_context, True)
+    return True
+
+
+
+#
+# Moves the staged file to the filelink unless the file there has the same content (then the staged file is removed).
+# @return True if replaced.
+#
+def replace_if_changed(staged_filelink, filelink, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (not archive is None):
+        with open(staged_filelink, 'rb') as f:
+            data = f.read()
+        os.remove(staged_filelink)
+        return archive.write(filelink, data, export_context)
+    if (os.path.isfile(filelink) and are_files_equal(staged_filelink, filelink)):
+        os.remove(staged_filelink)
+        count_write(export_context, False)
+        return False
+    os.replace(staged_filelink, filelink)
+    count_write(export_context, True)
+    return True
+
+
+
+#
+# Like replace_if_changed(), but the COLLADA asset's created and modified dates (which differ with every export)
+# are not taken into account: The staged file is compared with the dates of the existing file substituted.
+#
+def replace_collada_if_changed(staged_filelink, filelink, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (archive is None):
+        if (not os.path.isfile(filelink)):
+            return replace_if_changed(staged_filelink, filelink, export_context)
+        with open(filelink, 'rb') as f:
+            header = f.read(4096)
+    else:
+        header = archive.read(filelink)
+        if (header is None):
+            return replace_if_changed(staged_filelink, filelink, export_context)
+        header = header[:4096]
+    with open(staged_filelink, 'rb') as f:
+        data = f.read()
+    for tag in [b'created', b'modified']:
+        date_pattern = re.compile(b'<' + tag + b'>[^<]*</' + tag + b'>')
+        existing_date = date_pattern.search(header)
+        if (not existing_date is None):
+            data = date_pattern.sub(lambda match: existing_date.group(0), data, 1)
+    if (not archive is None):
+        os.remove(staged_filelink)
+        return archive.write(filelink, data, export_context)
+    if (is_file_content_equal(filelink, data)):
+        os.remove(staged_filelink)
+        count_write(export_context, False)
+        return False
+    os.replace(staged_filelink, filelink)
+    count_write(export_context, True)
+    return True
+
+
+
+#
+# Copies the file unless the target already has the same content.
+# @return True if copied.
+#
+def copy_file_if_changed(source_filelink, filelink, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (not archive is None):
+        with open(source_filelink, 'rb') as f:
+            return archive.write(filelink, f.read(), export_context)
+    if (os.path.isfile(filelink) and are_files_equal(source_filelink, filelink)):
+        count_write(export_context, False)
+        return False
+    directory = os.path.dirname(filelink)
+    if (directory != '' and not os.path.isdir(directory)):
+        os.makedirs(directory)
+    shutil.copyfile(source_filelink, filelink)
+    count_write(export_context, True)
+    return True
+
+
+
+#
+# @return the content of the written file (loose or in the archive) or None if there is none.
+#
+def read_written_file(filelink, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (not archive is None):
+        return archive.read(filelink)
+    if (not os.path.isfile(filelink)):
+        return None
+    with open(filelink, 'rb') as f:
+        return f.read()
+
+
+
+def get_staging_filelink(filelink, export_context = None):
+    archive = get_archive(export_context, filelink)
+    if (not archive is None):
+        return archive.get_staging_filelink(filelink)
+    root, fileending = os.path.splitext(filelink)
+    return root + staging_file_tag + fileending
+
+
+
+#
+# @return the archive of the run the file goes into or None if it is written as loose file.
+#
+def get_archive(export_context, filelink):
+    if (export_context is None or export_context.archive is None or not export_context.archive.is_member(filelink)):
+        return None
+    return export_context.archive
+
+
+
+def count_write(export_context, is_written):
+    if (export_context is None):
+        return
+    if (is_written):
+        export_context.progress.writes_count += 1
+    else:
+        export_context.progress.writes_avoided_count += 1
+
+
+
+#
+# Whether the file's content is the data (bytes). Sizes are compared first,
+# large files are compared memory-mapped chunk by chunk.
+#
+def is_file_content_equal(filelink, data):
+    size = os.path.getsize(filelink)
+    if (size != len(data)):
+        return False
+    if (size == 0):
+        return True
+    with open(filelink, 'rb') as f:
+        if (size < mmap_comparison_min_size):
+            return f.read() == data
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return are_buffers_equal(mapped, memoryview(data), size)
+
+
+
+def are_files_equal(filelink, other_filelink):
+    size = os.path.getsize(filelink)
+    if (size != os.path.getsize(other_filelink)):
+        return False
+    if (size == 0):
+        return True
+    with open(filelink, 'rb') as f, open(other_filelink, 'rb') as other_f:
+        if (size < mmap_comparison_min_size):
+            return f.read() == other_f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, mmap.mmap(other_f.fileno(), 0, access=mmap.ACCESS_READ) as other_mapped:
+            return are_buffers_equal(mapped, other_mapped, size)
+
+
+
+def are_buffers_equal(buffer, other_buffer, size):
+    for offset in range(0, size, mmap_comparison_chunk_size):
+        if (buffer[offset:offset + mmap_comparison_chunk_size] != other_buffer[offset:offset + mmap_comparison_chunk_size]):
+            return False
+    return True
+
+
+
+def build_filelink(context, objectname, fileending = "", ensure_filelink_not_exists = True, basedirectory = None, export_context = None):
+    if debug:
+        print('building filelink ...')
+        
+    
+    filelink = ""
+    
+    # build filelink
+    # http://blender.stackexchange.com/questions/5280/how-to-use-the-current-file-name-as-the-the-output-name-in-the-file-output-node
+    ## Get file name:
+    #filename = bpy.path.basename(context.blend_data.filepath)
+    ## Remove .blend extension:
+    #filename = os.path.splitext(filename)[0]
+    filelink = bpy.path.abspath("//") #<-- absolute path to the current .blend file
+    print('base_path: ' + filelink)
+    # base path:
+    filelink = os.path.join(context.scene.export_to_0ad_in_target_path_base, context.scene.export_to_0ad_in_target_path_mod)
+    print('base_path: ' + filelink)
+    # If a relative filelink or a special subfolder that can't be derived from the objectname is desired, then use the basedirectory parameter:
+    if (not basedirectory is None):
+        filelink = basedirectory #'./' # using relative paths -> relative to home directory
+        print('base_path: ' + filelink)
+        
+    #root = os.getcwd()#<-- the directory of the current file (the question is of it's the blend file?)
+    #root = dirname(pathname(__FILE__))#http://stackoverflow.com/questions/5137497/find-current-directory-and-files-directory
+    filename = ''#TODO Determine this blender file name!
+     
+    directory, filename, fileending = plan_filelink(filelink, objectname, fileending)
+    filelink = os.path.join(directory, filename + fileending)
+    
+    # Don't overwrite existing files because for several selections individual boms could be desired.
+    number = 0
+    while (ensure_filelink_not_exists and is_existing_file(export_context, filelink)):#alternatively: try: with (open(filelink)): ... except IOError: print('file not found') 
+        number = number + 1              #http://stackoverflow.com/questions/82831/how-do-i-check-if-a-file-exists-using-python
+        filename_ = filename + str(number)
+        filelink = os.path.join(directory, filename_ + fileending)
+
+    # A non-existing filelink was found.
+    return filelink
+
+
+
+
+
+
+#
+# Plans the filelink of an object's file: each subfolder given in the object name is a part of it.
+# @return (directory, file name, file ending with a leading dot or empty)
+#
+def plan_filelink(base_directory, objectname, fileending = ""):
+    parsed_name = parse_name(objectname)
+    directory = base_directory
+    for object_specific_subfolder in parsed_name.subfolders:
+        directory = os.path.join(directory, object_specific_subfolder)
+    if (fileending is None):
+        fileending = ""
+    # Does not yet contain a dot?
+    if (fileending != "" and not fileending.startswith('.')):
+        fileending = "." + fileending
+    return directory, parsed_name.file_name, fileending
+
+
+
+#
+# The absolute path to the target mod folder, i.e. path base + mod folder.
+#
+def get_target_mod_path(context):
+    return os.path.expanduser(bpy.path.abspath(os.path.join(
+            context.scene.export_to_0ad_in_target_path_base,
+            context.scene.export_to_0ad_in_target_path_mod
+    )))
+
+
+
+#
+# The target folders (relative to the mod folder) by the kind of files they contain.
+#
+def get_target_folders(context):
+    return {
+        'actor': context.scene.export_to_0ad_in_target_actor_folder,
+        'mesh': context.scene.export_to_0ad_in_target_mesh_folder,
+        'texture': context.scene.export_to_0ad_in_target_texture_folder,
+        'animation': context.scene.export_to_0ad_in_target_animation_folder
+    }
+
+
+
+#
+# The archive the art is written into in archive output mode: <mod folder>/<mod name>.zip
+#
+def get_target_archive_filelink(context):
+    mod_path = os.path.normpath(get_target_mod_path(context))
+    return os.path.join(mod_path, os.path.basename(mod_path) + archive_file_ending)
+
+
+
+#
+# The scenes to export in an 'all scenes' run: All scenes but those excluded (and the export's scratch scene).
+#
+def get_scenes_to_export():
+    return [scene for scene in bpy.data.scenes
+            if (scene.export_to_0ad_in_is_included_in_all_scenes and not scene.name.startswith(scratch_scene_name))]
+
+
+
+#
+# Whether the file exists: Looked up in the run's mod tree index if available, else probed.
+#
+def is_existing_file(export_context, filelink):
+    if (export_context is None):
+        return os.path.isfile(filelink)
+    return export_context.is_existing_file(filelink)
+
+
+
+#
+# Computes the prop points of all props of a variant in one pass: The transform of
+# each prop point is the child object's world matrix relative to the variant's root object.
+# Several props may be attached to the same (EMPTY) child object, thus to the same prop point.
+# @return list of (prop point name, matrix) - no scene objects are created.
+#
+def compute_prop_points(root_object, props):
+    root_matrix_world_inverted = root_object.matrix_world.inverted()
+    prop_points = []
+    attachpoint_objects = []
+    for p in props:
+        child_object = p.object_to_derive_attachpoint_name_from
+        p.attachpoint = child_object.name
+        if (child_object in attachpoint_objects):
+            continue
+        attachpoint_objects.append(child_object)
+        prop_points.append(("prop-" + child_object.name, root_matrix_world_inverted * child_object.matrix_world))
+    return prop_points
+
+
+
+#
+# Adds the prop points as child nodes of the root object's node to the exported COLLADA file.
+#
+def add_prop_points_to_collada(filelink, root_node_name, prop_points):
+    if (len(prop_points) == 0):
+        return
+    tree = ElementTree.parse(filelink)
+    parent_node = find_collada_node(tree, root_node_name)
+    if (parent_node is None):
+        print('Node ', root_node_name, ' not found in ', filelink, '. Adding the prop points to the visual scene instead.')
+        parent_node = tree.getroot().find('.//' + collada_tag('visual_scene'))
+    for prop_point_name, matrix in prop_points:
+        node = ElementTree.SubElement(parent_node, collada_tag('node'),
+                {'id': prop_point_name, 'name': prop_point_name, 'type': 'NODE'})
+        matrix_element = ElementTree.SubElement(node, collada_tag('matrix'), {'sid': 'transform'})
+        # COLLADA matrices are written row by row:
+        matrix_element.text = ' '.join([str(matrix[row][column]) for row in range(4) for column in range(4)])
+        if debug:
+            print('Added prop point ', prop_point_name, ' to ', filelink)
+    tree.write(filelink, encoding='utf-8', xml_declaration=True)
+
+
+
+#
+# @return the node of the visual scene with the given name or id, else None.
+#
+def find_collada_node(tree, name):
+    for node in tree.getroot().iter(collada_tag('node')):
+        if (node.get('name') == name or node.get('id') == name):
+            return node
+    return None
+
+
+
+#
+# @return the tag name within the COLLADA namespace.
+#
+def collada_tag(name):
+    return '{' + collada_namespace + '}' + name
+
+
+
+#
+# Reads the float sources of a COLLADA <mesh> element.
+# @return dict: source id -> ColladaSource
+#
+def read_collada_sources(mesh_element):
+    sources = {}
+    for source_element in mesh_element.findall(collada_tag('source')):
+        float_array_element = source_element.find(collada_tag('float_array'))
+        accessor_element = source_element.find('.//' + collada_tag('accessor'))
+        if (float_array_element is None or accessor_element is None):
+            continue
+        stride = int(accessor_element.get('stride', '1'))
+        values = numpy.array((float_array_element.text or '').split(), dtype=numpy.float64).reshape(-1, stride)
+        sources[source_element.get('id')] = ColladaSource(source_element, float_array_element, accessor_element, values)
+    return sources
+
+
+
+#
+# Reads the <triangles> and <polylist> elements of a COLLADA <mesh> element.
+# Polygons are fan triangulated.
+# @return list of ColladaPrimitive
+#
+def read_collada_primitives(mesh_element):
+    # The VERTEX input refers to the <vertices> element which refers to the positions:
+    vertices_sources = {}
+    for vertices_element in mesh_element.findall(collada_tag('vertices')):
+        for input_element in vertices_element.findall(collada_tag('input')):
+            if (input_element.get('semantic') == 'POSITION'):
+                vertices_sources[vertices_element.get('id')] = input_element.get('source').lstrip('#')
+    
+    primitives = []
+    for element in list(mesh_element):
+        if (element.tag != collada_tag('triangles') and element.tag != collada_tag('polylist')):
+            continue
+        inputs = []
+        corner_stride = 0
+        for input_element in element.findall(collada_tag('input')):
+            source_id = input_element.get('source').lstrip('#')
+            source_id = vertices_sources.get(source_id, source_id)
+            offset = int(input_element.get('offset'))
+            inputs.append(ColladaInput(input_element.get('semantic'), source_id, offset, input_element.get('set')))
+            corner_stride = max(corner_stride, offset + 1)
+        p_element = element.find(collada_tag('p'))
+        if (p_element is None or corner_stride == 0):
+            continue
+        corners = numpy.array((p_element.text or '').split(), dtype=numpy.int64).reshape(-1, corner_stride)
+        
+        if (element.tag == collada_tag('polylist')):
+            vcount = numpy.array(element.find(collada_tag('vcount')).text.split(), dtype=numpy.int64)
+            triangles = fan_triangulate(vcount)
+        else:
+            triangles = numpy.arange(len(corners)).reshape(-1, 3)
+        primitives.append(ColladaPrimitive(element, inputs, corners, triangles))
+    return primitives
+
+
+
+#
+# @param vcount the corner count of each polygon (the polygons' corners are consecutive)
+# @return the triangles (n, 3) as corner indices
+#
+def fan_triangulate(vcount):
+    triangle_counts = numpy.maximum(vcount - 2, 0)
+    polygon_starts = numpy.cumsum(vcount) - vcount
+    polygon_of_triangle = numpy.repeat(numpy.arange(len(vcount)), triangle_counts)
+    triangle_index_within_polygon = numpy.arange(triangle_counts.sum()) - numpy.repeat(numpy.cumsum(triangle_counts) - triangle_counts, triangle_counts)
+    first_corners = polygon_starts[polygon_of_triangle]
+    second_corners = first_corners + triangle_index_within_polygon + 1
+    return numpy.column_stack((first_corners, second_corners, second_corners + 1))
+
+
+
+#
+# Writes the values of the source back into its COLLADA elements.
+#
+def write_collada_source(source):
+    source.float_array_element.text = ' '.join([repr(value) for value in source.values.reshape(-1).tolist()])
+    source.float_array_element.set('count', str(source.values.size))
+    source.accessor_element.set('count', str(len(source.values)))
+
+
+
+#
+# Writes the triangles (given as rows of corner indices, one column per input offset) into the primitive element.
+#
+def write_collada_triangles(primitive, triangle_corners):
+    element = primitive.element
+    element.tag = collada_tag('triangles')
+    vcount_element = element.find(collada_tag('vcount'))
+    if (not vcount_element is None):
+        element.remove(vcount_element)
+    element.set('count', str(len(triangle_corners) // 3))
+    element.find(collada_tag('p')).text = ' '.join([str(index) for index in triangle_corners.reshape(-1).tolist()])
+
+
+
+#
+# Welds identical rows (e.g. positions or normals) vectorized.
+# @return (unique rows, index of the unique row for each row)
+#
+def weld_rows(rows):
+    rows = numpy.ascontiguousarray(rows)
+    if (len(rows) == 0):
+        return rows, numpy.zeros(0, dtype=numpy.int64)
+    row_view = rows.view(numpy.dtype((numpy.void, rows.dtype.itemsize * rows.shape[1]))).reshape(-1)
+    unique_row_views, first_indices, remap = numpy.unique(row_view, return_index=True, return_inverse=True)
+    return rows[first_indices], remap.reshape(-1)
+
+
+
+#
+# Welds identical corner tuples (of position, normal, UV, .. indices) into one vertex vectorized.
+# The vertex ids are assigned in the order of the corners' first appearance.
+# @return (vertex id per corner, corner tuple per vertex id)
+#
+def weld_corners(corners):
+    corners = numpy.ascontiguousarray(corners, dtype=numpy.int64)
+    if (len(corners) == 0):
+        return numpy.zeros(0, dtype=numpy.int64), corners
+    extents = corners.max(axis=0) + 1
+    if (numpy.prod(extents.astype(numpy.float64)) < 2.0 ** 62):
+        # Packed into one integer per corner, which sorts much faster than the rows:
+        corner_keys = numpy.ravel_multi_index(tuple(corners.T), tuple(extents))
+    else:
+        corner_keys = corners.view(numpy.dtype((numpy.void, corners.dtype.itemsize * corners.shape[1]))).reshape(-1)
+    unique_corner_keys, first_indices, remap = numpy.unique(corner_keys, return_index=True, return_inverse=True)
+    order = numpy.argsort(first_indices)
+    vertex_ids = numpy.empty(len(order), dtype=numpy.int64)
+    vertex_ids[order] = numpy.arange(len(order))
+    return vertex_ids[remap.reshape(-1)], corners[first_indices[order]]
+
+
+
+#
+# Orders the triangles for post-transform vertex cache efficiency (Tipsify, Sander et al. 2007).
+# The adjacency is built vectorized, the fanning itself is linear in the triangle count.
+# @param triangles (n, 3) vertex ids
+# @return the new order of the triangles (indices)
+#
+def order_triangles_for_vertex_cache(triangles, vertex_count, cache_size = vertex_cache_size):
+    triangle_count = len(triangles)
+    if (triangle_count == 0):
+        return numpy.zeros(0, dtype=numpy.int64)
+    corner_vertices = triangles.reshape(-1)
+    live_counts = numpy.bincount(corner_vertices, minlength=vertex_count)
+    adjacency_offsets = numpy.concatenate(([0], numpy.cumsum(live_counts))).tolist()
+    adjacency = (numpy.argsort(corner_vertices, kind='mergesort') // 3).tolist()
+    live_counts = live_counts.tolist()
+    triangles = triangles.tolist()
+    
+    timestamps = [0] * vertex_count
+    is_emitted = [False] * triangle_count
+    order = []
+    dead_end = []
+    time = cache_size + 1
+    cursor = 0
+    fanning_vertex = triangles[0][0]
+    while (fanning_vertex >= 0):
+        candidates = []
+        for triangle_index in adjacency[adjacency_offsets[fanning_vertex]:adjacency_offsets[fanning_vertex + 1]]:
+            if (is_emitted[triangle_index]):
+                continue
+            is_emitted[triangle_index] = True
+            order.append(triangle_index)
+            for vertex in triangles[triangle_index]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live_counts[vertex] -= 1
+                if (time - timestamps[vertex] > cache_size):
+                    timestamps[vertex] = time
+                    time += 1
+        
+        # next fanning vertex: the one of the candidates staying longest in the cache
+        fanning_vertex = -1
+        best_priority = -1
+        for vertex in candidates:
+            if (live_counts[vertex] > 0):
+                priority = 0
+                if (time - timestamps[vertex] + 2 * live_counts[vertex] <= cache_size):
+                    priority = time - timestamps[vertex]
+                if (priority > best_priority):
+                    best_priority = priority
+                    fanning_vertex = vertex
+        while (fanning_vertex == -1 and len(dead_end) > 0):
+            vertex = dead_end.pop()
+            if (live_counts[vertex] > 0):
+                fanning_vertex = vertex
+        while (fanning_vertex == -1 and cursor < vertex_count):
+            if (live_counts[cursor] > 0):
+                fanning_vertex = cursor
+            cursor += 1
+    return numpy.array(order, dtype=numpy.int64)
+
+
+
+#
+# @return the 4x4 matrix of the node's transform elements (matrix, translate, rotate, scale).
+#
+def read_collada_node_matrix(node):
+    matrix = numpy.identity(4)
+    for element in list(node):
+        values = [float(value) for value in (element.text or '').split()]
+        if (element.tag == collada_tag('matrix')):
+            transform = numpy.array(values).reshape(4, 4)
+        elif (element.tag == collada_tag('translate')):
+            transform = numpy.identity(4)
+            transform[:3, 3] = values
+        elif (element.tag == collada_tag('scale')):
+            transform = numpy.diag(values + [1.0])
+        elif (element.tag == collada_tag('rotate')):
+            transform = numpy.identity(4)
+            transform[:3, :3] = rotation_matrix_from_axis_angle(values[:3], math.radians(values[3]))
+        else:
+            continue
+        matrix = matrix.dot(transform)
+    return matrix
+
+
+
+def rotation_matrix_from_axis_angle(axis, angle):
+    x, y, z = numpy.array(axis) / numpy.linalg.norm(axis)
+    c = math.cos(angle)
+    s = math.sin(angle)
+    t = 1.0 - c
+    return numpy.array([
+        [t * x * x + c,     t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c,     t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c]
+    ])
+
+
+
+#
+# @return the unit quaternion (x, y, z, w) of the rotation part of the 3x3 matrix (scale removed).
+#
+def quaternion_from_matrix(matrix):
+    m = matrix / numpy.linalg.norm(matrix, axis=0)
+    trace = m[0, 0] + m[1, 1] + m[2, 2]
+    if (trace > 0):
+        s = math.sqrt(trace + 1.0) * 2
+        return (
+            (m[2, 1] - m[1, 2]) / s,
+            (m[0, 2] - m[2, 0]) / s,
+            (m[1, 0] - m[0, 1]) / s,
+            0.25 * s
+        )
+    if (m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]):
+        s = math.sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2]) * 2
+        return (0.25 * s, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s, (m[2, 1] - m[1, 2]) / s)
+    if (m[1, 1] > m[2, 2]):
+        s = math.sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2]) * 2
+        return ((m[0, 1] + m[1, 0]) / s, 0.25 * s, (m[1, 2] + m[2, 1]) / s, (m[0, 2] - m[2, 0]) / s)
+    s = math.sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1]) * 2
+    return ((m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, 0.25 * s, (m[1, 0] - m[0, 1]) / s)
+
+
+
+#
+# Reads the exported COLLADA file as one static model like the engine's converter does:
+# All instanced geometries are transformed by their node's world matrix and merged,
+# nodes named prop-<name> become prop points. The coordinates are converted from the
+# file's up axis into the game's (Z_UP: swap y and z, Y_UP: negate z).
+# @return the ColladaModel
+#
+def read_collada_model(filelink):
+    root = ElementTree.parse(filelink).getroot()
+    is_y_up = (root.findtext('.//' + collada_tag('up_axis')) or 'Y_UP').strip() == 'Y_UP'
+    geometries = {}
+    for geometry_element in root.iter(collada_tag('geometry')):
+        geometries[geometry_element.get('id')] = geometry_element
+    
+    # Walk the visual scene for the world matrices:
+    instances = []
+    prop_points = []
+    nodes_to_visit = [(node, numpy.identity(4)) for node in root.find('.//' + collada_tag('visual_scene')).findall(collada_tag('node'))]
+    while (len(nodes_to_visit) > 0):
+        node, parent_matrix = nodes_to_visit.pop()
+        matrix = parent_matrix.dot(read_collada_node_matrix(node))
+        name = node.get('name') or node.get('id') or ''
+        if (name.startswith('prop-') or name.startswith('prop_')):
+            prop_points.append((name[len('prop-'):], matrix))
+        for instance_element in node.findall(collada_tag('instance_geometry')):
+            geometry_element = geometries.get(instance_element.get('url').lstrip('#'))
+            if (not geometry_element is None):
+                instances.append((geometry_element, matrix))
+        for child_node in node.findall(collada_tag('node')):
+            nodes_to_visit.append((child_node, matrix))
+    
+    positions = []
+    normals = []
+    texcoord_sets = []
+    faces = []
+    vertex_count = 0
+    for geometry_element, matrix in instances:
+        mesh_element = geometry_element.find(collada_tag('mesh'))
+        if (mesh_element is None):
+            continue
+        sources = read_collada_sources(mesh_element)
+        for primitive in read_collada_primitives(mesh_element):
+            corner_vertex_ids, vertex_corners = weld_corners(primitive.corners)
+            texcoord_inputs = sorted([i for i in primitive.inputs if i.semantic == 'TEXCOORD'], key=lambda i: int(i.set or 0))
+            for collada_input in primitive.inputs:
+                values = sources[collada_input.source_id].values[vertex_corners[:, collada_input.offset]]
+                if (collada_input.semantic == 'VERTEX'):
+                    positions.append(values[:, :3].dot(matrix[:3, :3].T) + matrix[:3, 3])
+                elif (collada_input.semantic == 'NORMAL'):
+                    transformed = values[:, :3].dot(matrix[:3, :3].T)
+                    normals.append(transformed / numpy.maximum(numpy.linalg.norm(transformed, axis=1), 1e-12)[:, numpy.newaxis])
+            texcoord_sets.append([sources[i.source_id].values[vertex_corners[:, i.offset], :2] for i in texcoord_inputs])
+            faces.append(corner_vertex_ids[primitive.triangles] + vertex_count)
+            vertex_count += len(vertex_corners)
+    
+    model = ColladaModel()
+    if (vertex_count > 0):
+        model.positions = numpy.concatenate(positions)
+        model.normals = numpy.concatenate(normals) if len(normals) == len(positions) else numpy.zeros((vertex_count, 3))
+        # Only the UV sets all primitives have in common:
+        texcoord_count = min([len(texcoords) for texcoords in texcoord_sets])
+        model.texcoords = [numpy.concatenate([texcoords[i] for texcoords in texcoord_sets]) for i in range(texcoord_count)]
+        model.faces = numpy.concatenate(faces)
+    
+    # into the game's coordinate system:
+    if (is_y_up):
+        model.positions[:, 2] *= -1
+        model.normals[:, 2] *= -1
+    else:
+        model.positions[:, [1, 2]] = model.positions[:, [2, 1]]
+        model.normals[:, [1, 2]] = model.normals[:, [2, 1]]
+    for name, matrix in prop_points:
+        x, y, z = matrix[:3, 3]
+        qx, qy, qz, qw = quaternion_from_matrix(matrix[:3, :3])
+        if (is_y_up):
+            model.prop_points.append((name, (x, y, -z), (-qx, -qy, qz, qw)))
+        else:
+            model.prop_points.append((name, (x, z, y), (-qx, -qz, -qy, qw)))
+    return model
+
+
+
+#
+# Writes the model in the engine's binary model format (PMD version 4, static, no bones).
+# @return True if written, False if the model exceeds the format's limits.
+#
+def write_pmd(filelink, model, export_context = None):
+    vertex_count = len(model.positions)
+    if (vertex_count > 0xFFFF + 1):
+        print('The model has ', vertex_count, ' vertices, too many for 16 bit face indices. Skipping: ', filelink)
+        return False
+    texcoord_count = len(model.texcoords)
+    vertex_fields = [('position', '<f4', (3,)), ('normal', '<f4', (3,))]
+    if (texcoord_count > 0):
+        vertex_fields.append(('texcoords', '<f4', (texcoord_count, 2)))
+    vertex_fields.extend([('bones', 'u1', (4,)), ('weights', '<f4', (4,))])
+    vertices = numpy.zeros(vertex_count, dtype=numpy.dtype(vertex_fields))
+    vertices['position'] = model.positions
+    vertices['normal'] = model.normals
+    for i in range(texcoord_count):
+        vertices['texcoords'][:, i] = model.texcoords[i]
+    vertices['bones'] = pmd_no_bone
+    
+    data = [
+        struct.pack('<II', vertex_count, texcoord_count),
+        array_to_bytes(vertices),
+        struct.pack('<I', len(model.faces)),
+        array_to_bytes(numpy.ascontiguousarray(model.faces, dtype='<u2')),
+        struct.pack('<I', 0), # <-- no bones (static model)
+        struct.pack('<I', len(model.prop_points))
+    ]
+    for name, translation, rotation in model.prop_points:
+        name_bytes = name.encode('utf-8')
+        data.append(struct.pack('<I', len(name_bytes)) + name_bytes)
+        data.append(struct.pack('<3f4fB', *(tuple(translation) + tuple(rotation) + (pmd_no_bone,))))
+    data = b''.join(data)
+    
+    write_bytes_if_changed(filelink, pmd_magic + struct.pack('<II', pmd_version, len(data)) + data, export_context)
+    return True
+
+
+
+#
+# Converts the exported COLLADA file into the engine's cached binary model (by default next to it).
+# @return the filelink of the cached model or None.
+#
+def convert_collada_to_pmd(collada_filelink, pmd_filelink = None, export_context = None):
+    if (numpy is None):
+        print('Writing the cached binary model requires numpy. Skipping it for: ', collada_filelink)
+        return None
+    if (pmd_filelink is None):
+        pmd_filelink = collada_filelink + pmd_cached_file_ending
+    if (not write_pmd(pmd_filelink, read_collada_model(collada_filelink), export_context)):
+        return None
+    print('Wrote cached binary model: ', pmd_filelink)
+    return pmd_filelink
+
+
+
+def array_to_bytes(values):
+    if (hasattr(values, 'tobytes')):
+        return values.tobytes()
+    return values.tostring() # <-- numpy < 1.9
+
+
+
+#
+# Optimizes the meshes of the exported COLLADA file in place:
+# Identical values within each source are welded, identical corner tuples (of
+# position, normal, UV, .. indices) are welded into one vertex through a hash table,
+# degenerated triangles are dropped and the triangles are ordered for the vertex cache.
+# @return a MeshOptimizationStatistics per geometry
+#
+def optimize_collada_meshes(filelink):
+    if (numpy is None):
+        print('Mesh optimization requires numpy. Skipping it for: ', filelink)
+        return []
+    tree = ElementTree.parse(filelink)
+    all_statistics = []
+    for geometry_element in tree.getroot().iter(collada_tag('geometry')):
+        mesh_element = geometry_element.find(collada_tag('mesh'))
+        if (mesh_element is None):
+            continue
+        statistics = MeshOptimizationStatistics(geometry_element.get('name', geometry_element.get('id')))
+        
+        sources = read_collada_sources(mesh_element)
+        source_remaps = {}
+        for source_id, source in sources.items():
+            source.values, source_remaps[source_id] = weld_rows(source.values)
+            write_collada_source(source)
+        
+        for primitive in read_collada_primitives(mesh_element):
+            corners = primitive.corners
+            statistics.vertices_before += len(weld_rows(corners)[0])
+            statistics.triangles_before += len(primitive.triangles)
+            for collada_input in primitive.inputs:
+                if (collada_input.source_id in source_remaps):
+                    corners[:, collada_input.offset] = source_remaps[collada_input.source_id][corners[:, collada_input.offset]]
+            
+            corner_vertex_ids, vertex_corners = weld_corners(corners)
+            
+            triangles = corner_vertex_ids[primitive.triangles]
+            is_degenerated = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+            triangles = triangles[~is_degenerated]
+            triangles = triangles[order_triangles_for_vertex_cache(triangles, len(vertex_corners))]
+            write_collada_triangles(primitive, vertex_corners[triangles.reshape(-1)])
+            
+            statistics.vertices_after += len(numpy.unique(triangles))
+            statistics.triangles_after += len(triangles)
+        
+        print('Optimized mesh ', statistics)
+        all_statistics.append(statistics)
+    tree.write(filelink, encoding='utf-8', xml_declaration=True)
+    return all_statistics
+
+
+
+#
+# Parses the quality tiers setting, e.g. '50, 25'.
+# @return the distinct triangle percentages (between 0 and 100 exclusive) in decreasing order.
+#
+def parse_quality_tiers(text):
+    percentages = set()
+    for part in re.split('[,;\\s]+', text.strip()):
+        if (part == ''):
+            continue
+        try:
+            percentage = int(part.rstrip('%'))
+        except ValueError:
+            print('Ignoring the invalid quality tier: ', part)
+            continue
+        if (percentage > 0 and percentage < 100):
+            percentages.add(percentage)
+    return sorted(percentages, reverse=True)
+
+
+
+#
+# @return the filelink of the quality tier next to the mesh, e.g. meshes/foo_lod50.dae
+#
+def get_quality_tier_filelink(filelink, percentage):
+    root, fileending = os.path.splitext(filelink)
+    return root + quality_tier_file_tag + str(percentage) + fileending
+
+
+
+#
+# @return the filelink of the marker in the cache folder of a tier decimated to no triangles.
+#
+def get_empty_quality_tier_marker_filelink(cached_filelink):
+    return os.path.splitext(cached_filelink)[0] + '.empty'
+
+
+
+#
+# Decimates each mesh of the COLLADA document to the percentage of its triangles (at most) through
+# vertex clustering: The positions are snapped to a grid and welded per cell (to their mean),
+# collapsed and duplicated triangles are dropped. The finest grid meeting the target is searched.
+# Normals and UVs stay those of the surviving corners. Runs in worker threads (no bpy access).
+# If the target collapses all triangles of a mesh (e.g. a small one), then the coarsest grid keeping triangles is taken.
+# @return the decimated COLLADA document (bytes) or None if a mesh has no triangles left at all (e.g. a degenerated one).
+#
+def decimate_collada(data, percentage):
+    root = ElementTree.fromstring(data)
+    for geometry_element in root.iter(collada_tag('geometry')):
+        mesh_element = geometry_element.find(collada_tag('mesh'))
+        if (mesh_element is None):
+            continue
+        sources = read_collada_sources(mesh_element)
+        primitives = read_collada_primitives(mesh_element)
+        position_source = None
+        for primitive in primitives:
+            for collada_input in primitive.inputs:
+                if (collada_input.semantic == 'VERTEX' and collada_input.source_id in sources):
+                    position_source = sources[collada_input.source_id]
+                    primitive.vertex_offset = collada_input.offset
+        if (position_source is None or len(position_source.values) == 0):
+            continue
+        # The triangles of all primitives as position indices:
+        primitive_triangles = [primitive.corners[:, primitive.vertex_offset][primitive.triangles] for primitive in primitives]
+        triangles = numpy.concatenate(primitive_triangles)
+        target_count = int(math.ceil(len(triangles) * percentage / 100.0))
+        
+        lowest = 1
+        highest = quality_tier_max_resolution
+        while (highest - lowest > 1):
+            resolution = (lowest + highest) // 2
+            clusters = cluster_positions(position_source.values, resolution)
+            if (len(drop_collapsed_triangles(clusters[triangles])[0]) <= target_count):
+                lowest = resolution
+            else:
+                highest = resolution
+        clusters = cluster_positions(position_source.values, lowest)
+        if (len(triangles) > 0 and len(drop_collapsed_triangles(clusters[triangles])[0]) == 0):
+            # The finest grid meeting the target collapses all triangles (e.g. of a small mesh), thus the floor
+            # is the coarsest grid keeping triangles, even if above the target:
+            clusters = cluster_positions(position_source.values, highest)
+            kept_count = len(drop_collapsed_triangles(clusters[triangles])[0])
+            print('Decimating the mesh ', geometry_element.get('name', geometry_element.get('id')), ' to ', percentage,
+                    '% leaves no triangles. Keeping ', kept_count, ' of ', len(triangles), ' triangles instead.')
+            if (kept_count == 0):
+                return None
+        cluster_count = clusters.max() + 1
+        # The mean position of each cluster:
+        weights = numpy.bincount(clusters, minlength=cluster_count).astype(numpy.float64)
+        means = numpy.column_stack([numpy.bincount(clusters, position_source.values[:, axis], cluster_count) / weights
+                for axis in range(position_source.values.shape[1])])
+        position_source.values = means
+        write_collada_source(position_source)
+        
+        for primitive in primitives:
+            corners = primitive.corners.copy()
+            corners[:, primitive.vertex_offset] = clusters[corners[:, primitive.vertex_offset]]
+            kept_triangles = drop_collapsed_triangles(corners[:, primitive.vertex_offset][primitive.triangles])[1]
+            write_collada_triangles(primitive, corners[primitive.triangles[kept_triangles].reshape(-1)])
+    output = io.BytesIO()
+    ElementTree.ElementTree(root).write(output, encoding='utf-8', xml_declaration=True)
+    return output.getvalue()
+
+
+
+#
+# Snaps the positions to a grid of the resolution (cells along the longest axis of the bounds).
+# @return the cluster (welded cell) index of each position
+#
+def cluster_positions(positions, resolution):
+    lower = positions.min(axis=0)
+    extent = (positions.max(axis=0) - lower).max()
+    if (extent <= 0.0):
+        return numpy.zeros(len(positions), dtype=numpy.int64)
+    cells = numpy.minimum(numpy.floor((positions - lower) * (resolution / extent)), resolution - 1).astype(numpy.int64)
+    return weld_rows(cells)[1]
+
+
+
+#
+# @param triangles (n, 3) vertex indices
+# @return (the distinct triangles with three distinct vertices, their indices)
+#
+def drop_collapsed_triangles(triangles):
+    is_collapsed = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+    kept = numpy.nonzero(~is_collapsed)[0]
+    if (len(kept) == 0):
+        return triangles[kept], kept
+    # The same triangle (whatever its winding's start) is kept once:
+    distinct_indices = numpy.unique(weld_rows(numpy.sort(triangles[kept], axis=1))[1], return_index=True)[1]
+    kept = kept[numpy.sort(distinct_indices)]
+    return triangles[kept], kept
+
+
+
+#
+# @return the distinct images assigned to the polygons of the objects' first (diffuse) UV map.
+#
+def collect_diffuse_images(mesh_objects):
+    images = []
+    for mesh_object in mesh_objects:
+        uv_textures = mesh_object.data.uv_textures
+        if (len(uv_textures) == 0):
+            continue
+        for mesh_texture_poly in uv_textures[0].data:
+            image = mesh_texture_poly.image
+            if (not image is None and not image in images):
+                images.append(image)
+    return images
+
+
+
+#
+# Packs rectangles into a power-of-two area using shelves (next fit, decreasing height).
+# The area starts with the smallest power of two holding the total area and grows
+# until all rectangles fit or max_size is exceeded.
+# @param sizes list of (width, height)
+# @return (width, height, positions) with positions[i] = (x, y) of sizes[i], or None if max_size is exceeded.
+#
+def pack_rectangles(sizes, max_size, padding = 0):
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+    total_area = sum([(w + padding) * (h + padding) for w, h in sizes])
+    width = 1
+    height = 1
+    while (width * height < total_area):
+        if (width <= height):
+            width *= 2
+        else:
+            height *= 2
+    while (width <= max_size and height <= max_size):
+        positions = pack_rectangles_into_shelves(sizes, order, width, height, padding)
+        if (not positions is None):
+            return (width, height, positions)
+        if (width <= height):
+            width *= 2
+        else:
+            height *= 2
+    return None
+
+
+
+def pack_rectangles_into_shelves(sizes, order, width, height, padding):
+    positions = [None] * len(sizes)
+    x = 0
+    y = 0
+    shelf_height = 0
+    for i in order:
+        w = sizes[i][0] + padding
+        h = sizes[i][1] + padding
+        if (w > width):
+            return None
+        if (x + w > width):
+            # next shelf:
+            y += shelf_height
+            x = 0
+            shelf_height = 0
+        if (y + h > height):
+            return None
+        positions[i] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return positions
+
+
+
+#
+# Packs the images into one power-of-two atlas image that is saved to the filelink.
+# @return the TextureAtlas or None if there is nothing to pack or the images don't fit into max_size.
+#
+def build_texture_atlas(images, filelink, max_size, export_context = None):
+    images = [image for image in images if image.size[0] > 0 and image.size[1] > 0]
+    if (len(images) == 0):
+        return None
+    if (numpy is None):
+        print('The texture atlas requires numpy. Keeping separate textures.')
+        return None
+    packing = pack_rectangles([tuple(image.size) for image in images], max_size, texture_atlas_padding)
+    if (packing is None):
+        print('The ', len(images), ' images do not fit into a texture atlas of max size ', max_size, '. Keeping separate textures.')
+        return None
+    width, height, positions = packing
+    
+    # RGBA floats, rows from bottom to top like in blender (and like the UV v axis):
+    atlas_pixels = numpy.zeros((height, width, 4), dtype=numpy.float32)
+    texture_atlas = TextureAtlas(filelink, width, height)
+    for image, (x, y) in zip(images, positions):
+        image_width, image_height = image.size
+        atlas_pixels[y:y + image_height, x:x + image_width] = read_image_pixels(image)
+        texture_atlas.regions[image] = (x / width, y / height, image_width / width, image_height / height)
+    
+    atlas_image = bpy.data.images.new(os.path.basename(filelink), width, height, alpha=True)
+    atlas_image.pixels = atlas_pixels.reshape(-1).tolist()
+    atlas_image.filepath_raw = get_staging_filelink(filelink, export_context)
+    atlas_image.file_format = 'PNG'
+    directory = os.path.dirname(filelink)
+    if (not os.path.isdir(directory)):
+        os.makedirs(directory)
+    atlas_image.save()
+    bpy.data.images.remove(atlas_image)
+    replace_if_changed(get_staging_filelink(filelink, export_context), filelink, export_context)
+    print('Packed ', len(images), ' images into the ', width, 'x', height, ' texture atlas: ', filelink)
+    return texture_atlas
+
+
+
+#
+# Remaps the first (diffuse) UV map of the mesh into the atlas regions of the polygons' images.
+# The polygons' images are pointers (read one by one), the UVs are remapped in bulk.
+# Note: Tiling UVs (outside of 0..1) can't be represented within an atlas region.
+#
+def remap_uvs_to_texture_atlas(mesh, texture_atlas):
+    if (len(mesh.uv_textures) == 0):
+        return
+    # The region of each polygon as (u offset, v offset, u scale, v scale), the identity if its image is not in the atlas:
+    identity = (0.0, 0.0, 1.0, 1.0)
+    polygon_regions = numpy.array([texture_atlas.regions.get(mesh_texture_poly.image, identity)
+            for mesh_texture_poly in mesh.uv_textures[0].data], dtype=numpy.float64).reshape(-1, 4)
+    polygons = mesh.polygons
+    loop_starts = array('i', [0]) * len(polygons)
+    loop_totals = array('i', [0]) * len(polygons)
+    polygons.foreach_get('loop_start', loop_starts)
+    polygons.foreach_get('loop_total', loop_totals)
+    loop_starts = numpy.array(loop_starts, dtype=numpy.int64)
+    loop_totals = numpy.array(loop_totals, dtype=numpy.int64)
+    uv_layer_data = mesh.uv_layers[0].data
+    uvs = array('f', [0.0]) * (len(uv_layer_data) * 2)
+    uv_layer_data.foreach_get('uv', uvs)
+    uvs = numpy.array(uvs, dtype=numpy.float64).reshape(-1, 2)
+    # The loops of each polygon (whatever the order of the loops):
+    loop_polygons = numpy.repeat(numpy.arange(len(loop_totals)), loop_totals)
+    loop_indices = numpy.repeat(loop_starts, loop_totals) + numpy.arange(len(loop_polygons)) - numpy.repeat(numpy.cumsum(loop_totals) - loop_totals, loop_totals)
+    regions = polygon_regions[loop_polygons]
+    uvs[loop_indices] = regions[:, :2] + uvs[loop_indices] * regions[:, 2:]
+    uv_layer_data.foreach_set('uv', uvs.astype(numpy.float32).reshape(-1))
+
+
+
+#
+# @return the image's pixels as (height, width, RGBA) array (rows from bottom to top like in blender).
+#
+def read_image_pixels(image):
+    width, height = image.size
+    channels = image.channels
+    pixels = numpy.array(image.pixels[:], dtype=numpy.float32).reshape(height, width, channels)
+    if (channels == 4):
+        return pixels
+    rgba = numpy.ones((height, width, 4), dtype=numpy.float32)
+    if (channels < 3):
+        rgba[:, :, :3] = pixels[:, :, :1]
+    else:
+        rgba[:, :, :3] = pixels[:, :, :3]
+    return rgba
+
+
+
+#
+# @return the power of two nearest to the size (on a logarithmic scale), at most max_size.
+#
+def nearest_power_of_two(size, max_size):
+    power_of_two = 2 ** int(round(math.log(max(size, 1), 2)))
+    while (power_of_two > max_size and power_of_two > 1):
+        power_of_two //= 2
+    return power_of_two
+
+
+
+#
+# The weights of the source pixels for each target pixel (Lanczos filter), the kernel
+# widened when downsampling such that it doesn't alias. At the borders the weights are
+# renormalized, i.e. the edge is extended.
+# @return (target_size, source_size) weights.
+#
+def resampling_weights(source_size, target_size):
+    scale = target_size / source_size
+    kernel_scale = min(scale, 1.0)
+    centers = (numpy.arange(target_size) + 0.5) / scale - 0.5
+    distances = (numpy.arange(source_size)[numpy.newaxis, :] - centers[:, numpy.newaxis]) * kernel_scale
+    weights = numpy.sinc(distances) * numpy.sinc(distances / lanczos_lobes)
+    weights[numpy.abs(distances) >= lanczos_lobes] = 0.0
+    return (weights / weights.sum(axis=1, keepdims=True)).astype(numpy.float32)
+
+
+
+#
+# Resizes the (height, width, RGBA) pixels with alpha premultiplied, thus transparent
+# pixels don't bleed their color into the opaque ones.
+#
+def resize_pixels(pixels, width, height):
+    source_height, source_width, channels = pixels.shape
+    if (source_width == width and source_height == height):
+        return pixels
+    premultiplied = pixels.copy()
+    premultiplied[:, :, :3] *= premultiplied[:, :, 3:4]
+    if (source_width != width):
+        premultiplied = numpy.tensordot(resampling_weights(source_width, width), premultiplied, axes=([1], [1])).transpose(1, 0, 2)
+    if (source_height != height):
+        premultiplied = resampling_weights(source_height, height).dot(premultiplied.reshape(source_height, -1)).reshape(height, width, channels)
+    resized = numpy.clip(premultiplied, 0.0, 1.0)
+    alpha = resized[:, :, 3:4]
+    resized[:, :, :3] = numpy.where(alpha > 0, numpy.clip(resized[:, :, :3] / numpy.maximum(alpha, 1e-8), 0.0, 1.0), 0.0)
+    return resized
+
+
+
+#
+# Resizes the pixels to the (power of two) size and encodes them as PNG, or with the
+# mip chain as uncompressed DDS. Runs in the worker threads, thus touches no blender data.
+# @return the encoded file content.
+#
+def normalize_pixels(pixels, width, height, with_mipmaps):
+    resized = resize_pixels(pixels, width, height)
+    if (not with_mipmaps):
+        return encode_png(resized)
+    levels = [resized]
+    while (width > 1 or height > 1):
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+        levels.append(resize_pixels(levels[-1], width, height))
+    return encode_dds(levels)
+
+
+
+#
+# @return the (height, width, RGBA) pixels as bytes of 8 bit channels, rows from top to bottom
+# (blender stores the bottom row first).
+#
+def pixels_to_bytes(pixels, channel_order = (0, 1, 2, 3)):
+    return array_to_bytes(numpy.round(pixels[::-1, :, channel_order] * 255.0).astype(numpy.uint8))
+
+
+
+def encode_png(pixels):
+    height, width = pixels.shape[:2]
+    # Each row is prefixed with its filter type (0 = none):
+    rows = numpy.zeros((height, 1 + width * 4), dtype=numpy.uint8)
+    rows[:, 1:] = numpy.frombuffer(pixels_to_bytes(pixels), dtype=numpy.uint8).reshape(height, -1)
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(array_to_bytes(rows), 6))
+            + chunk(b'IEND', b''))
+
+
+
+#
+# DDS with the mip chain, uncompressed 32 bit BGRA (the engine compresses on load if configured).
+#
+def encode_dds(levels):
+    height, width = levels[0].shape[:2]
+    flags = 0x1 | 0x2 | 0x4 | 0x8 | 0x1000 | 0x20000 # <-- caps, height, width, pitch, pixel format, mipmap count
+    pixel_format = struct.pack('<8I', 32, 0x1 | 0x40, 0, 32, 0x00ff0000, 0x0000ff00, 0x000000ff, 0xff000000)
+    caps = 0x8 | 0x1000 | 0x400000 # <-- complex, texture, mipmap
+    header = (b'DDS ' + struct.pack('<7I', 124, flags, height, width, width * 4, 0, len(levels))
+            + struct.pack('<11I', *([0] * 11)) + pixel_format + struct.pack('<5I', caps, 0, 0, 0, 0))
+    return header + b''.join([pixels_to_bytes(level, (2, 1, 0, 3)) for level in levels])
+
+
+
+#
+# @return the armature deforming the mesh object (armature modifier or armature parent) or None.
+#
+def find_armature(o):
+    for modifier in o.modifiers:
+        if (modifier.type == 'ARMATURE' and not modifier.object is None):
+            return modifier.object
+    if (not o.parent is None and o.parent.type == 'ARMATURE'):
+        return o.parent
+    return None
+
+
+
+#
+# @return the actions of the armature: the active one and those of the NLA strips.
+#
+def collect_armature_actions(armature):
+    actions = []
+    animation_data = armature.animation_data
+    if (animation_data is None):
+        return actions
+    if (not animation_data.action is None):
+        actions.append(animation_data.action)
+    for nla_track in animation_data.nla_tracks:
+        for strip in nla_track.strips:
+            if (not strip.action is None and not strip.action in actions):
+                actions.append(strip.action)
+    return actions
+
+
+
+#
+# Exports the actions of the armature deforming the mesh object as animation COLLADA files
+# into the animation folder. Baked actions are reused from the animation cache.
+# @return the Animation entries of the variant.
+#
+def export_animations(context, export_context, o):
+    armature = find_armature(o)
+    if (armature is None):
+        return []
+    if (o.type != 'MESH'):
+        # Only meshes are exported skinned, the animations could not drive anything else:
+        print('Only meshes are exported skinned. Skipping the animations of ', armature.name, ' for: ', o.name)
+        return []
+    if (numpy is None):
+        print('Baking the actions of ', armature.name, ' requires numpy. Skipping the animations.')
+        return []
+    animation_filelink_base = os.path.join(
+            get_target_mod_path(context),
+            context.scene.export_to_0ad_in_target_animation_folder,
+            "" # <-- add the correct slash at the end.
+    )
+    fps = context.scene.render.fps / context.scene.render.fps_base
+    animations = []
+    for action in collect_armature_actions(armature):
+        filelink = build_filelink(context, action.name, '.dae', False, animation_filelink_base, export_context)
+        export_context.animation_cache.export(armature, action, fps, filelink, export_context)
+        export_context.record_written_file('animation', filelink)
+        animations.append(Animation(os.path.relpath(filelink, animation_filelink_base), parse_name(action.name).file_name))
+    return animations
+
+
+
+#
+# Evaluates the F-curve at all the frames at once: Linear and constant keyframes are
+# interpolated in bulk, others (bezier, F-curve modifiers) are evaluated frame by frame,
+# but still without stepping the scene through the frames.
+# @return array of the values.
+#
+def evaluate_fcurve(fcurve, frames):
+    keyframe_points = fcurve.keyframe_points
+    interpolations = set([keyframe_point.interpolation for keyframe_point in keyframe_points])
+    if (len(keyframe_points) > 0 and len(fcurve.modifiers) == 0 and interpolations <= set(['LINEAR', 'CONSTANT'])):
+        co = array('f', [0.0]) * (len(keyframe_points) * 2)
+        keyframe_points.foreach_get('co', co)
+        co = numpy.array(co).reshape(-1, 2)
+        if (interpolations == set(['LINEAR'])):
+            return numpy.interp(frames, co[:, 0], co[:, 1])
+        if (interpolations == set(['CONSTANT'])):
+            return co[numpy.clip(numpy.searchsorted(co[:, 0], frames, 'right') - 1, 0, len(co) - 1), 1]
+    return numpy.array([fcurve.evaluate(frame) for frame in frames])
+
+
+
+#
+# 4x4 matrices of the given rotation for each frame: quaternions (w, x, y, z) or euler angles (x, y, z) in the given order.
+#
+def rotation_matrices_from_quaternions(quaternions):
+    w, x, y, z = (quaternions / numpy.linalg.norm(quaternions, axis=1)[:, numpy.newaxis]).T
+    matrices = numpy.zeros((len(quaternions), 4, 4))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+
+def rotation_matrices_from_eulers(eulers, order):
+    matrices = numpy.tile(numpy.identity(4), (len(eulers), 1, 1))
+    # Blender's XYZ order rotates around X first, i.e. R = Rz * Ry * Rx:
+    for axis in order:
+        i = 'XYZ'.index(axis)
+        angles = eulers[:, i]
+        c = numpy.cos(angles)
+        s = numpy.sin(angles)
+        rotation = numpy.tile(numpy.identity(4), (len(eulers), 1, 1))
+        j, k = [(1, 2), (2, 0), (0, 1)][i]
+        rotation[:, j, j] = c
+        rotation[:, j, k] = -s
+        rotation[:, k, j] = s
+        rotation[:, k, k] = c
+        matrices = numpy.einsum('nij,njk->nik', rotation, matrices)
+    return matrices
+
+
+
+#
+# Bakes the action for the armature: The pose bone channels (location, rotation, scale) are read
+# from the F-curves in bulk, unanimated channels keep the current pose. Constraints and drivers are not evaluated.
+# @return (times in seconds, {bone name: (frame count, 4, 4) local matrices relative to the parent bone})
+#
+def bake_action(armature, action, fps):
+    frame_start, frame_end = action.frame_range
+    frames = numpy.arange(int(round(frame_start)), int(round(frame_end)) + 1, dtype=numpy.float64)
+    fcurves = {}
+    for fcurve in action.fcurves:
+        fcurves[(fcurve.data_path, fcurve.array_index)] = fcurve
     
-    if debug:
-        print('Target filelink: ', filelink)
-        
-    #append to file
-    with open(filelink, 'a') as f:#for closing filestream automatically
-        #f.read()
-        #f.readhline()
-        if (f.write(content)):
-            print('Appended to file: ', filelink, ' \t Content: ',  content)
-            return True
-        
-        #f.tell()
-        #f.seek(byte) #e.g. 0123 -> 4th byte is 3
-        #http://docs.python.org/3/tutorial/inputoutput.html
-    #f.close() -- no longer necessary when using with/scope
-    #use pickle.dump(object, filestream) and pickle.load(filestream) (somewhat like serialization?)
-    return False
+    def channel(pose_bone, attribute):
+        data_path = 'pose.bones["' + pose_bone.name + '"].' + attribute
+        values = list(getattr(pose_bone, attribute))
+        columns = []
+        for index in range(len(values)):
+            fcurve = fcurves.get((data_path, index))
+            if (fcurve is None):
+                columns.append(numpy.full(len(frames), values[index]))
+            else:
+                columns.append(evaluate_fcurve(fcurve, frames))
+        return numpy.array(columns).T
+    
+    bone_matrices = {}
+    for pose_bone in armature.pose.bones:
+        bone = pose_bone.bone
+        rest_matrix = numpy.array(bone.matrix_local)
+        if (not bone.parent is None):
+            rest_matrix = numpy.linalg.inv(numpy.array(bone.parent.matrix_local)).dot(rest_matrix)
+        if (pose_bone.rotation_mode == 'QUATERNION'):
+            rotations = rotation_matrices_from_quaternions(channel(pose_bone, 'rotation_quaternion'))
+        elif (pose_bone.rotation_mode == 'AXIS_ANGLE'):
+            axis_angles = channel(pose_bone, 'rotation_axis_angle')
+            half_angles = axis_angles[:, 0] / 2
+            axes = axis_angles[:, 1:] / numpy.maximum(numpy.linalg.norm(axis_angles[:, 1:], axis=1), 1e-12)[:, numpy.newaxis]
+            rotations = rotation_matrices_from_quaternions(numpy.column_stack([numpy.cos(half_angles), axes * numpy.sin(half_angles)[:, numpy.newaxis]]))
+        else:
+            rotations = rotation_matrices_from_eulers(channel(pose_bone, 'rotation_euler'), pose_bone.rotation_mode)
+        basis = rotations.copy()
+        basis[:, :3, :3] *= channel(pose_bone, 'scale')[:, numpy.newaxis, :]
+        basis[:, :3, 3] = channel(pose_bone, 'location')
+        bone_matrices[pose_bone.name] = numpy.einsum('ij,njk->nik', rest_matrix, basis)
+    return (frames - frames[0]) / fps, bone_matrices
 
 
 
-def build_filelink(context, objectname, fileending = "", ensure_filelink_not_exists = True, basedirectory = None):
-    if debug:
-        print('building filelink ...')
-        
+#
+# Writes the baked action as animation COLLADA: the armature's joint hierarchy (at rest)
+# and one animation per bone sampling the bone's local transform matrix.
+#
+def write_animation_collada(filelink, armature, times, bone_matrices):
+    root = ElementTree.Element(collada_tag('COLLADA'), {'version': '1.4.1'})
+    asset = ElementTree.SubElement(root, collada_tag('asset'))
+    ElementTree.SubElement(asset, collada_tag('unit'), {'name': 'meter', 'meter': '1'})
+    ElementTree.SubElement(asset, collada_tag('up_axis')).text = 'Z_UP'
     
-    filelink = ""
+    def matrix_text(matrix):
+        return ' '.join([repr(float(value)) for value in numpy.asarray(matrix).reshape(-1)])
     
-    # build filelink
-    # http://blender.stackexchange.com/questions/5280/how-to-use-the-current-file-name-as-the-the-output-name-in-the-file-output-node
-    ## Get file name:
-    #filename = bpy.path.basename(context.blend_data.filepath)
-    ## Remove .blend extension:
-    #filename = os.path.splitext(filename)[0]
-    filelink = bpy.path.abspath("//") #<-- absolute path to the current .blend file
-    print('base_path: ' + filelink)
-    # base path:
-    filelink = os.path.join(context.scene.export_to_0ad_in_target_path_base, context.scene.export_to_0ad_in_target_path_mod)
-    print('base_path: ' + filelink)
-    # If a relative filelink or a special subfolder that can't be derived from the objectname is desired, then use the basedirectory parameter:
-    if (not basedirectory is None):
-        filelink = basedirectory #'./' # using relative paths -> relative to home directory
-        print('base_path: ' + filelink)
-        
-    #root = os.getcwd()#<-- the directory of the current file (the question is of it's the blend file?)
-    #root = dirname(pathname(__FILE__))#http://stackoverflow.com/questions/5137497/find-current-directory-and-files-directory
-    filename = ''#TODO Determine this blender file name!
-     
-    filepath_parts = objectname.split("##")
-    filepath_parts_length = len(filepath_parts)
-    # no subfolders?
-    if (filepath_parts_length < 1):
-        print('No subfolders given in object name: ' + objectname + '. Will use highest level output folder + specified global subfolder.')
-    else:
-        filepath_parts_index = 0 
-        # each non-empty part is a part of the filelink:
-        while (filepath_parts_index < filepath_parts_length - 1): # - 1 because the last is no subfolder
-            object_specific_subfolder = filepath_parts[filepath_parts_index]
-            print('Found subfolder in object name: ' + object_specific_subfolder + ' filepath_parts_index: ' + str(filepath_parts_index) + ' of ' + str(filepath_parts_length))
-            filelink = os.path.join(filelink, object_specific_subfolder)
-            filepath_parts_index += 1
-            
-    filename = filepath_parts[filepath_parts_length - 1]
+    def joint_id(bone):
+        return armature.name + '_' + bone.name
     
-    filelink = os.path.join(filelink, filename)
-    if (not fileending is None and fileending != ""):
-        # Does not yet contain a dot?
-        if (fileending.find('[.]') == -1):
-            fileending = "." + fileending
-        filelink = filelink + fileending
+    library_animations = ElementTree.SubElement(root, collada_tag('library_animations'))
+    for bone in armature.data.bones:
+        matrices = bone_matrices.get(bone.name)
+        if (matrices is None):
+            continue
+        animation_id = joint_id(bone) + '_pose_matrix'
+        animation = ElementTree.SubElement(library_animations, collada_tag('animation'), {'id': animation_id})
+        for suffix, values, stride, param_name, param_type in [
+                ('-input', times, 1, 'TIME', 'float'),
+                ('-output', matrices, 16, 'TRANSFORM', 'float4x4')]:
+            source = ElementTree.SubElement(animation, collada_tag('source'), {'id': animation_id + suffix})
+            float_array = ElementTree.SubElement(source, collada_tag('float_array'), {'id': animation_id + suffix + '-array', 'count': str(len(times) * stride)})
+            float_array.text = matrix_text(values)
+            technique = ElementTree.SubElement(source, collada_tag('technique_common'))
+            accessor = ElementTree.SubElement(technique, collada_tag('accessor'), {'source': '#' + animation_id + suffix + '-array', 'count': str(len(times)), 'stride': str(stride)})
+            ElementTree.SubElement(accessor, collada_tag('param'), {'name': param_name, 'type': param_type})
+        source = ElementTree.SubElement(animation, collada_tag('source'), {'id': animation_id + '-interpolation'})
+        ElementTree.SubElement(source, collada_tag('Name_array'), {'id': animation_id + '-interpolation-array', 'count': str(len(times))}).text = ' '.join(['LINEAR'] * len(times))
+        technique = ElementTree.SubElement(source, collada_tag('technique_common'))
+        accessor = ElementTree.SubElement(technique, collada_tag('accessor'), {'source': '#' + animation_id + '-interpolation-array', 'count': str(len(times)), 'stride': '1'})
+        ElementTree.SubElement(accessor, collada_tag('param'), {'name': 'INTERPOLATION', 'type': 'name'})
+        sampler = ElementTree.SubElement(animation, collada_tag('sampler'), {'id': animation_id + '-sampler'})
+        for semantic, suffix in [('INPUT', '-input'), ('OUTPUT', '-output'), ('INTERPOLATION', '-interpolation')]:
+            ElementTree.SubElement(sampler, collada_tag('input'), {'semantic': semantic, 'source': '#' + animation_id + suffix})
+        ElementTree.SubElement(animation, collada_tag('channel'), {'source': '#' + animation_id + '-sampler', 'target': joint_id(bone) + '/transform'})
     
-    # Don't overwrite existing files because for several selections individual boms could be desired.
-    number = 0
-    while (os.path.isfile(filelink)):#alternatively: try: with (open(filelink)): ... except IOError: print('file not found') 
-        number = number + 1              #http://stackoverflow.com/questions/82831/how-do-i-check-if-a-file-exists-using-python
-        filename_ = filename + str(number)
-        filelink = filename_ + fileending
+    library_visual_scenes = ElementTree.SubElement(root, collada_tag('library_visual_scenes'))
+    visual_scene = ElementTree.SubElement(library_visual_scenes, collada_tag('visual_scene'), {'id': 'Scene', 'name': 'Scene'})
+    armature_node = ElementTree.SubElement(visual_scene, collada_tag('node'), {'id': armature.name, 'name': armature.name, 'type': 'NODE'})
+    ElementTree.SubElement(armature_node, collada_tag('matrix'), {'sid': 'transform'}).text = matrix_text(armature.matrix_world)
+    bones_to_visit = [(bone, armature_node) for bone in armature.data.bones if bone.parent is None]
+    while (len(bones_to_visit) > 0):
+        bone, parent_node = bones_to_visit.pop(0)
+        node = ElementTree.SubElement(parent_node, collada_tag('node'), {'id': joint_id(bone), 'sid': bone.name, 'name': bone.name, 'type': 'JOINT'})
+        rest_matrix = numpy.array(bone.matrix_local)
+        if (not bone.parent is None):
+            rest_matrix = numpy.linalg.inv(numpy.array(bone.parent.matrix_local)).dot(rest_matrix)
+        ElementTree.SubElement(node, collada_tag('matrix'), {'sid': 'transform'}).text = matrix_text(rest_matrix)
+        for child_bone in bone.children:
+            bones_to_visit.append((child_bone, node))
+    scene = ElementTree.SubElement(root, collada_tag('scene'))
+    ElementTree.SubElement(scene, collada_tag('instance_visual_scene'), {'url': '#Scene'})
+    
+    directory = os.path.dirname(filelink)
+    if (directory != '' and not os.path.isdir(directory)):
+        os.makedirs(directory)
+    ElementTree.ElementTree(root).write(filelink, encoding='utf-8', xml_declaration=True)
 
-    # A non-existing filelink was found.
-    return filelink
 
 
+#
+# Updates the hash with the settings of the modifiers shown in the viewport (i.e. those
+# shaping the evaluated mesh).
+#
+def update_hash_with_modifiers(sha1, modifiers):
+    for modifier in modifiers:
+        if (not modifier.show_viewport):
+            continue
+        settings = []
+        for rna_property in modifier.bl_rna.properties:
+            if (rna_property.identifier == 'rna_type'):
+                continue
+            value = getattr(modifier, rna_property.identifier, None)
+            if (isinstance(value, bpy.types.ID)):
+                value = value.name
+            elif (not isinstance(value, (bool, int, float, str))):
+                # e.g. vectors
+                try:
+                    value = tuple(value)
+                except TypeError:
+                    value = str(value)
+            settings.append((rna_property.identifier, value))
+        sha1.update(repr(settings).encode())
 
 
 
+#
+# The SHA-1 hex digest of the file's content.
+#
+def hash_file(filelink):
+    sha1 = hashlib.sha1()
+    with open(filelink, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
 
 #HELPER - TIDYUPNAMES
 def tidyUpNames():
@@ -1235,29 +3214,20 @@ def isThereActiveObjectThenGet(context):
 
 
 #HELPER - GETBASENAME
-#@return string:basename aka cleanname
+#@return string:basename aka cleanname, i.e. without the .001, .002, .. ending
 def getBaseName(s):
-    obj_basename_parts = s.split('.')
-    obj_basename_parts_L = len(obj_basename_parts)
-    if debug:
-        print('getBaseName: Last part: ', obj_basename_parts[obj_basename_parts_L - 1])
-    if (obj_basename_parts_L > 1
-    and re.match('[0-9]{3}$', obj_basename_parts[obj_basename_parts_L - 1])):
-        if debug:
-            print('getBaseName: determining base name')
-        #attention: last item is left intentionally
-        cleanname = ''
-        for i in range(0, obj_basename_parts_L - 1):
-            cleanname += obj_basename_parts[i]
-        #done this strange way to avoid unnecessary GUI updates
-        #as the sel.name fields in the UI may be unnecessarily updated on change ...
-        if debug:
-            print('getBaseName: determining *done*, determined basename: ', cleanname)
-        return cleanname
-    else:
-        if debug:
-            print('getBaseName: already tidied up *done*, basename: ', s)
-        return s
+    return parse_name(s).base_name
+
+
+
+#
+# Parses a name according to the name grammar (see the globals). The parsing is pure,
+# thus the results are memoized (bounded) independent of the export runs.
+# @return the ParsedName.
+#
+@functools.lru_cache(maxsize = parsed_name_cache_size)
+def parse_name(name):
+    return ParsedName(name)
     
 
 #
@@ -1296,7 +3266,7 @@ class OBJECT_OT_ExportTo0AD(bpy.types.Operator):
     " then all the not hidden objects and groups are examined."
     bl_context = "objectmode"
     bl_register = True
-    bl_undo = True
+    bl_undo = False # <-- The scene is left as it was, thus an undo push would only cost memory.
     #bl_options = {'REGISTER', 'UNDO'}
     
     #=======CONSTRUCTION=======================================================#
@@ -1313,9 +3283,90 @@ class OBJECT_OT_ExportTo0AD(bpy.types.Operator):
         #return context.selected_objects is not None && len(context.selected_objects) > 0
 
     def execute(self, context):
-        main(context)
+        self.export_context = ExportContext()
+        act(context, self.export_context)
+        self.report_leaked_datablocks()
+        self.report_budget_violations()
         return {'FINISHED'}
 
+    # Called from the GUI: export in time slices without blocking the interface.
+    def invoke(self, context, event):
+        self.export_context = ExportContext()
+        # The context is only valid during this call, the export steps run in later timer events:
+        self._steps = act_stepwise(CurrentContext(context.scene), self.export_context)
+        self._area = context.area
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(timer_interval_in_seconds, context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if (event.type == 'ESC'):
+            self.cancel(context)
+            return {'CANCELLED'}
+        if (event.type != 'TIMER'):
+            return {'PASS_THROUGH'}
+        
+        time_slice_end = time.time() + time_slice_in_seconds
+        try:
+            while (time.time() < time_slice_end):
+                next(self._steps)
+        except StopIteration:
+            self.finish(context)
+            self.report_leaked_datablocks()
+            self.report_budget_violations()
+            return {'FINISHED'}
+        except Exception as e:
+            # The export failed (e.g. an I/O error), the generator's cleanup has run already or runs on close:
+            traceback.print_exc()
+            self._steps.close()
+            self.finish(context)
+            self.report({'ERROR'}, 'Export to 0AD actors failed: ' + str(e))
+            self.report_leaked_datablocks()
+            return {'CANCELLED'}
+        
+        self.report_progress(context)
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        # Raises GeneratorExit within the export which purges the sandbox with the duplicates created so far:
+        self._steps.close()
+        self.finish(context)
+        self.report({'WARNING'}, 'Export to 0AD actors cancelled.')
+        self.report_leaked_datablocks()
+
+    def report_leaked_datablocks(self):
+        export_progress = self.export_context.progress
+        if (export_progress.leaked_datablocks is None):
+            return
+        if (export_progress.leaked_datablocks_count() > 0):
+            self.report({'WARNING'}, 'Leaked datablocks: ' + str(export_progress.leaked_datablocks))
+        else:
+            self.report({'INFO'}, 'No datablocks leaked.')
+
+    def report_budget_violations(self):
+        violations = self.export_context.budget_violations
+        if (len(violations) == 0):
+            return
+        for violation in violations[:budget_violations_shown_count]:
+            self.report({'WARNING'}, 'Budget exceeded: ' + violation)
+        if (len(violations) > budget_violations_shown_count):
+            self.report({'WARNING'}, '... ' + str(len(violations) - budget_violations_shown_count) + ' more budget violations in the budget report.')
+
+    def finish(self, context):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._timer)
+        window_manager.progress_end()
+        if (not self._area is None):
+            self._area.header_text_set()
+
+    def report_progress(self, context):
+        window_manager = context.window_manager
+        window_manager.progress_update(self.export_context.progress.percentage())
+        if (not self._area is None):
+            self._area.header_text_set(self.export_context.progress.toText())
+
 
 
 
@@ -1376,13 +3427,87 @@ class VIEW3D_PT_tools_ExportTo0AD(bpy.types.Panel):
         row = layout.row(align = True)
         row.prop(s, 'export_to_0ad_in_include_hidden')
         
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_attach_unparented_props')
+        if (s.export_to_0ad_in_attach_unparented_props):
+            row.prop(s, 'export_to_0ad_in_attach_tolerance')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_output')
+        
         row = layout.row(align = True)
         row.prop(s, 'export_to_0ad_in_overwrite_existing')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_resume')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_texture_atlas')
+        if (s.export_to_0ad_in_texture_atlas):
+            row.prop(s, 'export_to_0ad_in_texture_atlas_max_size')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_quality_tiers')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_bake_ao')
+        if (s.export_to_0ad_in_bake_ao):
+            row.prop(s, 'export_to_0ad_in_ao_size')
+            row = layout.row(align = True)
+            row.prop(s, 'export_to_0ad_in_ao_samples')
+            row.prop(s, 'export_to_0ad_in_ao_distance')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_normalize_textures')
+        if (s.export_to_0ad_in_normalize_textures):
+            row.prop(s, 'export_to_0ad_in_texture_max_size')
+            row = layout.row(align = True)
+            row.prop(s, 'export_to_0ad_in_texture_mipmaps')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_mesh_format')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_optimize_meshes')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_export_animations')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_cache_curves_on_disk')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_profile_memory')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_write_bom')
+        if (s.export_to_0ad_in_write_bom):
+            row.prop(s, 'export_to_0ad_in_digit_count')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_report_budgets')
+        if (s.export_to_0ad_in_report_budgets):
+            col = layout.column(align = True)
+            col.prop(s, 'export_to_0ad_in_budget_triangles')
+            col.prop(s, 'export_to_0ad_in_budget_vertices')
+            col.prop(s, 'export_to_0ad_in_budget_texture_memory')
+        
+        row = layout.row(align = True)
+        row.prop(s, 'export_to_0ad_in_all_scenes')
+        if (s.export_to_0ad_in_all_scenes):
+            # The subset of scenes to export:
+            col = layout.column(align = True)
+            for scene in bpy.data.scenes:
+                if (scene.name.startswith(scratch_scene_name)):
+                    continue
+                col.prop(scene, 'export_to_0ad_in_is_included_in_all_scenes', text = scene.name)
             
         row = layout.row(align = True)
         label = in_mode_str + " to 0AD Actors!"
         if (s.export_to_0ad_in_mode == '0'):
             label = label + ' (derive parent objects first)'
+        if (s.export_to_0ad_in_all_scenes):
+            label = label + ' (all scenes)'
         row.operator('object.export_to_0ad', icon='FILE_TICK', text = label)
         
 
@@ -1415,16 +3540,203 @@ def register():
         ],
         default='0'
     )
-    # is hidden
-    bpy.types.Scene.export_to_0ad_in_include_hidden = BoolProperty(
-        name = "Include hidden objects?",
-        description = "Whether to include hidden objects or not.",
+    # is hidden
+    bpy.types.Scene.export_to_0ad_in_include_hidden = BoolProperty(
+        name = "Include hidden objects?",
+        description = "Whether to include hidden objects or not.",
+        default = False
+    )
+    # props placed next to their actor
+    bpy.types.Scene.export_to_0ad_in_attach_unparented_props = BoolProperty(
+        name = "Attach unparented props?",
+        description = "Whether to attach objects without parent to the nearest prop point (EMPTY child object) of another actor"
+                " within the tolerance, as if parented to it.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_attach_tolerance = FloatProperty(
+        name = "Tolerance",
+        description = "The maximum distance of an unparented prop's origin to the prop point it is attached to.",
+        default = 0.5,
+        min = 0.0
+    )
+    # overwrite existing files  
+    bpy.types.Scene.export_to_0ad_in_overwrite_existing = BoolProperty(
+        name = "Overwrite existing files?",
+        description = "Whether to overwrite existing files or to use a different filename (appending a number).",
+        default = True
+    )
+    # resume
+    bpy.types.Scene.export_to_0ad_in_resume = BoolProperty(
+        name = "Resume interrupted export?",
+        description = "Whether to skip the actors, meshes and textures that were completed"
+                " by an interrupted previous export (according to the journal in the mod folder).",
+        default = False
+    )
+    # texture atlas
+    bpy.types.Scene.export_to_0ad_in_texture_atlas = BoolProperty(
+        name = "Pack skins into an atlas?",
+        description = "Whether to pack the distinct skins of each actor into one power-of-two texture atlas"
+                " (remapping the exported UVs) to reduce draw calls in game.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_texture_atlas_max_size = IntProperty(
+        name = "Atlas max size",
+        description = "The maximum width and height of a texture atlas. If the skins don't fit, they are kept separate.",
+        default = 4096,
+        min = 64,
+        max = 16384
+    )
+    # texture normalization
+    bpy.types.Scene.export_to_0ad_in_normalize_textures = BoolProperty(
+        name = "Normalize textures?",
+        description = "Whether to resize the skins to the nearest power of two (at most the max size) with a Lanczos filter"
+                " in a pool of worker threads (requires numpy). The results are cached by the source image's hash.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_quality_tiers = StringProperty(
+        name = "Quality tiers",
+        description = "The triangle percentages of the decimated meshes to export next to each mesh (as <mesh>_lod<percentage>.dae),"
+                " comma separated, e.g. '50, 25'. None if empty.",
+        default = ""
+    )
+    bpy.types.Scene.export_to_0ad_in_bake_ao = BoolProperty(
+        name = "Bake ambient occlusion?",
+        description = "Whether to bake an ambient occlusion map (aoTex) for the 2nd UV map of meshes having one,"
+                " the props occluding too. Unchanged meshes are not baked again but taken from the cache.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_ao_size = IntProperty(
+        name = "Size",
+        description = "The width and height of the baked ambient occlusion map.",
+        default = 512,
+        min = 16,
+        max = 8192
+    )
+    bpy.types.Scene.export_to_0ad_in_ao_samples = IntProperty(
+        name = "Samples",
+        description = "The samples of the raytraced ambient occlusion.",
+        default = 8,
+        min = 1,
+        max = 128
+    )
+    bpy.types.Scene.export_to_0ad_in_ao_distance = FloatProperty(
+        name = "Distance",
+        description = "The distance up to which other geometry occludes.",
+        default = 1.0,
+        min = 0.0
+    )
+    bpy.types.Scene.export_to_0ad_in_texture_max_size = IntProperty(
+        name = "Texture max size",
+        description = "The maximum width and height of a normalized texture.",
+        default = 1024,
+        min = 1,
+        max = 16384
+    )
+    bpy.types.Scene.export_to_0ad_in_texture_mipmaps = BoolProperty(
+        name = "Pre-generate mipmaps (DDS)?",
+        description = "Whether to write the normalized textures with their mip chain as uncompressed DDS instead of PNG.",
+        default = False
+    )
+    # output
+    bpy.types.Scene.export_to_0ad_in_output = EnumProperty(
+        name = "Output",
+        description = "Whether to write the actors, meshes, textures and animations as loose files into the mod folder"
+                " or into an archive <mod folder>/<mod name>.zip (updated, unchanged members are reused).",
+        items = [
+            ("FILES", "Files", "Loose files in the mod folder"),
+            ("ARCHIVE", "Archive (.zip)", "Streamed into the mod's zip archive")
+        ],
+        default = 'FILES'
+    )
+    # mesh format
+    bpy.types.Scene.export_to_0ad_in_mesh_format = EnumProperty(
+        name = "Mesh format",
+        description = "Whether to write the COLLADA meshes, the engine's cached binary models (.dae.cached.pmd,"
+                " such that the game skips the conversion on load) next to them or the cached binary models only"
+                " (requires numpy).",
+        items = [
+            ("COLLADA", "COLLADA", ""),
+            ("COLLADA_PMD", "COLLADA + cached PMD", ""),
+            ("PMD", "Cached PMD only", "")
+        ],
+        default='COLLADA'
+    )
+    # mesh optimization
+    bpy.types.Scene.export_to_0ad_in_optimize_meshes = BoolProperty(
+        name = "Optimize meshes?",
+        description = "Whether to weld identical vertices and order the triangles for the vertex cache"
+                " in the exported meshes (requires numpy).",
+        default = False
+    )
+    # animations
+    bpy.types.Scene.export_to_0ad_in_export_animations = BoolProperty(
+        name = "Export animations?",
+        description = "Whether to export the actions of the armature deforming each mesh into the animation folder"
+                " (requires numpy), the mesh is then exported skinned. Baked actions are cached in the mod's cache folder.",
+        default = False
+    )
+    # curve cache
+    bpy.types.Scene.export_to_0ad_in_cache_curves_on_disk = BoolProperty(
+        name = "Cache converted curves on disk?",
+        description = "Whether to keep the meshes converted from curves in the mod's cache folder"
+                " such that unchanged curves are not converted again by later exports.",
+        default = False
+    )
+    # memory profiling
+    bpy.types.Scene.export_to_0ad_in_profile_memory = BoolProperty(
+        name = "Profile memory?",
+        description = "Whether to record allocation snapshots and datablock counts at each export phase"
+                " and actor into a JSON file in the mod folder (slows down the export).",
+        default = False
+    )
+    # budgets
+    bpy.types.Scene.export_to_0ad_in_write_bom = BoolProperty(
+        name = "Write bill of materials?",
+        description = "Whether to write the bill of materials (dimensions, volume, surface area and mass per part)"
+                " of the selected objects into the mod folder.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_digit_count = IntProperty(
+        name = "Digits",
+        description = "The count of decimal digits of the measures in the bill of materials.",
+        default = 3,
+        min = 0,
+        max = 10
+    )
+    bpy.types.Scene.export_to_0ad_in_report_budgets = BoolProperty(
+        name = "Report budgets?",
+        description = "Whether to count the triangles, vertices and texture memory (mipmaps included) of each actor"
+                " and its props, flag the actors exceeding the budgets and write a JSON report into the mod folder.",
         default = False
     )
-    # overwrite existing files  
-    bpy.types.Scene.export_to_0ad_in_overwrite_existing = BoolProperty(
-        name = "Overwrite existing files?",
-        description = "Whether to overwrite existing files or to use a different filename (appending a number).",
+    bpy.types.Scene.export_to_0ad_in_budget_triangles = IntProperty(
+        name = "Max triangles",
+        description = "The budget of triangles per actor, props included (0 = no budget).",
+        default = 10000,
+        min = 0
+    )
+    bpy.types.Scene.export_to_0ad_in_budget_vertices = IntProperty(
+        name = "Max vertices",
+        description = "The budget of vertices per actor, props included (0 = no budget).",
+        default = 10000,
+        min = 0
+    )
+    bpy.types.Scene.export_to_0ad_in_budget_texture_memory = IntProperty(
+        name = "Max texture memory (KiB)",
+        description = "The budget of estimated GPU texture memory per actor, props included (0 = no budget).",
+        default = 4096,
+        min = 0
+    )
+    # all scenes
+    bpy.types.Scene.export_to_0ad_in_all_scenes = BoolProperty(
+        name = "Export all scenes?",
+        description = "Whether to export all scenes of the .blend (but those excluded) in one run, each"
+                " according to its own settings. Textures, meshes and group instances shared by scenes are processed once.",
+        default = False
+    )
+    bpy.types.Scene.export_to_0ad_in_is_included_in_all_scenes = BoolProperty(
+        name = "Include in all scenes export?",
+        description = "Whether this scene is exported when exporting all scenes.",
         default = True
     )
     # output base path
@@ -1464,9 +3776,6 @@ def register():
         description = "Target path to Animation COLLADA files.",
         default = "art/animation/"
     )
-    # animation folder
-    #TODO Export the same as the mesh.dae to the animation folder, make sure animations get exported properly.
-    
     #pass
 
 
@@ -1478,7 +3787,34 @@ def unregister():
     #please tidy up
     del bpy.types.Scene.export_to_0ad_in_mode
     del bpy.types.Scene.export_to_0ad_in_include_hidden
+    del bpy.types.Scene.export_to_0ad_in_attach_unparented_props
+    del bpy.types.Scene.export_to_0ad_in_attach_tolerance
     del bpy.types.Scene.export_to_0ad_in_overwrite_existing
+    del bpy.types.Scene.export_to_0ad_in_resume
+    del bpy.types.Scene.export_to_0ad_in_texture_atlas
+    del bpy.types.Scene.export_to_0ad_in_texture_atlas_max_size
+    del bpy.types.Scene.export_to_0ad_in_quality_tiers
+    del bpy.types.Scene.export_to_0ad_in_bake_ao
+    del bpy.types.Scene.export_to_0ad_in_ao_size
+    del bpy.types.Scene.export_to_0ad_in_ao_samples
+    del bpy.types.Scene.export_to_0ad_in_ao_distance
+    del bpy.types.Scene.export_to_0ad_in_normalize_textures
+    del bpy.types.Scene.export_to_0ad_in_texture_max_size
+    del bpy.types.Scene.export_to_0ad_in_texture_mipmaps
+    del bpy.types.Scene.export_to_0ad_in_output
+    del bpy.types.Scene.export_to_0ad_in_mesh_format
+    del bpy.types.Scene.export_to_0ad_in_optimize_meshes
+    del bpy.types.Scene.export_to_0ad_in_export_animations
+    del bpy.types.Scene.export_to_0ad_in_cache_curves_on_disk
+    del bpy.types.Scene.export_to_0ad_in_profile_memory
+    del bpy.types.Scene.export_to_0ad_in_write_bom
+    del bpy.types.Scene.export_to_0ad_in_digit_count
+    del bpy.types.Scene.export_to_0ad_in_report_budgets
+    del bpy.types.Scene.export_to_0ad_in_budget_triangles
+    del bpy.types.Scene.export_to_0ad_in_budget_vertices
+    del bpy.types.Scene.export_to_0ad_in_budget_texture_memory
+    del bpy.types.Scene.export_to_0ad_in_all_scenes
+    del bpy.types.Scene.export_to_0ad_in_is_included_in_all_scenes
     del bpy.types.Scene.export_to_0ad_in_target_path_base
     del bpy.types.Scene.export_to_0ad_in_target_path_mod
     del bpy.types.Scene.export_to_0ad_in_target_texture_folder
@@ -1491,46 +3827,1637 @@ def unregister():
 
 
 
+#
+# A name split according to the name grammar, e.g. 'units##athen__shield material:Bronze.001':
+#   subfolders: ('units',)  file_name: 'athen__shield material:Bronze.001'  prefix: 'units##athen'
+#   base_name: 'units##athen__shield material:Bronze'  entry: 'units##athen__shield '  material: 'Bronze'  suffix: 1
+#
+class ParsedName():
+
+    __slots__ = ('name', 'subfolders', 'file_name', 'prefix', 'base_name', 'entry', 'material', 'suffix')
+
+    def __init__(self, name):
+        self.name = name
+        parts = name.split(name_subfolder_separator)
+        self.subfolders = tuple(parts[:-1])
+        self.file_name = parts[-1]
+        self.prefix = name.partition(name_prefix_separator)[0]
+        
+        self.base_name = name
+        self.suffix = None
+        match = name_numeric_suffix_pattern.match(name)
+        if (match):
+            self.base_name = match.group(1)
+            self.suffix = int(match.group(2))
+        
+        self.entry = self.base_name
+        self.material = None
+        match = name_material_tag_pattern.search(self.base_name)
+        if (match):
+            self.entry = self.base_name[:match.start()]
+            self.material = self.base_name[match.end():]
+
+
+
+#
+# An atlas image of packed skins with the UV region (u offset, v offset, u scale, v scale) per packed image.
+#
+class TextureAtlas():
+
+    __slots__ = ('filelink', 'width', 'height', 'regions')
+
+    def __init__(self, filelink, width, height):
+        self.filelink = filelink
+        self.width = width
+        self.height = height
+        self.regions = {}
+
+
+
+#
+# A static model in the engine's coordinate system, see read_collada_model().
+#
+class ColladaModel():
+
+    __slots__ = ('positions', 'normals', 'texcoords', 'faces', 'prop_points')
+
+    def __init__(self):
+        self.positions = numpy.zeros((0, 3))
+        self.normals = numpy.zeros((0, 3))
+        self.texcoords = [] # <-- one (count, 2) array per UV set
+        self.faces = numpy.zeros((0, 3), dtype=numpy.int64)
+        self.prop_points = [] # <-- (name, translation, quaternion (x, y, z, w))
+
+
+
+#
+# Parsed COLLADA mesh data, see read_collada_sources() and read_collada_primitives().
+#
+class ColladaSource():
+
+    __slots__ = ('source_element', 'float_array_element', 'accessor_element', 'values')
+
+    def __init__(self, source_element, float_array_element, accessor_element, values):
+        self.source_element = source_element
+        self.float_array_element = float_array_element
+        self.accessor_element = accessor_element
+        self.values = values # <-- (count, stride)
+
+
+
+class ColladaInput():
+
+    __slots__ = ('semantic', 'source_id', 'offset', 'set')
+
+    def __init__(self, semantic, source_id, offset, set):
+        self.semantic = semantic
+        self.source_id = source_id
+        self.offset = offset
+        self.set = set
+
+
+
+class ColladaPrimitive():
+
+    __slots__ = ('element', 'inputs', 'corners', 'triangles', 'vertex_offset')
+
+    def __init__(self, element, inputs, corners, triangles):
+        self.element = element
+        self.inputs = inputs
+        self.corners = corners # <-- (count, input offset count): the indices into the sources per corner
+        self.triangles = triangles # <-- (count, 3): the corners of each triangle
+        self.vertex_offset = None # <-- of the VERTEX input (the positions), if any
+
+
+
+#
+# Vertex and triangle counts of a mesh before and after the optimization.
+#
+class MeshOptimizationStatistics():
+
+    __slots__ = ('name', 'vertices_before', 'vertices_after', 'triangles_before', 'triangles_after')
+
+    def __init__(self, name):
+        self.name = name
+        self.vertices_before = 0
+        self.vertices_after = 0
+        self.triangles_before = 0
+        self.triangles_after = 0
+
+    def __str__(self):
+        return (str(self.name) + ': vertices ' + str(self.vertices_before) + ' -> ' + str(self.vertices_after)
+                + ', triangles ' + str(self.triangles_before) + ' -> ' + str(self.triangles_after))
+
+
+
+#
+# The context of the export of a scene other than the active one: The scene and its
+# selection are the given scene's, everything else (preferences, window manager, ...)
+# is taken from the context.
+#
+class SceneContext():
+
+    def __init__(self, context, scene):
+        self.context = context
+        self.scene = scene
+
+    @property
+    def selected_objects(self):
+        return [o for o in self.scene.objects if o.select]
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+
+
+#
+# Blender's context as of each access (e.g. in the modal operator's timer events), the exported scene stays fixed.
+#
+class CurrentContext():
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def __getattr__(self, name):
+        return getattr(bpy.context, name)
+
+
+
+#
+# The cost of an actor in game: the triangles, vertices and texture memory of its variants,
+# the props' actors included. As variants are alternatives, the actor's total of each measure
+# is the one of its most expensive variant. Textures are counted once per actor (and its props).
+#
+class ActorCost():
+
+    __slots__ = ('filelink', 'variants', 'textures', 'totals', 'budgets', 'violations')
+
+    def __init__(self, filelink):
+        self.filelink = filelink
+        self.variants = []
+        self.textures = set() # <-- of all variants, to be counted once by the actors propping this one
+        self.totals = None
+        self.budgets = None
+        self.violations = []
+
+    # Sums up the variants and checks the totals against the budgets (0 = no budget).
+    def complete(self, mesh_costs, texture_memory, budgets):
+        self.totals = dict([(measure, 0) for measure in cost_measures])
+        for variant_cost in self.variants:
+            variant_cost.complete(mesh_costs, texture_memory)
+            self.textures |= variant_cost.total_textures
+            for measure in cost_measures:
+                self.totals[measure] = max(self.totals[measure], variant_cost.totals[measure])
+        self.budgets = budgets
+        self.violations = []
+        for measure in cost_measures:
+            if (budgets[measure] > 0 and self.totals[measure] > budgets[measure]):
+                self.violations.append(measure + ' ' + str(self.totals[measure]) + ' > ' + str(budgets[measure]))
+
+    def toDict(self):
+        return {
+            'actor': self.filelink,
+            'totals': self.totals,
+            'budgets': self.budgets,
+            'violations': self.violations,
+            'variants': [variant_cost.toDict() for variant_cost in self.variants]
+        }
+
+
+
+class VariantCost():
+
+    __slots__ = ('name', 'mesh_filelink', 'is_mesh_cost_known', 'textures', 'props', 'total_textures', 'own', 'totals')
+
+    def __init__(self, name):
+        self.name = name
+        self.mesh_filelink = None
+        self.is_mesh_cost_known = False # <-- unknown e.g. for meshes skipped when resuming
+        self.textures = set()
+        self.props = [] # <-- the ActorCost of each prop
+        self.total_textures = None
+        self.own = None
+        self.totals = None
+
+    def complete(self, mesh_costs, texture_memory):
+        mesh_cost = mesh_costs.get(self.mesh_filelink)
+        self.is_mesh_cost_known = not mesh_cost is None
+        if (mesh_cost is None):
+            mesh_cost = (0, 0)
+        self.total_textures = set(self.textures)
+        for prop_cost in self.props:
+            self.total_textures |= prop_cost.textures
+        self.own = {
+            'triangles': mesh_cost[0],
+            'vertices': mesh_cost[1],
+            'texture_memory': sum([texture_memory.get(filelink, 0) for filelink in self.textures])
+        }
+        self.totals = {
+            'triangles': mesh_cost[0] + sum([prop_cost.totals['triangles'] for prop_cost in self.props]),
+            'vertices': mesh_cost[1] + sum([prop_cost.totals['vertices'] for prop_cost in self.props]),
+            'texture_memory': sum([texture_memory.get(filelink, 0) for filelink in self.total_textures])
+        }
+
+    def toDict(self):
+        return {
+            'name': self.name,
+            'mesh': self.mesh_filelink,
+            'mesh_cost_known': self.is_mesh_cost_known,
+            'textures': sorted(self.textures),
+            'props': [prop_cost.filelink for prop_cost in self.props],
+            'own': self.own,
+            'totals': self.totals
+        }
+
+
+
+#
+# All state of one export run: created per run and passed through the pipeline, thus
+# back-to-back (or concurrent) runs share no state. A run may export several scenes,
+# those share the caches, which live as long as the run.
+#
+class ExportContext():
+
+    def __init__(self):
+        self.progress = ExportProgress()
+        self.scene_snapshot = None
+        self.journal = None
+        self.sandbox = None
+        self.memory_profiler = None
+        self.curve_mesh_cache = None
+        self.animation_cache = None
+        self.mod_tree_index = None
+        self.all_exported_actors = []
+        self.create_actor_recursion_depth = 0
+        self.object_reference_count = {}
+        self.bom_entry_count_map = {}
+        # to fill up the labels of the bill of materials with whitespace:
+        self.object_longest_label_len = 0
+        self.material_longest_label_len = 0
+        # Shared by all scenes of the run, the journals and indices by target mod path, the caches by directory:
+        self.journals = {}
+        self.mod_tree_indices = {}
+        self.curve_mesh_caches = {}
+        self.animation_caches = {}
+        self.ambient_occlusion_cache = None
+        self.ambient_occlusion_caches = {} # <-- by directory
+        self.quality_tier_generator = None
+        self.quality_tier_generators = {} # <-- by (directory, percentages)
+        self.texture_filelinks = {} # <-- (image name, texture folder) -> the texture file saved or reused for it
+        self.exported_meshes = {} # <-- mesh filelink -> what it was exported from (object, prop points, settings)
+        self.prop_attachments = {} # <-- of the scene: EMPTY object name -> unparented prop object names
+        self.mesh_measures_cache = MeshMeasuresCache()
+        self.mesh_costs = {} # <-- mesh filelink -> (triangles, vertices)
+        self.texture_memory = {} # <-- texture filelink -> estimated GPU memory
+        self.actor_costs = {} # <-- actor filelink -> ActorCost
+        self.budget_violations = [] # <-- of all target mods, see write_budget_reports()
+        self.texture_normalizer = None
+        self.texture_normalizers = {}
+        self.archive = None
+        self.archives = {} # <-- by target mod path
+
+    #
+    # Sets up the export of the scene of the given context: The journal, index and caches
+    # of its target mod are created once per run and shared by all scenes exporting to that mod.
+    #
+    def enter_scene(self, context):
+        mod_path = get_target_mod_path(context)
+        if (self.memory_profiler is None and context.scene.export_to_0ad_in_profile_memory):
+            self.memory_profiler = MemoryProfiler(mod_path)
+        if (not mod_path in self.journals):
+            self.journals[mod_path] = ExportJournal(mod_path, context.scene.export_to_0ad_in_resume)
+            if (context.scene.export_to_0ad_in_output == 'ARCHIVE'):
+                self.archives[mod_path] = ModArchive(get_target_archive_filelink(context), mod_path, get_target_folders(context))
+            elif (not sqlite3 is None):
+                self.mod_tree_indices[mod_path] = ModTreeIndex(mod_path, get_target_folders(context))
+        self.journal = self.journals[mod_path]
+        self.mod_tree_index = self.mod_tree_indices.get(mod_path)
+        self.archive = self.archives.get(mod_path)
+        
+        curve_mesh_cache_directory = None
+        if (context.scene.export_to_0ad_in_cache_curves_on_disk):
+            curve_mesh_cache_directory = os.path.join(mod_path, cache_folder, 'curves')
+        if (not curve_mesh_cache_directory in self.curve_mesh_caches):
+            self.curve_mesh_caches[curve_mesh_cache_directory] = CurveMeshCache(curve_mesh_cache_directory)
+        self.curve_mesh_cache = self.curve_mesh_caches[curve_mesh_cache_directory]
+        animation_cache_directory = os.path.join(mod_path, cache_folder, 'animations')
+        if (not animation_cache_directory in self.animation_caches):
+            self.animation_caches[animation_cache_directory] = AnimationCache(animation_cache_directory)
+        self.animation_cache = self.animation_caches[animation_cache_directory]
+        ambient_occlusion_cache_directory = os.path.join(mod_path, cache_folder, 'ao')
+        if (not ambient_occlusion_cache_directory in self.ambient_occlusion_caches):
+            self.ambient_occlusion_caches[ambient_occlusion_cache_directory] = AmbientOcclusionCache(ambient_occlusion_cache_directory)
+        self.ambient_occlusion_cache = self.ambient_occlusion_caches[ambient_occlusion_cache_directory]
+        self.texture_normalizer = None
+        if (context.scene.export_to_0ad_in_normalize_textures and not numpy is None):
+            texture_cache_directory = os.path.join(mod_path, cache_folder, 'textures')
+            key = (texture_cache_directory, context.scene.export_to_0ad_in_texture_max_size, context.scene.export_to_0ad_in_texture_mipmaps)
+            if (not key in self.texture_normalizers):
+                self.texture_normalizers[key] = TextureNormalizer(*key)
+            self.texture_normalizer = self.texture_normalizers[key]
+        
+        self.quality_tier_generator = None
+        quality_tiers = parse_quality_tiers(context.scene.export_to_0ad_in_quality_tiers)
+        if (len(quality_tiers) > 0 and not numpy is None):
+            key = (os.path.join(mod_path, cache_folder, 'tiers'), tuple(quality_tiers))
+            if (not key in self.quality_tier_generators):
+                self.quality_tier_generators[key] = QualityTierGenerator(*key)
+            self.quality_tier_generator = self.quality_tier_generators[key]
+        
+        # Extract the scene state relevant for the planning only once per scene:
+        self.scene_snapshot = SceneSnapshot(context.scene)
+        self.prop_attachments = {}
+        self.create_actor_recursion_depth = 0
+        self.object_reference_count = {}
+        self.bom_entry_count_map = {}
+        self.object_longest_label_len = 0
+        self.material_longest_label_len = 0
+
+    # The sandbox is created once per run, the meshes are evaluated in the scene being exported.
+    def prepare_sandbox(self, context):
+        if (self.sandbox is None):
+            self.sandbox = ExportSandbox(context)
+        self.sandbox.source_scene = context.scene
+        self.sandbox.curve_mesh_cache = self.curve_mesh_cache
+        self.sandbox.scene_snapshot = self.scene_snapshot
+
+    # Prints the statistics of the run, purges the sandbox and closes the indices.
+    def finish(self):
+        self.profile_memory('exported')
+        print('Curves converted: ', sum([c.conversion_count for c in self.curve_mesh_caches.values()]),
+                ' reused from the cache: ', sum([c.hit_count for c in self.curve_mesh_caches.values()]))
+        print('Actions baked: ', sum([c.bake_count for c in self.animation_caches.values()]),
+                ' reused from the cache: ', sum([c.hit_count for c in self.animation_caches.values()]))
+        print('Ambient occlusion maps baked: ', sum([c.bake_count for c in self.ambient_occlusion_caches.values()]),
+                ' reused from the cache: ', sum([c.hit_count for c in self.ambient_occlusion_caches.values()]))
+        print('Textures normalized: ', sum([n.normalization_count for n in self.texture_normalizers.values()]),
+                ' reused from the cache: ', sum([n.hit_count for n in self.texture_normalizers.values()]))
+        for texture_normalizer in self.texture_normalizers.values():
+            texture_normalizer.shutdown()
+        print('Quality tiers decimated: ', sum([g.generation_count for g in self.quality_tier_generators.values()]),
+                ' reused from the cache: ', sum([g.hit_count for g in self.quality_tier_generators.values()]))
+        for quality_tier_generator in self.quality_tier_generators.values():
+            quality_tier_generator.shutdown()
+        print('Files written: ', self.progress.writes_count, ' left untouched as identical: ', self.progress.writes_avoided_count)
+        if (not self.sandbox is None):
+            print('Group instances joined: ', self.sandbox.join_count, ' reused: ', self.sandbox.join_hit_count)
+            self.progress.leaked_datablocks = self.sandbox.purge()
+        print('Shared by scenes: meshes: ', self.progress.meshes_shared_count, ' textures: ', self.progress.textures_shared_count)
+        self.profile_memory('purged')
+        if (not self.memory_profiler is None):
+            self.memory_profiler.finish()
+        for mod_tree_index in self.mod_tree_indices.values():
+            mod_tree_index.close()
+        for archive in self.archives.values():
+            archive.close()
+
+    def profile_memory(self, phase, actor_name = None):
+        if (not self.memory_profiler is None):
+            self.memory_profiler.take_snapshot(phase, actor_name)
+
+    # Whether the file exists: Looked up in the mod tree index if available, else probed.
+    def is_existing_file(self, filelink):
+        archive = get_archive(self, filelink)
+        if (not archive is None):
+            return archive.has(filelink)
+        if (self.mod_tree_index is None):
+            return os.path.isfile(filelink)
+        return self.mod_tree_index.is_file(filelink)
+
+    # @return the filelink of a file of this kind in the mod with the same content as the given file or None.
+    def find_existing_copy(self, kind, filelink):
+        if (self.mod_tree_index is None or not os.path.isfile(filelink)):
+            return None
+        return self.mod_tree_index.find_file_with_content(kind, filelink)
+
+    # Records a file written by the export in the journal and the mod tree index.
+    def record_written_file(self, kind, filelink):
+        archive = get_archive(self, filelink)
+        if (not archive is None):
+            self.journal.record_completed(kind, filelink, archive.get_sha1(filelink))
+            return
+        self.journal.record_completed(kind, filelink)
+        if (not self.mod_tree_index is None):
+            self.mod_tree_index.update_file(filelink)
+
+
+
+#
+# Progress of the running export: actors done out of total, current phase and ETA.
+#
+class ExportProgress():
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phase = None
+        self.actors_total = 0
+        self.actors_done = 0
+        self.actors_exported = 0 # <-- including props, i.e. the nested actors.
+        self.leaked_datablocks = None
+        self.writes_count = 0
+        self.writes_avoided_count = 0 # <-- files left untouched as their content was identical
+        self.scene_name = None # <-- set if several scenes are exported
+        self.meshes_shared_count = 0 # <-- exported already for another scene of the run
+        self.textures_shared_count = 0
+
+    def enter_phase(self, phase):
+        self.phase = phase
+        if debug:
+            print('Phase: ', phase)
+
+    def percentage(self):
+        if (self.actors_total == 0):
+            return 0
+        return 100 * self.actors_done / self.actors_total
+
+    # @return estimated remaining seconds or None if nothing is done yet.
+    def eta(self):
+        if (self.actors_done == 0):
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed / self.actors_done * (self.actors_total - self.actors_done)
+
+    def leaked_datablocks_count(self):
+        if (self.leaked_datablocks is None):
+            return 0
+        return sum([count for count in self.leaked_datablocks.values() if count > 0])
+
+    def toText(self):
+        text = 'Exporting to 0AD: ' + str(self.actors_done) + '/' + str(self.actors_total) + ' actors'
+        text = text + ' (' + str(self.actors_exported) + ' incl. props)'
+        if (not self.scene_name is None):
+            text = text + ' | scene ' + self.scene_name
+        if (not self.phase is None):
+            text = text + ' | ' + self.phase
+        eta = self.eta()
+        if (not eta is None):
+            text = text + ' | ETA: ' + str(int(eta)) + 's'
+        return text + ' | Esc to cancel'
+
+
+
+#
+# Isolated scratch scene for all temporary objects and datablocks of an export
+# (duplicates, joined and converted meshes). Operators only
+# run on it via context overrides, thus the user's scene, selection and 3D cursor
+# stay untouched. Global undo is suspended while it exists.
+# purge() removes everything including orphaned meshes and curves created meanwhile
+# and reports how many datablocks were leaked nonetheless.
+# The sandbox lasts for the whole run (all scenes), thus the joined meshes of group
+# instances are kept (as orphans until the purge) and joined once per group.
+#
+class ExportSandbox():
+
+    datablock_collections = ['objects', 'meshes', 'curves', 'scenes']
+
+    def __init__(self, context, curve_mesh_cache = None, scene_snapshot = None):
+        self.source_scene = context.scene
+        self.curve_mesh_cache = curve_mesh_cache
+        self.scene_snapshot = scene_snapshot # <-- its records of the converted objects are invalidated
+        self.edit_preferences = context.user_preferences.edit
+        self.was_global_undo = self.edit_preferences.use_global_undo
+        self.edit_preferences.use_global_undo = False
+        self.datablocks_before = {}
+        for collection_name in ExportSandbox.datablock_collections:
+            self.datablocks_before[collection_name] = set(getattr(bpy.data, collection_name))
+        self.scene = bpy.data.scenes.new(scratch_scene_name)
+        self.objects = []
+        self.bases = {}
+        self.armature_objects = [] # <-- deforming the skinned mesh objects
+        self.joined_meshes = {}
+        self.join_count = 0
+        self.join_hit_count = 0
+        self.world = None # <-- with the ambient occlusion settings, created on first bake
+
+    def link(self, o):
+        self.bases[o] = self.scene.objects.link(o)
+        self.objects.append(o)
+        # A record cached under this name (e.g. of a removed duplicate, still a curve) is stale now:
+        if (not self.scene_snapshot is None):
+            self.scene_snapshot.forget(o)
+        return o
+
+    # @param armature if given, the mesh object is skinned: evaluated in rest pose and deformed by a copy of the armature.
+    # @return a new mesh object with the evaluated (modifiers applied, curves converted) mesh of the given object.
+    def make_mesh_object(self, o, armature = None):
+        if (o.type == 'CURVE' and not self.curve_mesh_cache is None):
+            # The copy may be joined or altered, the cached mesh must not:
+            mesh = self.curve_mesh_cache.get_mesh(o, self.source_scene).copy()
+        elif (armature is None or o.type != 'MESH'):
+            mesh = o.to_mesh(self.source_scene, True, 'PREVIEW')
+        else:
+            pose_position = armature.data.pose_position
+            armature.data.pose_position = 'REST'
+            self.source_scene.update()
+            mesh = o.to_mesh(self.source_scene, True, 'PREVIEW')
+            armature.data.pose_position = pose_position
+            self.source_scene.update()
+        mesh_object = bpy.data.objects.new(o.name, mesh)
+        mesh_object.matrix_world = o.matrix_world.copy()
+        self.link(mesh_object)
+        if (not armature is None and o.type == 'MESH'):
+            # The weights are kept in the mesh, the vertex groups (same order, thus same indices) map them to the bones:
+            for vertex_group in o.vertex_groups:
+                mesh_object.vertex_groups.new(vertex_group.name)
+            armature_object = self.link(bpy.data.objects.new(armature.name, armature.data))
+            armature_object.matrix_world = armature.matrix_world.copy()
+            self.armature_objects.append(armature_object)
+            modifier = mesh_object.modifiers.new('Armature', 'ARMATURE')
+            modifier.object = armature_object
+        return mesh_object
+
+    def override(self, active_object, selected_objects):
+        return {
+            'scene': self.scene,
+            'active_object': active_object,
+            'object': active_object,
+            'selected_objects': selected_objects,
+            'selected_editable_objects': selected_objects,
+            'selected_editable_bases': [self.bases[o] for o in selected_objects]
+        }
+
+    # Joins the mesh objects into the first one.
+    # @return the joined object.
+    def join(self, mesh_objects):
+        joined = mesh_objects[0]
+        if (len(mesh_objects) > 1):
+            bpy.ops.object.join(self.override(joined, mesh_objects))
+        self.scene.update()
+        return joined
+
+    # @return a new mesh object with the evaluated meshes of the given objects (e.g. of a group) joined.
+    def make_joined_mesh_object(self, objects):
+        key = tuple([o.name for o in objects])
+        cached = self.joined_meshes.get(key)
+        if (not cached is None):
+            self.join_hit_count += 1
+            mesh, matrix_world = cached
+            # The copy may be altered and is removed with the object, the cached mesh must not:
+            joined = bpy.data.objects.new(objects[0].name, mesh.copy())
+            joined.matrix_world = matrix_world.copy()
+            return self.link(joined)
+        joined = self.join([self.make_mesh_object(o) for o in objects])
+        self.joined_meshes[key] = (joined.data.copy(), joined.matrix_world.copy())
+        self.join_count += 1
+        return joined
+
+    def select_only(self, objects_to_select):
+        for o, base in self.bases.items():
+            is_selected = o in objects_to_select
+            base.select = is_selected
+            o.select = is_selected
+
+    # The duplicates have their modifiers applied already. Skinned ones keep their armature modifier,
+    # thus are exported with the armatures' joints and a skin controller (instead of the deformation applied).
+    def collada_export(self, filelink, objects_to_export):
+        self.select_only(objects_to_export + self.armature_objects)
+        self.scene.update()
+        if (len(self.armature_objects) > 0):
+            self.scene.collada_export(filelink, apply_modifiers=False, selected=True, include_children=True,
+                    include_armatures=True, deform_bones_only=True)
+        else:
+            self.scene.collada_export(filelink, apply_modifiers=True, selected=True, include_children=True)
+
+    #
+    # Bakes the ambient occlusion of the objects (with all other objects in the sandbox as occluders)
+    # for their 2nd UV map into a new image (Blender Internal's bake) and saves it as PNG.
+    #
+    def bake_ambient_occlusion(self, objects, size, samples, distance, filelink):
+        image = bpy.data.images.new(os.path.basename(filelink), size, size, alpha=False)
+        for o in objects:
+            uv_textures = o.data.uv_textures
+            uv_textures.active_index = 1
+            for mesh_texture_poly in uv_textures[1].data:
+                mesh_texture_poly.image = image
+        if (self.world is None):
+            self.world = bpy.data.worlds.new(scratch_scene_name)
+        light_settings = self.world.light_settings
+        light_settings.gather_method = 'RAYTRACE'
+        light_settings.samples = samples
+        light_settings.distance = distance
+        self.scene.world = self.world
+        render = self.scene.render
+        render.bake_type = 'AO'
+        render.use_bake_normalize = True
+        render.use_bake_selected_to_active = False
+        render.use_bake_clear = True
+        render.bake_margin = ambient_occlusion_bake_margin
+        self.select_only(objects)
+        self.scene.update()
+        bpy.ops.object.bake_image(self.override(objects[0], objects))
+        image.filepath_raw = filelink
+        image.file_format = 'PNG'
+        image.save()
+        bpy.data.images.remove(image)
+
+    # Removes all objects created so far and their no longer used meshes.
+    def clear(self):
+        meshes = []
+        for o in self.objects:
+            try:
+                if (o.type == 'MESH'):
+                    meshes.append(o.data)
+                self.scene.objects.unlink(o)
+                bpy.data.objects.remove(o)
+            except (ReferenceError, RuntimeError):
+                # Already removed, e.g. consumed by joining.
+                pass
+        for mesh in meshes:
+            try:
+                if (mesh.users == 0):
+                    bpy.data.meshes.remove(mesh)
+            except ReferenceError:
+                pass
+        self.objects = []
+        self.bases = {}
+        self.armature_objects = []
+
+    # Removes everything the export created, restores the undo setting.
+    # @return the count of leaked datablocks per collection (e.g. {'meshes': 0, ...}).
+    def purge(self):
+        self.clear()
+        bpy.data.scenes.remove(self.scene)
+        if (not self.world is None):
+            bpy.data.worlds.remove(self.world)
+        # Orphans created meanwhile, e.g. meshes of joined objects or converted curves:
+        for collection_name in ['meshes', 'curves']:
+            collection = getattr(bpy.data, collection_name)
+            for datablock in list(collection):
+                if (datablock.users == 0 and not datablock in self.datablocks_before[collection_name]):
+                    collection.remove(datablock)
+        self.edit_preferences.use_global_undo = self.was_global_undo
+        
+        leaked_datablocks = {}
+        for collection_name in ExportSandbox.datablock_collections:
+            leaked_datablocks[collection_name] = len(getattr(bpy.data, collection_name)) - len(self.datablocks_before[collection_name])
+        print('Export sandbox purged. Leaked datablocks: ', leaked_datablocks)
+        return leaked_datablocks
+
+
+
+#
+# Cache of the meshes converted from curves (bevelled curves may take seconds to tessellate).
+# A converted mesh is keyed by a fingerprint of the curve data, its resolution and bevel
+# settings and the modifier stack, thus unchanged curves are converted once per run.
+# Optionally the converted meshes are stored on disk and reused by later runs.
+# The cached meshes are orphans, thus the sandbox purges them at the end of the run.
+#
+class CurveMeshCache():
+
+    curve_settings = ['dimensions', 'resolution_u', 'resolution_v', 'render_resolution_u', 'render_resolution_v',
+            'bevel_depth', 'bevel_resolution', 'extrude', 'offset', 'fill_mode', 'twist_mode', 'twist_smooth',
+            'use_fill_deform', 'use_radius', 'use_stretch', 'use_deform_bounds', 'use_uv_as_generated']
+
+    def __init__(self, directory = None):
+        self.directory = directory
+        self.meshes = {}
+        self.conversion_count = 0
+        self.hit_count = 0
+
+    def get_mesh(self, o, scene):
+        fingerprint = self.fingerprint(o)
+        mesh = self.meshes.get(fingerprint)
+        if (not mesh is None):
+            self.hit_count += 1
+            return mesh
+        
+        mesh = self.load(fingerprint)
+        if (mesh is None):
+            mesh = o.to_mesh(scene, True, 'PREVIEW')
+            self.conversion_count += 1
+            self.store(fingerprint, mesh)
+        else:
+            self.hit_count += 1
+        self.meshes[fingerprint] = mesh
+        return mesh
+
+    def fingerprint(self, o):
+        sha1 = hashlib.sha1()
+        self.update_with_curve(sha1, o.data)
+        # The bevel and taper objects' curves shape the result too:
+        for shaping_object in [o.data.bevel_object, o.data.taper_object]:
+            if (not shaping_object is None and shaping_object.type == 'CURVE'):
+                self.update_with_curve(sha1, shaping_object.data)
+        update_hash_with_modifiers(sha1, o.modifiers)
+        return sha1.hexdigest()
+
+    def update_with_curve(self, sha1, curve):
+        sha1.update(curve.name.encode())
+        sha1.update(repr([getattr(curve, setting, None) for setting in CurveMeshCache.curve_settings]).encode())
+        sha1.update(repr([m.name for m in curve.materials if not m is None]).encode())
+        for spline in curve.splines:
+            sha1.update(repr((spline.type, spline.resolution_u, spline.resolution_v, spline.order_u, spline.order_v
+                    , spline.use_cyclic_u, spline.use_smooth, spline.material_index)).encode())
+            # Read the control points in bulk:
+            if (spline.type == 'BEZIER'):
+                points = spline.bezier_points
+                attributes_sizes = [('co', 3), ('handle_left', 3), ('handle_right', 3), ('radius', 1), ('tilt', 1)]
+            else:
+                points = spline.points
+                attributes_sizes = [('co', 4), ('radius', 1), ('tilt', 1)]
+            for attribute, size in attributes_sizes:
+                values = array('f', [0.0]) * (len(points) * size)
+                points.foreach_get(attribute, values)
+                sha1.update(values.tobytes())
+
+    def get_filelink(self, fingerprint):
+        return os.path.join(self.directory, fingerprint + '.pickle')
+
+    def store(self, fingerprint, mesh):
+        if (self.directory is None):
+            return
+        polygons = mesh.polygons
+        loops = mesh.loops
+        data = {
+            'co': array('f', [0.0]) * (len(mesh.vertices) * 3),
+            'vertex_index': array('i', [0]) * len(loops),
+            'loop_start': array('i', [0]) * len(polygons),
+            'loop_total': array('i', [0]) * len(polygons),
+            'material_index': array('i', [0]) * len(polygons),
+            'use_smooth': array('i', [0]) * len(polygons),
+            'uv_layers': [],
+            'materials': [(m.name if not m is None else None) for m in mesh.materials]
+        }
+        mesh.vertices.foreach_get('co', data['co'])
+        loops.foreach_get('vertex_index', data['vertex_index'])
+        for attribute in ['loop_start', 'loop_total', 'material_index', 'use_smooth']:
+            polygons.foreach_get(attribute, data[attribute])
+        for uv_layer in mesh.uv_layers:
+            uvs = array('f', [0.0]) * (len(loops) * 2)
+            uv_layer.data.foreach_get('uv', uvs)
+            data['uv_layers'].append((uv_layer.name, uvs))
+        if (not os.path.isdir(self.directory)):
+            os.makedirs(self.directory)
+        with open(self.get_filelink(fingerprint), 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, fingerprint):
+        if (self.directory is None or not os.path.isfile(self.get_filelink(fingerprint))):
+            return None
+        with open(self.get_filelink(fingerprint), 'rb') as f:
+            data = pickle.load(f)
+        mesh = bpy.data.meshes.new('curve_' + fingerprint[:8])
+        mesh.vertices.add(len(data['co']) // 3)
+        mesh.vertices.foreach_set('co', data['co'])
+        mesh.loops.add(len(data['vertex_index']))
+        mesh.loops.foreach_set('vertex_index', data['vertex_index'])
+        mesh.polygons.add(len(data['loop_start']))
+        for attribute in ['loop_start', 'loop_total', 'material_index', 'use_smooth']:
+            mesh.polygons.foreach_set(attribute, data[attribute])
+        for uv_layer_name, uvs in data['uv_layers']:
+            mesh.uv_textures.new(uv_layer_name)
+            mesh.uv_layers[uv_layer_name].data.foreach_set('uv', uvs)
+        for material_name in data['materials']:
+            mesh.materials.append(bpy.data.materials.get(material_name) if not material_name is None else None)
+        mesh.update(calc_edges=True)
+        if debug:
+            print('Loaded converted curve mesh from the cache: ', self.get_filelink(fingerprint))
+        return mesh
+
+
+
+#
+# Cache of the local volume and triangle cross products of the evaluated meshes, keyed by
+# the mesh (or curve) datablock and a fingerprint of the modifier stack: Objects sharing
+# a mesh are evaluated once per run, their transforms are applied when measuring.
+#
+class MeshMeasuresCache():
+
+    def __init__(self):
+        self.measures = {}
+        self.evaluation_count = 0
+        self.hit_count = 0
+
+    def get_measures(self, o, scene):
+        sha1 = hashlib.sha1()
+        sha1.update(repr((o.type, o.data.name)).encode())
+        update_hash_with_modifiers(sha1, o.modifiers)
+        fingerprint = sha1.hexdigest()
+        measures = self.measures.get(fingerprint)
+        if (not measures is None):
+            self.hit_count += 1
+            return measures
+        mesh = o.to_mesh(scene, True, 'PREVIEW')
+        try:
+            measures = measure_triangles(*read_mesh_triangles(mesh))
+        finally:
+            bpy.data.meshes.remove(mesh)
+        self.evaluation_count += 1
+        self.measures[fingerprint] = measures
+        return measures
+
+
+
+#
+# Optional texture post-processing: The skins are resized to the nearest power of two
+# (at most the configured size) and optionally get their mip chain pre-generated (DDS).
+# The pixels are read in the main thread, resized and encoded in a pool of worker threads.
+# The results are kept in the cache folder by the hash of the source image (its file or
+# its pixels) and the settings, thus unchanged images are copied, not processed again.
+#
+class TextureNormalizer():
+
+    def __init__(self, directory, max_size, with_mipmaps):
+        self.directory = directory
+        self.max_size = max_size
+        self.with_mipmaps = with_mipmaps
+        self.settings = (max_size, with_mipmaps, texture_normalization_version)
+        self.executor = None
+        self.pending = [] # <-- (future or None if cached, filelink, cached filelink)
+        self.normalization_count = 0
+        self.hit_count = 0
+
+    def get_size(self, width, height):
+        return (nearest_power_of_two(width, self.max_size), nearest_power_of_two(height, self.max_size))
+
+    def get_file_ending(self):
+        return '.dds' if self.with_mipmaps else '.png'
+
+    #
+    # Schedules the normalization of the image.
+    # @return the filelink the normalized texture will be written to (the file ending may differ).
+    #
+    def normalize(self, image, filelink):
+        filelink = os.path.splitext(filelink)[0] + self.get_file_ending()
+        pixels = None
+        sha1 = hashlib.sha1()
+        sha1.update(repr((self.settings, tuple(image.size))).encode())
+        source_filelink = bpy.path.abspath(image.filepath)
+        if (image.source == 'FILE' and image.packed_file is None and not image.is_dirty and os.path.isfile(source_filelink)):
+            sha1.update(hash_file(source_filelink).encode())
+        else:
+            pixels = read_image_pixels(image)
+            sha1.update(array_to_bytes(pixels))
+        cached_filelink = os.path.join(self.directory, sha1.hexdigest() + self.get_file_ending())
+        if (os.path.isfile(cached_filelink)):
+            self.hit_count += 1
+            self.pending.append((None, filelink, cached_filelink))
+            return filelink
+        
+        if (pixels is None):
+            pixels = read_image_pixels(image)
+        if (self.executor is None):
+            self.executor = concurrent.futures.ThreadPoolExecutor(texture_worker_count)
+        width, height = self.get_size(image.size[0], image.size[1])
+        future = self.executor.submit(normalize_pixels, pixels, width, height, self.with_mipmaps)
+        self.pending.append((future, filelink, cached_filelink))
+        return filelink
+
+    #
+    # Waits for the scheduled normalizations and writes their results (to the cache and the filelinks).
+    #
+    def complete(self, export_context = None):
+        for future, filelink, cached_filelink in self.pending:
+            if (not future is None):
+                write_bytes_if_changed(cached_filelink, future.result())
+                self.normalization_count += 1
+            copy_file_if_changed(cached_filelink, filelink, export_context)
+            if (not export_context is None):
+                export_context.record_written_file('texture', filelink)
+        self.pending = []
+
+    def shutdown(self):
+        if (not self.executor is None):
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+
+#
+# Optional decimated quality tiers of the exported meshes (e.g. 50% and 25% of the triangles)
+# for low-spec mods: Each tier is written next to the mesh. The tiers are decimated from the
+# exported (evaluated) mesh in a pool of worker threads. The results are kept in the cache folder
+# by the fingerprint of the mesh (the COLLADA document without its dates) and the percentage.
+#
+class QualityTierGenerator():
+
+    def __init__(self, directory, percentages):
+        self.directory = directory
+        self.percentages = percentages
+        self.executor = None
+        self.pending = [] # <-- (future or None if cached, filelink, cached filelink)
+        self.generation_count = 0
+        self.hit_count = 0
+
+    #
+    # Schedules the tiers of the exported mesh.
+    # @param staged_filelink the exported COLLADA file (read right away, thus may be removed afterwards)
+    # @return the filelinks the tiers will be written to.
+    #
+    def generate(self, staged_filelink, filelink):
+        with open(staged_filelink, 'rb') as f:
+            return self.generate_from_data(f.read(), filelink)
+
+    # @param data the exported COLLADA document.
+    def generate_from_data(self, data, filelink):
+        sha1 = hashlib.sha1()
+        sha1.update(repr(quality_tier_version).encode())
+        sha1.update(re.sub(b'<(created|modified)>[^<]*</(created|modified)>', b'', data))
+        fingerprint = sha1.hexdigest()
+        tier_filelinks = []
+        for percentage in self.percentages:
+            tier_filelink = get_quality_tier_filelink(filelink, percentage)
+            tier_filelinks.append(tier_filelink)
+            cached_filelink = os.path.join(self.directory, fingerprint + '_' + str(percentage) + '.dae')
+            if (os.path.isfile(get_empty_quality_tier_marker_filelink(cached_filelink))):
+                self.hit_count += 1
+                print('Skipping the quality tier ', tier_filelink, ' as the mesh decimates to no triangles.')
+                continue
+            if (os.path.isfile(cached_filelink)):
+                self.hit_count += 1
+                self.pending.append((None, tier_filelink, cached_filelink))
+                continue
+            if (self.executor is None):
+                self.executor = concurrent.futures.ThreadPoolExecutor(quality_tier_worker_count)
+            self.pending.append((self.executor.submit(decimate_collada, data, percentage), tier_filelink, cached_filelink))
+        return tier_filelinks
+
+    #
+    # Waits for the scheduled tiers and writes them (to the cache and the filelinks).
+    #
+    def complete(self, export_context = None):
+        for future, filelink, cached_filelink in self.pending:
+            if (not future is None):
+                data = future.result()
+                self.generation_count += 1
+                if (data is None):
+                    # Remembered, thus later runs skip it right away:
+                    write_bytes_if_changed(get_empty_quality_tier_marker_filelink(cached_filelink), b'')
+                    print('Skipping the quality tier ', filelink, ' as the mesh decimates to no triangles.')
+                    continue
+                write_bytes_if_changed(cached_filelink, data)
+            copy_file_if_changed(cached_filelink, filelink, export_context)
+            if (not export_context is None):
+                export_context.record_written_file('mesh', filelink)
+        self.pending = []
+
+    def shutdown(self):
+        if (not self.executor is None):
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+
+#
+# Cache of the baked actions, identified by the fingerprint of the action (F-curves and
+# keyframes) and the armature (bones, rest pose, rotation modes, current pose, transform):
+# The animation COLLADA of each fingerprint is kept in the mod's cache folder, thus
+# unchanged actions are not baked again by later exports, only copied to their filelink.
+#
+class AnimationCache():
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.bake_count = 0
+        self.hit_count = 0
+
+    #
+    # Exports the action for the armature to the filelink, baking it only if not cached.
+    # @return True if the animation file was written (False if it already had this content).
+    #
+    def export(self, armature, action, fps, filelink, export_context = None):
+        fingerprint = self.fingerprint(armature, action, fps)
+        cached_filelink = os.path.join(self.directory, fingerprint + '.dae')
+        if (os.path.isfile(cached_filelink)):
+            self.hit_count += 1
+            if debug:
+                print('Reusing the baked action from the cache: ', action.name, ' ', cached_filelink)
+        else:
+            times, bone_matrices = bake_action(armature, action, fps)
+            write_animation_collada(cached_filelink, armature, times, bone_matrices)
+            self.bake_count += 1
+        return copy_file_if_changed(cached_filelink, filelink, export_context)
+
+    def fingerprint(self, armature, action, fps):
+        sha1 = hashlib.sha1()
+        sha1.update(repr((armature.name, action.name, tuple(action.frame_range), fps, tuple(map(tuple, armature.matrix_world)))).encode())
+        for fcurve in action.fcurves:
+            keyframe_points = fcurve.keyframe_points
+            co = array('f', [0.0]) * (len(keyframe_points) * 2)
+            keyframe_points.foreach_get('co', co)
+            sha1.update(repr((fcurve.data_path, fcurve.array_index, fcurve.extrapolation, len(fcurve.modifiers),
+                    [keyframe_point.interpolation for keyframe_point in keyframe_points],
+                    [tuple(keyframe_point.handle_left) + tuple(keyframe_point.handle_right) for keyframe_point in keyframe_points])).encode())
+            sha1.update(co.tobytes())
+        for pose_bone in armature.pose.bones:
+            bone = pose_bone.bone
+            sha1.update(repr((bone.name, bone.parent.name if not bone.parent is None else None,
+                    tuple(map(tuple, bone.matrix_local)), pose_bone.rotation_mode,
+                    tuple(pose_bone.location), tuple(pose_bone.rotation_quaternion), tuple(pose_bone.rotation_euler),
+                    tuple(pose_bone.rotation_axis_angle), tuple(pose_bone.scale))).encode())
+        return sha1.hexdigest()
+
+
+
+#
+# Cache of the baked ambient occlusion maps, identified by the fingerprint of the baked meshes
+# (geometry, 2nd UV map, placement), the surrounding props' geometry and the bake settings:
+# The map of each fingerprint is kept in the mod's cache folder, thus only changed meshes
+# (or meshes with changed props) are baked again by later exports.
+#
+class AmbientOcclusionCache():
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.bake_count = 0
+        self.hit_count = 0
+
+    #
+    # Bakes the map of the objects to the filelink, only if not cached.
+    # @return True if the map file was written (False if it already had this content).
+    #
+    def bake(self, sandbox, objects, occluders, size, samples, distance, filelink, export_context = None):
+        fingerprint = self.fingerprint(objects, occluders, size, samples, distance)
+        cached_filelink = os.path.join(self.directory, fingerprint + '.png')
+        if (os.path.isfile(cached_filelink)):
+            self.hit_count += 1
+            if debug:
+                print('Reusing the baked ambient occlusion from the cache: ', filelink, ' ', cached_filelink)
+        else:
+            if (not os.path.isdir(self.directory)):
+                os.makedirs(self.directory)
+            sandbox.bake_ambient_occlusion(objects, size, samples, distance, cached_filelink)
+            self.bake_count += 1
+        return copy_file_if_changed(cached_filelink, filelink, export_context)
+
+    def fingerprint(self, objects, occluders, size, samples, distance):
+        sha1 = hashlib.sha1()
+        sha1.update(repr((ambient_occlusion_bake_margin, size, samples, distance)).encode())
+        for o in objects:
+            update_hash_with_mesh(sha1, o, 1)
+        for o in occluders:
+            update_hash_with_mesh(sha1, o)
+        return sha1.hexdigest()
+
+
+
+#
+# Hashes the placement, the vertices and faces of the mesh object, optionally the coordinates of a UV map.
+#
+def update_hash_with_mesh(sha1, o, uv_map_index = None):
+    mesh = o.data
+    sha1.update(repr((len(mesh.vertices), len(mesh.loops), len(mesh.polygons), tuple(map(tuple, o.matrix_world)))).encode())
+    coordinates = array('f', [0.0]) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get('co', coordinates)
+    sha1.update(coordinates.tobytes())
+    vertex_indices = array('i', [0]) * len(mesh.loops)
+    mesh.loops.foreach_get('vertex_index', vertex_indices)
+    sha1.update(vertex_indices.tobytes())
+    loop_totals = array('i', [0]) * len(mesh.polygons)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    sha1.update(loop_totals.tobytes())
+    if (not uv_map_index is None):
+        uvs = array('f', [0.0]) * (len(mesh.loops) * 2)
+        mesh.uv_layers[uv_map_index].data.foreach_get('uv', uvs)
+        sha1.update(uvs.tobytes())
+
+
+
+#
+# Opt-in memory profiling of an export run: At each phase boundary the top
+# allocating sites (compared to the previous snapshot) and the counts of
+# objects, meshes and images are recorded. The results are written as JSON
+# into the target mod folder, tagged with add-on and Blender version, such
+# that runs of different versions can be compared.
+#
+class MemoryProfiler():
+
+    datablock_collections = ['objects', 'meshes', 'curves', 'images', 'materials']
+
+    def __init__(self, directory):
+        self.filelink = os.path.join(directory, 'export_to_0ad_memory_profile_' + time.strftime('%Y%m%d-%H%M%S') + '.json')
+        self.records = []
+        self.previous_snapshot = None
+        self.was_tracing = tracemalloc.is_tracing()
+        if (not self.was_tracing):
+            tracemalloc.start(memory_profile_traceback_depth)
+        self.take_snapshot('start')
+
+    def take_snapshot(self, phase, actor_name = None):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        if (self.previous_snapshot is None):
+            statistics = snapshot.statistics('lineno')
+        else:
+            statistics = snapshot.compare_to(self.previous_snapshot, 'lineno')
+        self.previous_snapshot = snapshot
+        
+        top_allocating_sites = []
+        for statistic in statistics[:memory_profile_top_count]:
+            frame = statistic.traceback[0]
+            top_allocating_sites.append({
+                'site': frame.filename + ':' + str(frame.lineno),
+                'size': statistic.size,
+                'size_diff': getattr(statistic, 'size_diff', statistic.size),
+                'count': statistic.count
+            })
+        datablock_counts = {}
+        for collection_name in MemoryProfiler.datablock_collections:
+            datablock_counts[collection_name] = len(getattr(bpy.data, collection_name))
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        
+        self.records.append({
+            'phase': phase,
+            'actor': actor_name,
+            'time': time.time(),
+            'traced_current': traced_current,
+            'traced_peak': traced_peak,
+            'datablocks': datablock_counts,
+            'top_allocating_sites': top_allocating_sites
+        })
+        if debug:
+            print('Memory profile: ', phase, ' ', actor_name, ' traced: ', traced_current, ' datablocks: ', datablock_counts)
+
+    def finish(self):
+        if (not self.was_tracing):
+            tracemalloc.stop()
+        profile = {
+            'addon_version': list(bl_info['version']),
+            'blender_version': bpy.app.version_string,
+            'blend': bpy.data.filepath,
+            'records': self.records
+        }
+        write_text_to_file(self.filelink, json.dumps(profile, indent=1, sort_keys=True))
+        print('Memory profile written to: ', self.filelink)
+
+
+
+#
+# Append-only journal in the target mod folder. Each completed actor, mesh and
+# texture is recorded with its hash as one JSON line, thus it doubles as audit log.
+# All records after the last completed run belong to interrupted runs and
+# are skipped when resuming (as long as the file still has the recorded hash).
+#
+class ExportJournal():
+
+    def __init__(self, directory, resume = False):
+        self.filelink = os.path.join(directory, journal_filename)
+        self.run = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.completed = {}
+        if (resume):
+            self.completed = self.read_completed_of_interrupted_runs()
+            print('Resuming: ', len(self.completed), ' files were completed in the interrupted run(s).')
+        self.append({'event': 'run_begin', 'blend': bpy.data.filepath, 'resume': resume})
+
+    def read_completed_of_interrupted_runs(self):
+        completed = {}
+        if (not os.path.isfile(self.filelink)):
+            return completed
+        with open(self.filelink, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be truncated if the previous run crashed while writing.
+                    continue
+                event = record.get('event')
+                if (event == 'run_end'):
+                    completed = {}
+                elif (event == 'completed'):
+                    completed[(record['kind'], record['path'])] = record['sha1']
+        return completed
+
+    def append(self, record):
+        record['run'] = self.run
+        record['time'] = time.time()
+        directory = os.path.dirname(self.filelink)
+        if (not os.path.isdir(directory)):
+            os.makedirs(directory)
+        with open(self.filelink, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+    # @param sha1 of the content if not to be hashed from the file (e.g. of an archive member).
+    def record_completed(self, kind, filelink, sha1 = None):
+        if (sha1 is None):
+            if (not os.path.isfile(filelink)):
+                print('Journal: Not recording ', kind, ' as the file does not exist: ', filelink)
+                return
+            sha1 = hash_file(filelink)
+        self.append({'event': 'completed', 'kind': kind, 'path': filelink, 'sha1': sha1})
+
+    def is_completed(self, kind, filelink):
+        sha1 = self.completed.get((kind, filelink))
+        return (not sha1 is None) and os.path.isfile(filelink) and hash_file(filelink) == sha1
+
+    def finish(self):
+        self.append({'event': 'run_end'})
+
+
+
+#
+# Zip archive of the mod's art (the actor, mesh, texture and animation folders), written
+# as a stream: Each file goes straight into the archive, PNGs (compressed already) stored,
+# all else deflated. A previous archive is updated: Members with unchanged content are
+# copied over as they are (not compressed again), members not exported by this run are kept.
+# The new archive is staged next to the previous one and replaces it when closed.
+# Note: No ZIP64, i.e. at most 65535 members and 4 GiB.
+#
+class ModArchive():
+
+    def __init__(self, filelink, mod_path, folders):
+        self.filelink = filelink
+        self.mod_path = os.path.normpath(mod_path)
+        self.roots = [os.path.normpath(os.path.join(mod_path, folder)) for folder in folders.values()]
+        self.staging_directory = os.path.join(mod_path, cache_folder, 'staging')
+        self.previous = None
+        self.previous_members = {}
+        if (os.path.isfile(filelink)):
+            self.previous = zipfile.ZipFile(filelink, 'r')
+            for info in self.previous.infolist():
+                self.previous_members[info.filename] = info
+        self.removed_names = set()
+        self.staged_filelink = get_staging_filelink(filelink)
+        directory = os.path.dirname(self.staged_filelink)
+        if (not os.path.isdir(directory)):
+            os.makedirs(directory)
+        self.file = open(self.staged_filelink, 'w+b')
+        self.members = {} # <-- name -> (offset, method, flags, dos time, dos date, crc, compressed size, size, sha1)
+        self.written_count = 0
+        self.reused_count = 0
+
+    def is_member(self, filelink):
+        filelink = os.path.normpath(filelink)
+        for root in self.roots:
+            if (filelink.startswith(root + os.sep)):
+                return True
+        return False
+
+    def get_name(self, filelink):
+        return os.path.relpath(os.path.normpath(filelink), self.mod_path).replace(os.sep, '/')
+
+    # Files the engine or blender have to write to disk first (e.g. the COLLADA export) are staged in the cache folder:
+    def get_staging_filelink(self, filelink):
+        staging_filelink = os.path.join(self.staging_directory, *self.get_name(get_staging_filelink(filelink)).split('/'))
+        directory = os.path.dirname(staging_filelink)
+        if (not os.path.isdir(directory)):
+            os.makedirs(directory)
+        return staging_filelink
+
+    def has(self, filelink):
+        name = self.get_name(filelink)
+        return (name in self.members) or (name in self.previous_members and not name in self.removed_names)
+
+    # @return the content of the member (written by this run or of the previous archive) or None.
+    def read(self, filelink):
+        name = self.get_name(filelink)
+        member = self.members.get(name)
+        if (not member is None):
+            offset, method, flags, dos_time, dos_date, crc, compressed_size, size, sha1 = member
+            self.file.seek(offset + 30 + len(name.encode('utf-8')))
+            data = self.file.read(compressed_size)
+            self.file.seek(0, os.SEEK_END)
+            if (method == zipfile.ZIP_DEFLATED):
+                data = zlib.decompress(data, -15)
+            return data
+        if (name in self.previous_members and not name in self.removed_names):
+            return self.previous.read(name)
+        return None
+
+    def get_sha1(self, filelink):
+        member = self.members.get(self.get_name(filelink))
+        return None if (member is None) else member[8]
+
+    #
+    # Writes the member unless it has this content already (in this run or in the previous archive).
+    # @return True if written, False if the content was unchanged.
+    #
+    def write(self, filelink, data, export_context = None):
+        name = self.get_name(filelink)
+        crc = zlib.crc32(data) & 0xffffffff
+        member = self.members.get(name)
+        if (not member is None and member[5] == crc and member[7] == len(data)):
+            count_write(export_context, False)
+            return False
+        self.removed_names.discard(name)
+        info = self.previous_members.get(name)
+        if (member is None and not info is None and info.CRC == crc and info.file_size == len(data) and not info.flag_bits & 0x08):
+            self.copy_previous_member(info, hashlib.sha1(data).hexdigest())
+            self.reused_count += 1
+            count_write(export_context, False)
+            return True
+        
+        method = zipfile.ZIP_DEFLATED
+        compressed = data
+        if (name.lower().endswith(archive_stored_file_endings)):
+            method = zipfile.ZIP_STORED
+        else:
+            compressor = zlib.compressobj(archive_compression_level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+        now = time.localtime()
+        dos_time = (now.tm_hour << 11) | (now.tm_min << 5) | (now.tm_sec // 2)
+        dos_date = ((now.tm_year - 1980) << 9) | (now.tm_mon << 5) | now.tm_mday
+        self.append_member(name, method, 0x800, dos_time, dos_date, crc, compressed, len(data), hashlib.sha1(data).hexdigest())
+        self.written_count += 1
+        count_write(export_context, True)
+        return True
+
+    def append_member(self, name, method, flags, dos_time, dos_date, crc, compressed, size, sha1):
+        encoded_name = name.encode('utf-8')
+        offset = self.file.tell()
+        self.file.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+                crc, len(compressed), size, len(encoded_name), 0))
+        self.file.write(encoded_name)
+        self.file.write(compressed)
+        self.members[name] = (offset, method, flags, dos_time, dos_date, crc, len(compressed), size, sha1)
+
+    # Copies the compressed data of the previous archive's member as it is.
+    def copy_previous_member(self, info, sha1 = None):
+        self.previous.fp.seek(info.header_offset)
+        local_header = self.previous.fp.read(30)
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        self.previous.fp.seek(info.header_offset + 30 + name_length + extra_length)
+        compressed = self.previous.fp.read(info.compress_size)
+        year, month, day, hour, minute, second = info.date_time
+        dos_time = (hour << 11) | (minute << 5) | (second // 2)
+        dos_date = ((year - 1980) << 9) | (month << 5) | day
+        self.append_member(info.filename, info.compress_type, info.flag_bits & 0x800, dos_time, dos_date,
+                info.CRC, compressed, info.file_size, sha1)
+
+    def remove(self, filelink):
+        name = self.get_name(filelink)
+        self.removed_names.add(name)
+        if (name in self.members):
+            # The data stays in the stream, but is no longer listed:
+            del self.members[name]
+
+    #
+    # Keeps the previous archive's members not written by this run, writes the central
+    # directory and replaces the previous archive (unless identical).
+    #
+    def close(self):
+        if (not self.previous is None):
+            for name, info in sorted(self.previous_members.items()):
+                if (not name in self.members and not name in self.removed_names):
+                    if (info.flag_bits & 0x08):
+                        # Has a data descriptor, thus compressed again:
+                        self.write(os.path.join(self.mod_path, name), self.previous.read(name))
+                    else:
+                        self.copy_previous_member(info)
+            self.previous.close()
+        central_directory_offset = self.file.tell()
+        for name, member in sorted(self.members.items(), key=lambda item: item[1][0]):
+            offset, method, flags, dos_time, dos_date, crc, compressed_size, size, sha1 = member
+            encoded_name = name.encode('utf-8')
+            self.file.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, method, dos_time, dos_date,
+                    crc, compressed_size, size, len(encoded_name), 0, 0, 0, 0, 0, offset))
+            self.file.write(encoded_name)
+        central_directory_size = self.file.tell() - central_directory_offset
+        self.file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.members), len(self.members),
+                central_directory_size, central_directory_offset, 0))
+        self.file.close()
+        replace_if_changed(self.staged_filelink, self.filelink)
+        print('Archive ', self.filelink, ': ', len(self.members), ' members, ', self.written_count, ' written, ', self.reused_count, ' reused.')
+
+
+
+#
+# Persistent index (SQLite) of the files in the actor, mesh, texture and animation
+# folders of the target mod: paths, sizes, mtimes, content hashes (computed on demand)
+# and the files each actor references. Refreshed incrementally: Only directories
+# whose mtime changed are listed again, the unchanged ones are taken from the index.
+# Note: A file overwritten in place doesn't change its directory's mtime, thus files
+# written by the export are updated in the index explicitely (see record_written_file()).
+#
+class ModTreeIndex():
+
+    def __init__(self, mod_path, folders):
+        self.roots = {}
+        for kind, folder in folders.items():
+            self.roots[os.path.normpath(os.path.join(mod_path, folder))] = kind
+        directory = os.path.join(mod_path, cache_folder)
+        if (not os.path.isdir(directory)):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(os.path.join(directory, mod_tree_index_filename))
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, parent TEXT, mtime REAL);
+            CREATE INDEX IF NOT EXISTS directories_by_parent ON directories (parent);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, directory TEXT, kind TEXT, size INTEGER, mtime REAL, sha1 TEXT);
+            CREATE INDEX IF NOT EXISTS files_by_directory ON files (directory);
+            CREATE INDEX IF NOT EXISTS files_by_kind_and_size ON files (kind, size);
+            CREATE TABLE IF NOT EXISTS actor_references (actor TEXT, path TEXT);
+            CREATE INDEX IF NOT EXISTS actor_references_by_actor ON actor_references (actor);
+        ''')
+        self.listed_directory_count = 0
+        self.refresh()
+
+    def refresh(self):
+        # Forget the folders no longer configured:
+        for (path,) in self.connection.execute('SELECT path FROM directories WHERE parent IS NULL').fetchall():
+            if (not path in self.roots):
+                self.forget_directory(path)
+        for root in self.roots:
+            directories_to_visit = [(root, None)]
+            while (len(directories_to_visit) > 0):
+                directory, parent = directories_to_visit.pop()
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    self.forget_directory(directory)
+                    continue
+                row = self.connection.execute('SELECT mtime FROM directories WHERE path = ?', (directory,)).fetchone()
+                if (not row is None and row[0] == mtime):
+                    subdirectories = [r[0] for r in self.connection.execute('SELECT path FROM directories WHERE parent = ?', (directory,))]
+                else:
+                    subdirectories = self.list_directory(directory, parent, mtime)
+                for subdirectory in subdirectories:
+                    directories_to_visit.append((subdirectory, directory))
+        self.connection.commit()
+        print('Mod tree index: ', self.listed_directory_count, ' directories listed, ',
+                self.connection.execute('SELECT COUNT(*) FROM files').fetchone()[0], ' files indexed.')
+
+    def list_directory(self, directory, parent, mtime):
+        self.listed_directory_count += 1
+        subdirectories = []
+        filelinks = []
+        for entry in os.listdir(directory):
+            filelink = os.path.join(directory, entry)
+            if (os.path.isdir(filelink)):
+                subdirectories.append(filelink)
+            elif (os.path.isfile(filelink)):
+                filelinks.append(filelink)
+                self.update_file(filelink, True)
+        # Forget what was removed meanwhile:
+        for (filelink,) in self.connection.execute('SELECT path FROM files WHERE directory = ?', (directory,)).fetchall():
+            if (not filelink in filelinks):
+                self.forget_file(filelink)
+        for (subdirectory,) in self.connection.execute('SELECT path FROM directories WHERE parent = ?', (directory,)).fetchall():
+            if (not subdirectory in subdirectories):
+                self.forget_directory(subdirectory)
+        self.connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)', (directory, parent, mtime))
+        return subdirectories
+
+    def get_kind(self, filelink):
+        for root, kind in self.roots.items():
+            if (filelink.startswith(root + os.sep)):
+                return kind
+        return None
+
+    def update_file(self, filelink, only_if_changed = False):
+        filelink = os.path.normpath(filelink)
+        kind = self.get_kind(filelink)
+        if (kind is None or not os.path.isfile(filelink)):
+            return
+        stat = os.stat(filelink)
+        if (only_if_changed):
+            row = self.connection.execute('SELECT size, mtime FROM files WHERE path = ?', (filelink,)).fetchone()
+            if (row == (stat.st_size, stat.st_mtime)):
+                return
+        self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, NULL)',
+                (filelink, os.path.dirname(filelink), kind, stat.st_size, stat.st_mtime))
+        if (kind == 'actor'):
+            self.update_actor_references(filelink)
+
+    def update_actor_references(self, actor_filelink):
+        self.connection.execute('DELETE FROM actor_references WHERE actor = ?', (actor_filelink,))
+        try:
+            root = ElementTree.parse(actor_filelink).getroot()
+        except (ElementTree.ParseError, OSError):
+            print('Mod tree index: Could not read the references of the actor: ', actor_filelink)
+            return
+        references = []
+        for element in root.iter('mesh'):
+            references.append(('mesh', element.text))
+        for element in root.iter('texture'):
+            references.append(('texture', element.get('file')))
+        for element in root.iter('animation'):
+            references.append(('animation', element.get('file')))
+        for element in root.iter('prop'):
+            references.append(('actor', element.get('actor')))
+        for kind, reference in references:
+            if (reference is None or reference.strip() == ''):
+                continue
+            filelink = reference.strip()
+            if (not os.path.isabs(filelink)):
+                for root_path, root_kind in self.roots.items():
+                    if (root_kind == kind):
+                        filelink = os.path.join(root_path, filelink)
+            self.connection.execute('INSERT INTO actor_references VALUES (?, ?)', (actor_filelink, os.path.normpath(filelink)))
+
+    def forget_file(self, filelink):
+        filelink = os.path.normpath(filelink)
+        self.connection.execute('DELETE FROM files WHERE path = ?', (filelink,))
+        self.connection.execute('DELETE FROM actor_references WHERE actor = ?', (filelink,))
+
+    def forget_directory(self, directory):
+        for (filelink,) in self.connection.execute('SELECT path FROM files WHERE directory = ?', (directory,)).fetchall():
+            self.forget_file(filelink)
+        for (subdirectory,) in self.connection.execute('SELECT path FROM directories WHERE parent = ?', (directory,)).fetchall():
+            self.forget_directory(subdirectory)
+        self.connection.execute('DELETE FROM directories WHERE path = ?', (directory,))
+
+    def is_file(self, filelink):
+        filelink = os.path.normpath(filelink)
+        if (self.get_kind(filelink) is None):
+            return os.path.isfile(filelink)
+        return not self.connection.execute('SELECT 1 FROM files WHERE path = ?', (filelink,)).fetchone() is None
+
+    def get_sha1(self, filelink):
+        sha1 = self.connection.execute('SELECT sha1 FROM files WHERE path = ?', (filelink,)).fetchone()[0]
+        if (sha1 is None):
+            sha1 = hash_file(filelink)
+            self.connection.execute('UPDATE files SET sha1 = ? WHERE path = ?', (sha1, filelink))
+        return sha1
+
+    def find_file_with_content(self, kind, filelink):
+        # Only files of equal size need to be hashed:
+        size = os.path.getsize(filelink)
+        candidates = [r[0] for r in self.connection.execute('SELECT path FROM files WHERE kind = ? AND size = ?', (kind, size))]
+        if (len(candidates) == 0):
+            return None
+        sha1 = hash_file(filelink)
+        for candidate in candidates:
+            if (self.get_sha1(candidate) == sha1):
+                return candidate
+        return None
+
+    #
+    # @return the meshes, textures and animations no actor in the mod references.
+    # Cached binary models count as referenced if their .dae is.
+    #
+    def find_orphans(self):
+        referenced = set([r[0] for r in self.connection.execute('SELECT path FROM actor_references')])
+        orphans = []
+        for (filelink,) in self.connection.execute("SELECT path FROM files WHERE kind != 'actor' ORDER BY path"):
+            source_filelink = filelink
+            if (filelink.endswith(pmd_cached_file_ending)):
+                source_filelink = filelink[:-len(pmd_cached_file_ending)]
+            if (not source_filelink in referenced):
+                orphans.append(filelink)
+        return orphans
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+
+#
+# Interns path strings: The same mesh, texture and actor paths occur in many
+# variant and texture records, thus those share a single string object.
+#
+def intern_path(filelink):
+    if (filelink is None):
+        return None
+    return sys.intern(filelink)
+
+
+
+#
+# The actor data model: compact (slotted) records, comparable and hashable for dedup.
+# Actors are identified and sorted by their filelink.
+#
+@functools.total_ordering
 class Actor():
+
+    __slots__ = ('filelink', 'material', 'object', 'groups')
     
-    #class_var = ""
-    
-    def __init__(self):#filelink, object):
-        print(self)
-        self.filelink = None #filelink
+    def __init__(self, filelink = None, o = None):
+        self.filelink = intern_path(filelink)
         self.material = None 
-        self.object = None #object
+        self.object = o
         self.groups = []
-        
 
+    def __eq__(self, other):
+        return isinstance(other, Actor) and self.filelink == other.filelink
+
+    def __lt__(self, other):
+        return self.filelink < other.filelink
+
+    def __hash__(self):
+        return hash(self.filelink)
+
+    def __str__(self):
+        return str(self.filelink)
         
-    def toXML():
-        # override for sorted() order:
-        Actor.__eq__ = lambda self, other: self.filelink == other.filelink
-        Actor.__ne__ = lambda self, other: self.filelink != other.filelink
-        Actor.__lt__ = lambda self, other: self.filelink < other.filelink
-        Actor.__le__ = lambda self, other: self.filelink <= other.filelink
-        Actor.__ge__ = lambda self, other: self.filelink >= other.filelink
-        Actor.__gt__ = lambda self, other: self.filelink > other.filelink
-        
+    def toXml(self):
         xml = '<?xml version="1.0" encoding="utf-8"?>'
-        "\n"
-        '<actor version="1">'
+        xml = xml + "\n" + '<actor version="1">'
         for group in self.groups:
             xml = xml + "\n\t" + group.toXml()
-        xml = xml + "\n\t" + '<material>' + self.material + '</material>'
+        if (not self.material is None):
+            xml = xml + "\n\t" + '<material>' + self.material + '</material>'
         xml = xml + "\n" + '</actor>'
         return xml
 
 
 
 class Group():
+
+    __slots__ = ('variants',)
     
     def __init__(self):
         # Each group xml node contains at least one variant, which the engine picks 1 from randomly.
         self.variants = []
+
+    def __eq__(self, other):
+        return isinstance(other, Group) and self.variants == other.variants
+
+    def __hash__(self):
+        return hash(tuple(self.variants))
     
-    def toXml():
+    def toXml(self):
         xml = "<group>\n"
         for variant in self.variants:
             xml = xml + "\n" + variant.toXml()
@@ -1542,6 +5469,8 @@ class Group():
 # TODO Pyrogenesis: If a variant name starts with winter_ or summer_ then choose depending on current season.
 # Define one group with only one variant containing all default values (material, mesh, props, ...) and call it "Base" as only one can be picked. Order is important I think. Thus Base has to come first in the XML.
 class Variant():
+
+    __slots__ = ('frequency', 'name', 'props', 'textures', 'mesh', 'animations')
     
     # Define 
     def __init__(self):
@@ -1550,7 +5479,16 @@ class Variant():
         self.props = []
         self.textures = [] # <-- diffuses + specular + bump/parallax + optional ambient occlusion (all dependent on the chosen actor material)
         self.mesh = None#_filelink = None
-        self.animations = [] # TODO
+        self.animations = []
+
+    def key(self):
+        return (self.name, self.frequency, self.mesh, tuple(self.textures), tuple(self.props), tuple(self.animations))
+
+    def __eq__(self, other):
+        return isinstance(other, Variant) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
         
     def toXml(self):
         animations_xml = '<animations>'
@@ -1568,34 +5506,56 @@ class Variant():
             textures_xml = textures_xml + "\n\t" + texture.toXml()
         textures_xml = textures_xml + "\n" + '</textures>'
         
+        mesh_xml = ''
+        if (not self.mesh is None):
+            mesh_xml = "\n\t" + self.mesh.toXml()
 
         node_name = self.__class__.__name__.lower()
-        
-
-        node_name = self.__class__.__name__.lower()
-        return '<' + node_name + ' name="' + self.name + '" frequency="' + self.frequency + '">' + animations_xml + "\n\t" + self.mesh.toXml() + "\n\t" + props_xml + "\n\t" + textures_xml + "\n" + '</' + node_name + '>'
+        return '<' + node_name + ' name="' + str(self.name) + '" frequency="' + str(self.frequency) + '">' + animations_xml + mesh_xml + "\n\t" + props_xml + "\n\t" + textures_xml + "\n" + '</' + node_name + '>'
 
 
 #
 #
 #
 class Animation():
-    def __init__(self):
-        self.event = None
-        self.filelink = None
-        self.name = None
+
+    __slots__ = ('event', 'filelink', 'name', 'speed')
+
+    def __init__(self, filelink = None, name = None, speed = 100, event = None):
+        self.event = event # <-- optional, e.g. the moment of the attack in the cycle (0..1)
+        self.filelink = intern_path(filelink) # <-- relative to the animation folder
+        self.name = name
+        self.speed = speed
+
+    def __eq__(self, other):
+        return isinstance(other, Animation) and (self.name, self.event, self.filelink, self.speed) == (other.name, other.event, other.filelink, other.speed)
+
+    def __hash__(self):
+        return hash((self.name, self.event, self.filelink, self.speed))
 
     def toXml(self):
         node_name = self.__class__.__name__.lower()
-        return '<' + node_name + ' event="'+ self.event +'" name="'+ self.name +'">' + self.filelink + '</' + node_name + '>'
+        event_xml = ''
+        if (not self.event is None):
+            event_xml = ' event="' + str(self.event) + '"'
+        return '<' + node_name + ' file="' + self.filelink + '" name="' + self.name + '" speed="' + str(self.speed) + '"' + event_xml + '/>'
 
 
 #
 #
 #
 class Mesh():
+
+    __slots__ = ('filelink',)
+
     def __init__(self, filelink):
-        self.filelink = filelink
+        self.filelink = intern_path(filelink)
+
+    def __eq__(self, other):
+        return isinstance(other, Mesh) and self.filelink == other.filelink
+
+    def __hash__(self):
+        return hash(self.filelink)
 
     def toXml(self):
         node_name = self.__class__.__name__.lower()
@@ -1605,9 +5565,18 @@ class Mesh():
 #
 #
 class Texture():
+
+    __slots__ = ('filelink', 'name')
+
     def __init__(self, filelink, name):
-        self.filelink = filelink
-        self.name = name # baseTex | specTex | normTex (parallax/bump)
+        self.filelink = intern_path(filelink)
+        self.name = sys.intern(name) # baseTex | specTex | normTex (parallax/bump)
+
+    def __eq__(self, other):
+        return isinstance(other, Texture) and self.filelink == other.filelink and self.name == other.name
+
+    def __hash__(self):
+        return hash((self.filelink, self.name))
         
     def toXml(self):
         node_name = self.__class__.__name__.lower()
@@ -1617,11 +5586,25 @@ class Texture():
 #
 #
 class Prop():
+
+    __slots__ = ('attachpoint', 'actor_filelink_relative', 'actor', 'prop_object', 'object_to_derive_attachpoint_name_from')
     
     def __init__(self):
         # defaults:
         self.attachpoint = "root" # root is by convention the prop_point attached to the armature' root bone
         self.actor_filelink_relative = "optional_subfolder/actor.xml" #TODO <-- Ensure it is really relative.
+        self.actor = None
+        self.prop_object = None
+        self.object_to_derive_attachpoint_name_from = None
+
+    def key(self):
+        return (self.attachpoint, self.actor_filelink_relative, self.actor)
+
+    def __eq__(self, other):
+        return isinstance(other, Prop) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
     
     def toXml(self):
         node_name = self.__class__.__name__.lower()
@@ -0,0 +1,30 @@
+#
+# Imports the add-on. Outside of blender, the modules it imports are replaced by empty stand-ins.
+#
+import os
+import sys
+import types
+
+try:
+    import bpy
+except ImportError:
+    bpy = types.ModuleType('bpy')
+    bpy.types = types.SimpleNamespace(Operator = object, Panel = object, Object = object, Scene = object)
+    bpy.props = types.ModuleType('bpy.props')
+    for property_name in ('IntProperty', 'FloatProperty', 'StringProperty', 'BoolProperty', 'EnumProperty'):
+        setattr(bpy.props, property_name, lambda **settings: None)
+    bpy.app = types.SimpleNamespace(version_string = '')
+    bpy.path = types.SimpleNamespace(abspath = lambda path: path)
+    sys.modules['bpy'] = bpy
+    sys.modules['bpy.props'] = bpy.props
+try:
+    import mathutils
+except ImportError:
+    mathutils = types.ModuleType('mathutils')
+    mathutils.kdtree = types.ModuleType('mathutils.kdtree')
+    mathutils.Matrix = object
+    sys.modules['mathutils'] = mathutils
+    sys.modules['mathutils.kdtree'] = mathutils.kdtree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import io_export_to_0ad_actors as exporter
@@ -0,0 +1,121 @@
+#
+# The planning of the export works on a plain-data scene snapshot, thus runs without blender:
+# The snapshots are built by hand here.
+#
+# python -m unittest discover -s tests
+#
+import unittest
+
+from addon import exporter
+
+
+
+def build_snapshot(objects, selected_names = ()):
+    snapshot = exporter.SceneSnapshot()
+    snapshot.scene_name = 'Scene'
+    for name, object_type, parent_name, mesh_name in objects:
+        record = exporter.ObjectRecord(name, object_type)
+        record.parent = parent_name
+        record.is_visible = True
+        record.mesh = mesh_name
+        snapshot.objects[name] = record
+        snapshot.object_names.append(name)
+    for record in snapshot.objects.values():
+        if (not record.parent is None):
+            snapshot.objects[record.parent].children.append(record.name)
+    snapshot.selected_names = list(selected_names)
+    return snapshot
+
+
+
+class PlanVariantObjectNamesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = build_snapshot([
+            ('house__a', 'MESH', None, 'a'),
+            ('house__b', 'MESH', None, 'b'),
+            ('house__armature', 'ARMATURE', None, None),
+            ('barn', 'MESH', None, 'barn')
+        ], selected_names = ['house__b'])
+
+    def test_visible_meshes_sharing_the_prefix(self):
+        self.assertEqual(exporter.plan_variant_object_names(self.snapshot, 'house__a'), ['house__a', 'house__b'])
+
+    def test_invisible_meshes_are_skipped(self):
+        self.snapshot.objects['house__a'].is_visible = False
+        self.assertEqual(exporter.plan_variant_object_names(self.snapshot, 'house__b'), ['house__b'])
+
+    def test_of_selection_only(self):
+        self.assertEqual(exporter.plan_variant_object_names(self.snapshot, 'house__a', True), ['house__b'])
+
+
+
+class PlanPropsTest(unittest.TestCase):
+
+    def test_children_and_the_children_of_empties(self):
+        snapshot = build_snapshot([
+            ('house', 'MESH', None, 'house'),
+            ('chimney', 'MESH', 'house', 'chimney'),
+            ('door', 'EMPTY', 'house', None),
+            ('sign', 'CURVE', 'door', None),
+            ('bones', 'ARMATURE', 'house', None)
+        ])
+        self.assertEqual(exporter.plan_props(snapshot, 'house'), [('chimney', 'chimney'), ('sign', 'door')])
+
+    def test_attached_unparented_props(self):
+        snapshot = build_snapshot([
+            ('house', 'MESH', None, 'house'),
+            ('door', 'EMPTY', 'house', None),
+            ('flag', 'MESH', None, 'flag')
+        ])
+        self.assertEqual(exporter.plan_props(snapshot, 'house', {'door': ['flag']}), [('flag', 'door')])
+
+
+
+class PlanTextureImagesTest(unittest.TestCase):
+
+    def test_images_per_uv_map(self):
+        snapshot = build_snapshot([
+            ('house', 'MESH', None, 'house'),
+            ('door', 'EMPTY', 'house', None)
+        ])
+        snapshot.meshes['house'] = exporter.MeshRecord('house', [('UVMap', ['red', 'blue']), ('AO', [])])
+        snapshot.images['red'] = exporter.ImageRecord('red', '//textures/red.png', '/blend/textures/red.png')
+        snapshot.images['blue'] = exporter.ImageRecord('blue', '//blue.png', '/blend/blue.png')
+        uv_maps = exporter.plan_texture_images(snapshot, 'house')
+        self.assertEqual([(uv_map_name, [image.file_name for image in images]) for uv_map_name, images in uv_maps],
+                [('UVMap', ['red.png', 'blue.png']), ('AO', [])])
+        self.assertEqual(exporter.plan_texture_images(snapshot, 'door'), [])
+
+
+
+class CombineTextureVariantsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.variant = exporter.Variant()
+        self.variant.mesh = exporter.Mesh('house.dae')
+        self.variant.textures.append(exporter.Texture('house_ao.png', 'aoTex'))
+        prop = exporter.Prop()
+        prop.attachpoint = 'door'
+        self.variant.props.append(prop)
+
+    def test_without_skins_the_mesh_variant(self):
+        self.assertEqual(exporter.combine_texture_variants(self.variant, []), [self.variant])
+
+    def test_one_variant_per_skin(self):
+        texture_variants = []
+        for file_name in ('red.png', 'blue.png'):
+            texture_variant = exporter.Variant()
+            texture_variant.textures.append(exporter.Texture(file_name, 'baseTex'))
+            texture_variants.append(texture_variant)
+        variants = exporter.combine_texture_variants(self.variant, texture_variants)
+        self.assertEqual([[texture.filelink for texture in variant.textures] for variant in variants],
+                [['red.png', 'house_ao.png'], ['blue.png', 'house_ao.png']])
+        for variant in variants:
+            self.assertEqual(variant.mesh, self.variant.mesh)
+            self.assertEqual(variant.props, self.variant.props)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#
+# The textures are resized to powers of two (and the mipmaps generated) in a pool of worker threads,
+# the normalized files are written when the normalization is completed (before the actor is written).
+#
+import os
+import shutil
+import struct
+import tempfile
+import types
+import unittest
+
+from addon import exporter
+
+
+
+def make_image(width, height, channels = 4):
+    pixels = [(index % 7) / 7.0 for index in range(width * height * channels)]
+    return types.SimpleNamespace(name = 'skin', filepath = '', source = 'GENERATED', packed_file = None, is_dirty = False,
+            size = (width, height), channels = channels, pixels = pixels)
+
+
+
+@unittest.skipIf(exporter.numpy is None, 'requires numpy')
+class TextureNormalizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.textures_directory = os.path.join(self.directory, 'art', 'textures', 'skins')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def normalize(self, image, with_mipmaps):
+        texture_normalizer = exporter.TextureNormalizer(os.path.join(self.directory, 'cache'), 32, with_mipmaps)
+        try:
+            filelink = texture_normalizer.normalize(image, os.path.join(self.textures_directory, 'skin.jpg'))
+            self.assertFalse(os.path.isfile(filelink))
+            texture_normalizer.complete()
+        finally:
+            texture_normalizer.shutdown()
+        return filelink
+
+    def test_png_of_power_of_two_size(self):
+        filelink = self.normalize(make_image(48, 20, 3), False)
+        self.assertEqual(filelink, os.path.join(self.textures_directory, 'skin.png'))
+        with open(filelink, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(struct.unpack('>II', data[16:24]), (32, 16))
+
+    def test_dds_with_mipmaps(self):
+        filelink = self.normalize(make_image(100, 40), True)
+        self.assertEqual(filelink, os.path.join(self.textures_directory, 'skin.dds'))
+        with open(filelink, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[:4], b'DDS ')
+        height, width = struct.unpack('<II', data[12:20])
+        mipmap_count, = struct.unpack('<I', data[28:32])
+        self.assertEqual((width, height, mipmap_count), (32, 32, 6))
+
+    def test_cached_normalization_is_reused(self):
+        image = make_image(48, 20)
+        self.normalize(image, False)
+        os.remove(os.path.join(self.textures_directory, 'skin.png'))
+        texture_normalizer = exporter.TextureNormalizer(os.path.join(self.directory, 'cache'), 32, False)
+        filelink = texture_normalizer.normalize(image, os.path.join(self.textures_directory, 'skin.jpg'))
+        texture_normalizer.complete()
+        self.assertEqual((texture_normalizer.normalization_count, texture_normalizer.hit_count), (0, 1))
+        self.assertTrue(os.path.isfile(filelink))
+
+
+
+if __name__ == '__main__':
+    unittest.main()